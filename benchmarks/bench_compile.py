@@ -0,0 +1,182 @@
+# benchmarks/bench_compile.py
+# Compilation de très grands flux (10 000 blocs par défaut) : temps et mémoire de la construction du plan,
+# des empreintes et du code DOT à plusieurs tailles (le coût par bloc doit rester constant), puis mémoire
+# d'une exécution complète contre le fournisseur simulé, avec et sans libération des sorties intermédiaires.
+# Usage : python benchmarks/bench_compile.py [--steps 100] [--width 100] [--fan-in 2] [--output results.json]
+import argparse
+import asyncio
+import contextlib
+import gc
+import json
+import logging
+import multiprocessing
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, List
+
+from bench_flow import API_KEYS, MODELS, base_settings, fetch_stats, peak_rss_mb, run_flow_once
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+def flow_steps(options: Dict[str, Any], steps: int) -> List[Dict[str, Any]]:
+    # Chaque bloc lit fan_in blocs de l'étape précédente : steps x width blocs, (steps - 1) x width x fan_in arcs
+    width = options["width"]
+    filler = " ".join(["analyse le texte fourni et produis une synthèse détaillée"] * options["prompt_repeat"])
+    return [{"blocks": [
+        {"prompt": f"Bloc {i}-{j} : {filler}", "model": MODELS[j % len(MODELS)], "max_tokens": options["completion_tokens"],
+         **({"inputs": [[i - 1, (j + k) % width] for k in range(options["fan_in"])]} if i else {})}
+        for j in range(width)
+    ]} for i in range(steps)]
+
+def timed(function) -> float:
+    start = time.perf_counter()
+    function()
+    return time.perf_counter() - start
+
+def measure_compile(options: Dict[str, Any]) -> Dict[str, Any]:
+    # Exécuté dans un processus dédié (spawn) pour que la mémoire mesurée soit celle du seul flux
+    from src.utils.config import create_modular_flow
+
+    scales = []
+    for scale in options["scales"]:
+        steps_config = flow_steps(options, max(1, round(options["steps"] * scale)))
+        blocks = sum(len(step["blocks"]) for step in steps_config)
+        timings = {"compile": [], "fingerprints": [], "dot": []}
+        for _ in range(options["repeat"]):
+            gc.collect()
+            holder = {}
+            timings["compile"].append(timed(lambda: holder.update(flow=create_modular_flow(steps_config, API_KEYS))))
+            flow_manager = holder["flow"]
+            timings["fingerprints"].append(timed(lambda: flow_manager.compute_fingerprints(flow_manager.compile())))
+            timings["dot"].append(timed(flow_manager.generate_dot_code))
+        medians = {phase: statistics.median(values) for phase, values in timings.items()}
+        scales.append({
+            "blocks": blocks,
+            **{f"{phase}_ms": round(seconds * 1000, 1) for phase, seconds in medians.items()},
+            **{f"{phase}_us_per_block": round(seconds * 1e6 / blocks, 2) for phase, seconds in medians.items()},
+        })
+
+    # tracemalloc ralentit chaque allocation : la mémoire est mesurée dans une passe à part, à la taille maximale
+    steps_config = flow_steps(options, options["steps"])
+    memory = {}
+    tracemalloc.start()
+    flow_manager = create_modular_flow(steps_config, API_KEYS)
+    retained, peak = tracemalloc.get_traced_memory()
+    memory["compile"] = {"retained_mb": round(retained / 1e6, 2), "peak_mb": round(peak / 1e6, 2)}
+    dot_path = os.path.join(tempfile.gettempdir(), f"bench_compile_{os.getpid()}.dot")
+    for phase, function in (("fingerprints", lambda: flow_manager.compute_fingerprints(flow_manager.compile())),
+                            ("dot", flow_manager.generate_dot_code),
+                            ("dot_file", lambda: flow_manager.render_graph(dot_path))):
+        tracemalloc.reset_peak()
+        before = tracemalloc.get_traced_memory()[0]
+        function()
+        current, peak = tracemalloc.get_traced_memory()
+        memory[phase] = {"retained_mb": round((current - before) / 1e6, 2), "peak_mb": round((peak - before) / 1e6, 2)}
+    tracemalloc.stop()
+    os.remove(dot_path)
+    blocks = len(flow_manager.compile().blocks)
+    memory["bytes_per_block"] = round(memory["compile"]["retained_mb"] * 1e6 / blocks)
+    return {"scales": scales, "memory": memory}
+
+def measure_run(options: Dict[str, Any], base_url: str, release: bool) -> Dict[str, Any]:
+    logging.basicConfig(level=logging.ERROR)
+    from src.utils.config import create_modular_flow
+    from src.api.api_client import GENERATION_ERROR
+
+    settings = base_settings(base_url, options)
+    settings["output"] = {"release_outputs": release}
+    flow_manager = create_modular_flow(flow_steps(options, options["steps"]), API_KEYS, settings=settings)
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        elapsed = asyncio.run(run_flow_once(flow_manager))
+    blocks = flow_manager.compile().blocks
+    # Texte encore référencé par le flux : gabarits de prompt et sorties non libérées
+    retained = sum(len(block.prompt) + len(block.output or "") for block in blocks)
+    return {
+        "release_outputs": release,
+        "blocks": len(blocks),
+        "errors": sum(block.output == GENERATION_ERROR for block in blocks),
+        "wall_seconds": round(elapsed, 3),
+        "throughput": round(len(blocks) / elapsed, 1),
+        "retained_text_mb": round(retained / 1e6, 2),
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+def start_mock_provider(args: argparse.Namespace) -> subprocess.Popen:
+    process = subprocess.Popen([
+        sys.executable, os.path.join(ROOT, "benchmarks", "mock_provider.py"), "--port", str(args.port),
+        "--latency", args.latency, "--completion-tokens", str(args.completion_tokens),
+    ])
+    deadline = time.monotonic() + 15
+    while True:
+        try:
+            fetch_stats(f"http://127.0.0.1:{args.port}")
+            return process
+        except OSError:
+            if process.poll() is not None or time.monotonic() > deadline:
+                process.kill()
+                raise RuntimeError("Le fournisseur simulé n'a pas démarré")
+            time.sleep(0.1)
+
+def in_process(function, *args) -> Dict[str, Any]:
+    with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn")) as executor:
+        return executor.submit(function, *args).result()
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de la compilation et de la mémoire des très grands flux")
+    parser.add_argument("--steps", type=int, default=100)
+    parser.add_argument("--width", type=int, default=100)
+    parser.add_argument("--fan-in", type=int, default=2)
+    parser.add_argument("--prompt-repeat", type=int, default=4)
+    parser.add_argument("--scales", type=float, nargs="+", default=[0.25, 0.5, 1.0])
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--skip-run", action="store_true", help="Mesure seulement la compilation")
+    parser.add_argument("--port", type=int, default=8902)
+    parser.add_argument("--latency", default="fixed:0.001")
+    parser.add_argument("--completion-tokens", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--output", help="Fichier JSON des résultats")
+    args = parser.parse_args()
+
+    options = {key: getattr(args, key) for key in ("steps", "width", "fan_in", "prompt_repeat", "scales", "repeat",
+                                                    "completion_tokens", "concurrency")}
+    compile_result = in_process(measure_compile, options)
+    print(f"{'blocs':>8} {'compilation':>12} {'empreintes':>11} {'DOT':>9}   (ms, puis µs par bloc)")
+    for scale in compile_result["scales"]:
+        print(f"{scale['blocks']:>8} {scale['compile_ms']:>12.1f} {scale['fingerprints_ms']:>11.1f} {scale['dot_ms']:>9.1f}   "
+              f"{scale['compile_us_per_block']:.1f} / {scale['fingerprints_us_per_block']:.1f} / {scale['dot_us_per_block']:.1f}")
+    memory = compile_result["memory"]
+    print(f"Mémoire : plan compilé {memory['compile']['retained_mb']} Mo ({memory['bytes_per_block']} octets/bloc, "
+          f"pic {memory['compile']['peak_mb']} Mo), empreintes +{memory['fingerprints']['retained_mb']} Mo, "
+          f"DOT pic {memory['dot']['peak_mb']} Mo en chaîne, {memory['dot_file']['peak_mb']} Mo écrit en fichier")
+
+    runs = []
+    if not args.skip_run:
+        process = start_mock_provider(args)
+        try:
+            for release in (False, True):
+                run = in_process(measure_run, options, f"http://127.0.0.1:{args.port}", release)
+                runs.append(run)
+                print(f"Exécution release_outputs={str(release).lower():<5} {run['blocks']} blocs en {run['wall_seconds']:.2f}s "
+                      f"({run['throughput']}/s)  texte retenu {run['retained_text_mb']} Mo  RSS max {run['peak_rss_mb']} Mo  "
+                      f"erreurs {run['errors']}")
+        finally:
+            process.terminate()
+            process.wait()
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as file:
+            json.dump({"timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"), "python": platform.python_version(),
+                       "platform": platform.platform(), "options": options, "compile": compile_result, "runs": runs},
+                      file, indent=2)
+        print(f"Résultats écrits dans {args.output}")
+
+if __name__ == "__main__":
+    main()
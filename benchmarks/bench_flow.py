@@ -0,0 +1,313 @@
+# benchmarks/bench_flow.py
+# Débit, latences et mémoire du framework face au fournisseur simulé de benchmarks/mock_provider.py.
+# Chaque scénario tourne dans un processus neuf : le pic de RSS mesuré est le sien.
+# Usage : python benchmarks/bench_flow.py [--scenarios wide deep search oversized batch] [--output results.json]
+#         python benchmarks/bench_flow.py --compare results.json   (code de sortie 1 en cas de régression)
+import argparse
+import asyncio
+import contextlib
+import json
+import logging
+import multiprocessing
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+MODELS = ("gpt-4o-mini", "claude-3-haiku-20240307", "mistral-small-latest")
+API_KEYS = {"openai": "bench", "anthropic": "bench", "mistral": "bench"}
+
+def percentile(values: List[float], q: float) -> Optional[float]:
+    if not values:
+        return None
+    ordered = sorted(values)
+    position = (len(ordered) - 1) * q
+    lower = int(position)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (position - lower)
+
+def latency_summary(seconds: List[float]) -> Dict[str, Optional[float]]:
+    return {f"p{int(q * 100)}": round(percentile(seconds, q) * 1000, 3) if seconds else None for q in (0.5, 0.95, 0.99)}
+
+def peak_rss_mb() -> Optional[float]:
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux renvoie des Kio, macOS des octets
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+def corpus_text(words: int) -> str:
+    sentence = ("Le rapport trimestriel décrit la demande, les coûts de production et les risques identifiés "
+                "par l'équipe pour chaque région du réseau de distribution.")
+    tokens = sentence.split()
+    paragraphs = []
+    for start in range(0, words, 120):
+        paragraph = [f"{tokens[(start + i) % len(tokens)]}{start + i}" if i % 17 == 0 else tokens[(start + i) % len(tokens)]
+                     for i in range(min(120, words - start))]
+        paragraphs.append(" ".join(paragraph) + ".")
+    return "\n\n".join(paragraphs)
+
+def base_settings(base_url: str, options: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "api_client": {
+            "base_urls": {"openai": base_url, "anthropic": base_url, "mistral": base_url},
+            "max_concurrency": options["concurrency"],
+            "connection_limit_per_host": options["concurrency"],
+            "retry": {"base_delay": 0.05, "max_delay": 1.0, "deadline": 60},
+            "circuit_breaker": {"failure_threshold": 1000},
+            "cache": {"enabled": False},
+        },
+        "telemetry": {"summary": False},
+    }
+
+def wide_steps(options: Dict[str, Any], directory: str) -> List[Dict[str, Any]]:
+    # Une seule étape très large : tous les blocs sont prêts en même temps
+    return [{"blocks": [
+        {"prompt": f"Résume le point {i} du rapport.", "model": MODELS[i % len(MODELS)], "max_tokens": 64,
+         "temperature": 0.2, "stream": i % 4 == 0}
+        for i in range(options["width"])
+    ]}]
+
+def deep_steps(options: Dict[str, Any], directory: str) -> List[Dict[str, Any]]:
+    # Une chaîne : chaque bloc attend le précédent, le coût de planification s'additionne à chaque maillon
+    return [{"blocks": [
+        {"prompt": f"Affine la réponse précédente (maillon {i}).", "model": MODELS[i % len(MODELS)], "max_tokens": 64,
+         "temperature": 0.2, **({"inputs": [[i - 1, 0]]} if i else {})}
+    ]} for i in range(options["depth"])]
+
+def search_steps(options: Dict[str, Any], directory: str) -> List[Dict[str, Any]]:
+    corpus_path = os.path.join(directory, "corpus.txt")
+    with open(corpus_path, "w", encoding="utf-8") as file:
+        file.write(corpus_text(options["corpus_words"]))
+    return [{"blocks": [
+        {"prompt": f"Réponds à la question {i} à partir des extraits.", "model": "gpt-4o-mini", "max_tokens": 64,
+         "temperature": 0.2, "external_data": {"type": "txt", "source": corpus_path},
+         "semantic_search": {"query": f"risques de la région {i}", "top_k": 5, "inputs": ["external"]}}
+        for i in range(options["search_blocks"])
+    ]}]
+
+def oversized_steps(options: Dict[str, Any], directory: str) -> List[Dict[str, Any]]:
+    # gpt-4 (8192 jetons de contexte) : chaque prompt passe par split_and_process
+    return [{"blocks": [
+        {"prompt": f"Synthèse {i} : " + corpus_text(options["oversized_words"]), "model": "gpt-4", "max_tokens": 256,
+         "temperature": 0.2, "map_reduce": {"reduce_prompt": "Fusionne ces synthèses :\n\n{text}", "fan_in": 4}}
+        for i in range(options["oversized_blocks"])
+    ]}]
+
+def batch_steps(options: Dict[str, Any], directory: str) -> List[Dict[str, Any]]:
+    return [
+        {"blocks": [{"prompt": "Classe ce ticket : {text}", "model": "gpt-4o-mini", "max_tokens": 32, "temperature": 0},
+                    {"prompt": "Extrais les entités de : {text}", "model": "mistral-small-latest", "max_tokens": 64,
+                     "temperature": 0}]},
+        {"blocks": [{"prompt": "Rédige une réponse au ticket {id}.", "model": "claude-3-haiku-20240307",
+                     "max_tokens": 128, "temperature": 0.3, "inputs": [[0, 0], [0, 1]],
+                     "save_output": {"format": "jsonl", "filename": os.path.join(directory, "replies.jsonl")}}]},
+    ]
+
+SCENARIOS = {
+    "wide": wide_steps,
+    "deep": deep_steps,
+    "search": search_steps,
+    "oversized": oversized_steps,
+    "batch": batch_steps,
+}
+
+async def run_flow_once(flow_manager) -> float:
+    # Comme run_flow, sans l'affichage des résultats
+    start = time.perf_counter()
+    session = flow_manager.api_client.get_session()
+    try:
+        await flow_manager.execute(session)
+    finally:
+        await flow_manager.output_sink.flush()
+        flow_manager.output_sink.close()
+        await flow_manager.api_client.close()
+    return time.perf_counter() - start
+
+async def run_batch(steps_config: List[Dict[str, Any]], settings: Dict[str, Any], options: Dict[str, Any],
+                    directory: str) -> Tuple[int, int, float, List[float]]:
+    from src.utils.batch_runner import BatchRunner
+
+    input_path = os.path.join(directory, "records.jsonl")
+    with open(input_path, "w", encoding="utf-8") as file:
+        for i in range(options["records"]):
+            file.write(json.dumps({"id": f"t{i}", "text": f"Ticket {i} : " + corpus_text(80)}, ensure_ascii=False) + "\n")
+    runner = BatchRunner(steps_config, API_KEYS, settings=settings, concurrency=options["concurrency"])
+    latencies = []
+    run_record = runner.run_record
+
+    async def timed_record(session, record_id, record):
+        start = time.perf_counter()
+        result = await run_record(session, record_id, record)
+        latencies.append(time.perf_counter() - start)
+        return result
+
+    runner.run_record = timed_record
+    start = time.perf_counter()
+    stats = await runner.run(input_path, os.path.join(directory, "results.jsonl"))
+    return stats["done"], stats["failed"], time.perf_counter() - start, latencies
+
+def run_scenario(name: str, base_url: str, options: Dict[str, Any]) -> Dict[str, Any]:
+    # Exécuté dans un processus dédié (spawn) : imports, mémoire et boucle d'événements repartent de zéro
+    logging.basicConfig(level=logging.ERROR)
+    baseline_rss = peak_rss_mb()
+    from src.utils.config import create_modular_flow
+    from src.api.api_client import GENERATION_ERROR
+
+    with tempfile.TemporaryDirectory() as directory, open(os.devnull, "w") as devnull:
+        steps_config = SCENARIOS[name](options, directory)
+        settings = base_settings(base_url, options)
+        # Les blocs en flux écrivent sur la sortie standard : elle est écartée pour ne pas fausser les mesures
+        with contextlib.redirect_stdout(devnull):
+            if name == "batch":
+                units, errors, elapsed, latencies = asyncio.run(run_batch(steps_config, settings, options, directory))
+                overheads: List[float] = []
+            else:
+                flow_manager = create_modular_flow(steps_config, API_KEYS, settings=settings)
+                elapsed = asyncio.run(run_flow_once(flow_manager))
+                outputs = [output for step in flow_manager.collect_outputs() for output in step]
+                units = len(outputs)
+                errors = sum(output == GENERATION_ERROR for output in outputs)
+                spans = flow_manager.telemetry.spans
+                blocks = {span.block: span.duration for span in spans if span.category == "block"}
+                # Surcoût du framework : durée du bloc moins les requêtes HTTP et l'attente d'une place de concurrence
+                http = {block: 0.0 for block in blocks}
+                for span in spans:
+                    if span.category in ("http", "embedding", "queue") and span.block in http:
+                        http[span.block] += span.duration
+                latencies = list(blocks.values())
+                overheads = [max(blocks[block] - http[block], 0.0) for block in blocks] if name in ("wide", "deep") else []
+
+    return {
+        "scenario": name,
+        "units": units,
+        "unit": "record" if name == "batch" else "block",
+        "errors": errors,
+        "wall_seconds": round(elapsed, 3),
+        "throughput": round(units / elapsed, 2) if elapsed else None,
+        "latency_ms": latency_summary(latencies),
+        "overhead_ms": latency_summary(overheads) if overheads else None,
+        "baseline_rss_mb": baseline_rss,
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+def fetch_stats(base_url: str) -> Dict[str, int]:
+    with urllib.request.urlopen(f"{base_url}/stats", timeout=5) as response:
+        return json.loads(response.read())
+
+def start_mock_provider(args: argparse.Namespace) -> Tuple[subprocess.Popen, str]:
+    # Le serveur simulé tourne dans son propre processus : son coût n'entre pas dans les mesures du framework
+    base_url = f"http://127.0.0.1:{args.port}"
+    process = subprocess.Popen([
+        sys.executable, os.path.join(ROOT, "benchmarks", "mock_provider.py"), "--port", str(args.port),
+        "--latency", args.latency, "--error-rate", str(args.error_rate), "--seed", str(args.seed),
+        "--stream-delay", str(args.stream_delay),
+    ])
+    deadline = time.monotonic() + 15
+    while True:
+        try:
+            fetch_stats(base_url)
+            return process, base_url
+        except OSError:
+            if process.poll() is not None or time.monotonic() > deadline:
+                process.kill()
+                raise RuntimeError("Le fournisseur simulé n'a pas démarré")
+            time.sleep(0.1)
+
+def compare(results: List[Dict[str, Any]], baseline_path: str, tolerance: float) -> List[str]:
+    with open(baseline_path, "r", encoding="utf-8") as file:
+        baseline = {result["scenario"]: result for result in json.load(file)["results"]}
+    regressions = []
+    for result in results:
+        previous = baseline.get(result["scenario"])
+        if previous is None:
+            continue
+        checks = [
+            ("throughput", previous["throughput"], result["throughput"], False),
+            ("latency p95", previous["latency_ms"]["p95"], result["latency_ms"]["p95"], True),
+            ("peak RSS", previous["peak_rss_mb"], result["peak_rss_mb"], True),
+        ]
+        for label, before, after, higher_is_worse in checks:
+            if not before or after is None:
+                continue
+            change = (after - before) / before
+            print(f"  {result['scenario']:<10} {label:<12} {before:>10} -> {after:>10} ({change:+.1%})")
+            if (change > tolerance) if higher_is_worse else (change < -tolerance):
+                regressions.append(f"{result['scenario']} {label} {change:+.1%}")
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark du flux face à un fournisseur LLM simulé")
+    parser.add_argument("--scenarios", nargs="+", choices=list(SCENARIOS), default=list(SCENARIOS))
+    parser.add_argument("--output", help="Fichier JSON des résultats")
+    parser.add_argument("--compare", help="Résultats de référence : signale les écarts au-delà de --tolerance")
+    parser.add_argument("--tolerance", type=float, default=0.2)
+    parser.add_argument("--port", type=int, default=8900)
+    parser.add_argument("--latency", default="lognormal:0.05:0.5")
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--stream-delay", type=float, default=0.002)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--width", type=int, default=500)
+    parser.add_argument("--depth", type=int, default=50)
+    parser.add_argument("--search-blocks", type=int, default=8)
+    parser.add_argument("--corpus-words", type=int, default=200000)
+    parser.add_argument("--oversized-blocks", type=int, default=4)
+    parser.add_argument("--oversized-words", type=int, default=40000)
+    parser.add_argument("--records", type=int, default=500)
+    args = parser.parse_args()
+
+    options = {key: getattr(args, key) for key in ("concurrency", "width", "depth", "search_blocks", "corpus_words",
+                                                    "oversized_blocks", "oversized_words", "records")}
+    process, base_url = start_mock_provider(args)
+    results = []
+    try:
+        for name in args.scenarios:
+            before = fetch_stats(base_url)
+            with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn")) as executor:
+                result = executor.submit(run_scenario, name, base_url, options).result()
+            after = fetch_stats(base_url)
+            result["provider_requests"] = {key: after[key] - before[key] for key in after}
+            results.append(result)
+            latency = result["latency_ms"]
+            print(f"{name:<10} {result['units']:>6} {result['unit']}s en {result['wall_seconds']:>7.2f}s "
+                  f"{result['throughput']:>9.1f}/s  p50 {latency['p50']:>9.1f} ms  p95 {latency['p95']:>9.1f} ms  "
+                  f"p99 {latency['p99']:>9.1f} ms  RSS max {result['peak_rss_mb']} Mo  erreurs {result['errors']}")
+    finally:
+        process.terminate()
+        process.wait()
+
+    report = {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "provider": {"latency": args.latency, "error_rate": args.error_rate, "stream_delay": args.stream_delay,
+                     "seed": args.seed},
+        "options": options,
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as file:
+            json.dump(report, file, indent=2, ensure_ascii=False)
+        print(f"Résultats écrits dans {args.output}")
+    else:
+        print(json.dumps(report, indent=2, ensure_ascii=False))
+
+    if args.compare:
+        regressions = compare(results, args.compare, args.tolerance)
+        if regressions:
+            print(f"Régressions au-delà de {args.tolerance:.0%} : {', '.join(regressions)}")
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
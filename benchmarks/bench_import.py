@@ -0,0 +1,119 @@
+# benchmarks/bench_import.py
+# Temps d'import et mémoire des points d'entrée, et vérification que le chemin d'exécution sans interface
+# (flux, lots, travailleurs) ne charge ni IPython, ni graphviz, ni colorama, ni fpdf.
+# Usage : python benchmarks/bench_import.py [--repeat 5] [--output results.json]   (code de sortie 1 si un module interdit est chargé)
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+from typing import Any, Dict, List
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+HEAVY_MODULES = ("IPython", "graphviz", "colorama", "fpdf", "bs4")
+ENTRY_POINTS = ("src.utils.config", "src.flow", "src.utils.batch_runner", "src.utils.worker_pool", "run")
+
+IMPORT_PROBE = """
+import json, resource, sys, time
+sys.path.insert(0, {root!r})
+start = time.perf_counter()
+__import__({module!r})
+elapsed = time.perf_counter() - start
+print(json.dumps({{
+    "seconds": elapsed,
+    "peak_rss_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+    "modules": len(sys.modules),
+    "heavy": sorted(name for name in {heavy!r} if name in sys.modules),
+}}))
+"""
+
+# Un petit flux complet (flux, sauvegarde txt et jsonl) lancé par run_flow, comme la commande run.py, contre le
+# fournisseur simulé dans le même processus
+RUN_PROBE = """
+import asyncio, json, os, sys, tempfile
+sys.path.insert(0, {root!r})
+sys.path.insert(0, os.path.join({root!r}, "benchmarks"))
+from src.utils.config import create_modular_flow
+from mock_provider import MockProvider
+
+async def main(directory):
+    runner = await MockProvider(latency="fixed:0.001").start("127.0.0.1", {port})
+    base_url = "http://127.0.0.1:{port}"
+    steps = [
+        {{"blocks": [{{"prompt": "A", "model": "gpt-4o-mini", "stream": True,
+                      "save_output": {{"format": "txt", "filename": os.path.join(directory, "a.txt")}}}},
+                    {{"prompt": "B", "model": "claude-3-haiku-20240307"}}]}},
+        {{"blocks": [{{"prompt": "C", "model": "mistral-small-latest", "inputs": [[0, 0], [0, 1]],
+                      "save_output": {{"format": "jsonl", "filename": os.path.join(directory, "c.jsonl")}}}}]}},
+    ]
+    settings = {{"api_client": {{"base_urls": {{"openai": base_url, "anthropic": base_url, "mistral": base_url}}}},
+                "telemetry": {{"summary": False}}}}
+    flow_manager = create_modular_flow(steps, {{"openai": "k", "anthropic": "k", "mistral": "k"}}, settings=settings)
+    try:
+        await flow_manager.run_flow()
+    finally:
+        await runner.cleanup()
+
+with tempfile.TemporaryDirectory() as directory, open(os.devnull, "w") as devnull:
+    stdout, sys.stdout = sys.stdout, devnull
+    try:
+        asyncio.run(main(directory))
+    finally:
+        sys.stdout = stdout
+print(json.dumps({{"heavy": sorted(name for name in {heavy!r} if name in sys.modules)}}))
+"""
+
+def probe(code: str) -> Dict[str, Any]:
+    # Un interpréteur neuf par mesure : aucun module n'est déjà en cache
+    result = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, cwd=ROOT)
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1] if result.stderr.strip() else "échec de la sonde")
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark du temps d'import et contrôle des imports lourds")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--port", type=int, default=8901)
+    parser.add_argument("--output", help="Fichier JSON des résultats")
+    args = parser.parse_args()
+
+    results: List[Dict[str, Any]] = []
+    failures = []
+    print(f"{'module':<24} {'import (ms)':>12} {'RSS max (Mo)':>13} {'modules':>8}  chargés à tort")
+    for module in ENTRY_POINTS:
+        runs = [probe(IMPORT_PROBE.format(root=ROOT, module=module, heavy=HEAVY_MODULES)) for _ in range(args.repeat)]
+        heavy = sorted({name for run in runs for name in run["heavy"]})
+        result = {
+            "module": module,
+            "import_ms": round(statistics.median(run["seconds"] for run in runs) * 1000, 1),
+            "import_ms_min": round(min(run["seconds"] for run in runs) * 1000, 1),
+            "peak_rss_mb": round(statistics.median(run["peak_rss_kb"] for run in runs) / 1024, 1),
+            "modules": runs[0]["modules"],
+            "heavy_modules": heavy,
+        }
+        results.append(result)
+        if heavy:
+            failures.append(f"import {module} : {', '.join(heavy)}")
+        print(f"{module:<24} {result['import_ms']:>12.1f} {result['peak_rss_mb']:>13.1f} {result['modules']:>8}  "
+              f"{', '.join(heavy) or '-'}")
+
+    run_heavy = probe(RUN_PROBE.format(root=ROOT, port=args.port, heavy=HEAVY_MODULES))["heavy"]
+    print(f"{'exécution du flux':<24} {'':>12} {'':>13} {'':>8}  {', '.join(run_heavy) or '-'}")
+    if run_heavy:
+        failures.append(f"exécution du flux : {', '.join(run_heavy)}")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as file:
+            json.dump({"python": sys.version.split()[0], "imports": results, "run_heavy_modules": run_heavy},
+                      file, indent=2)
+        print(f"Résultats écrits dans {args.output}")
+
+    # Profil sans interface : ces modules ne doivent être chargés que par l'affichage ou le rendu PDF
+    if failures:
+        print(f"Modules lourds chargés sur le chemin d'exécution : {'; '.join(failures)}")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,55 @@
+# benchmarks/bench_similarity.py
+# Compare la boucle cosinus historique de SemanticSearch au moteur vectorisé SimilarityIndex.
+# Usage : python benchmarks/bench_similarity.py [--sizes 1000 10000 100000] [--dim 1536]
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.flow.semantic_search import SemanticSearch
+from src.flow.similarity import SimilarityIndex
+
+def loop_search(query, chunk_embeddings, top_k):
+    similarities = [SemanticSearch.cosine_similarity(query, chunk_emb) for chunk_emb in chunk_embeddings]
+    return np.argsort(similarities)[-top_k:][::-1]
+
+def best_time(function, repeat: int) -> float:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de la recherche de similarité")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--dim", type=int, default=1536)
+    parser.add_argument("--top-k", type=int, default=3)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    print(f"{'chunks':>8} {'stockage':>9} {'boucle (ms)':>12} {'index (ms)':>11} {'gain':>7} {'mémoire (Mo)':>13} {'rappel top-k':>13}")
+    for size in args.sizes:
+        embeddings = rng.standard_normal((size, args.dim), dtype=np.float32)
+        query = rng.standard_normal(args.dim, dtype=np.float32)
+        embedding_lists = list(embeddings)
+        expected = loop_search(query, embedding_lists, args.top_k)
+        loop_time = best_time(lambda: loop_search(query, embedding_lists, args.top_k), args.repeat)
+
+        for dtype in ("float32", "float16", "int8"):
+            index = SimilarityIndex(embeddings, dtype)
+            found = [i for i, _ in index.search([query], args.top_k)[0]]
+            index_time = best_time(lambda: index.search([query], args.top_k), args.repeat)
+            print(
+                f"{size:>8} {dtype:>9} {loop_time * 1000:>12.2f} {index_time * 1000:>11.2f} "
+                f"{loop_time / index_time:>6.1f}x {index.matrix.nbytes / 1e6:>13.1f} {len(set(found) & set(expected.tolist())) / len(expected):>13.2f}"
+            )
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,181 @@
+# benchmarks/mock_provider.py
+# Fournisseur LLM simulé (OpenAI, Anthropic, Mistral) : mesure le coût propre du framework sans appel réseau externe.
+# Usage : python benchmarks/mock_provider.py [--port 8900] [--latency lognormal:0.2:0.5] [--error-rate 0.01]
+#         puis "settings.api_client.base_urls" : {"openai": "http://127.0.0.1:8900", "anthropic": ..., "mistral": ...}
+import argparse
+import asyncio
+import json
+import math
+import random
+import zlib
+from typing import Any, Callable, Dict, List, Optional
+
+import numpy as np
+from aiohttp import web
+
+WORDS = ("le", "flux", "bloc", "modèle", "réponse", "donnée", "étape", "analyse", "texte", "résultat",
+         "contexte", "synthèse", "question", "source", "sortie", "jeton")
+
+def parse_latency(spec: str) -> Callable[[random.Random], float]:
+    # fixed:S | uniform:MIN:MAX | lognormal:MEDIANE:SIGMA | exponential:MOYENNE (secondes)
+    kind, *values = spec.split(":")
+    params = [float(value) for value in values]
+    if kind == "fixed":
+        return lambda rng: params[0]
+    if kind == "uniform":
+        return lambda rng: rng.uniform(params[0], params[1])
+    if kind == "lognormal":
+        return lambda rng: rng.lognormvariate(math.log(params[0]), params[1])
+    if kind == "exponential":
+        return lambda rng: rng.expovariate(1 / params[0])
+    raise ValueError(f"Distribution de latence inconnue : {spec}")
+
+class MockProvider:
+    def __init__(self, latency: str = "fixed:0.05", error_rate: float = 0.0, error_status: int = 503,
+                 completion_tokens: int = 32, stream_chunks: int = 8, stream_delay: float = 0.005,
+                 embedding_dim: int = 256, embedding_latency: str = "fixed:0.02", seed: int = 0):
+        self.latency = parse_latency(latency)
+        self.embedding_latency = parse_latency(embedding_latency)
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.completion_tokens = completion_tokens
+        self.stream_chunks = stream_chunks
+        self.stream_delay = stream_delay
+        self.embedding_dim = embedding_dim
+        self.rng = random.Random(seed)
+        self.stats = {"chat": 0, "messages": 0, "embeddings": 0, "embedded_texts": 0, "streams": 0, "errors": 0}
+
+    def completion(self, prompt: str, max_tokens: int) -> List[str]:
+        count = max(1, min(self.completion_tokens, max_tokens))
+        offset = zlib.crc32(prompt.encode("utf-8"))
+        return [WORDS[(offset + i) % len(WORDS)] for i in range(count)]
+
+    def embedding(self, text: str) -> List[float]:
+        # Vecteur déterministe par texte : les recherches sont reproductibles d'une exécution à l'autre
+        return np.random.default_rng(zlib.crc32(text.encode("utf-8"))).standard_normal(self.embedding_dim).tolist()
+
+    async def simulate(self, latency: Callable[[random.Random], float]) -> bool:
+        await asyncio.sleep(latency(self.rng))
+        if self.rng.random() < self.error_rate:
+            self.stats["errors"] += 1
+            return False
+        return True
+
+    def error_response(self) -> web.Response:
+        headers = {"Retry-After": "0.1"} if self.error_status == 429 else {}
+        return web.json_response({"error": {"type": "mock_error", "message": "erreur simulée"}},
+                                 status=self.error_status, headers=headers)
+
+    @staticmethod
+    def sse(data: Dict[str, Any], event: Optional[str] = None) -> bytes:
+        prefix = f"event: {event}\n" if event else ""
+        return f"{prefix}data: {json.dumps(data, ensure_ascii=False)}\n\n".encode("utf-8")
+
+    async def stream(self, request: web.Request, words: List[str], start_events: List[bytes],
+                     delta_event: Callable[[str], bytes], end_events: List[bytes]) -> web.StreamResponse:
+        self.stats["streams"] += 1
+        response = web.StreamResponse(headers={"Content-Type": "text/event-stream"})
+        await response.prepare(request)
+        for event in start_events:
+            await response.write(event)
+        size = max(1, math.ceil(len(words) / self.stream_chunks))
+        for i in range(0, len(words), size):
+            await response.write(delta_event(" ".join(words[i:i + size]) + " "))
+            await asyncio.sleep(self.stream_delay)
+        for event in end_events:
+            await response.write(event)
+        await response.write_eof()
+        return response
+
+    async def chat(self, request: web.Request) -> web.StreamResponse:
+        # Format commun à OpenAI et Mistral
+        body = await request.json()
+        self.stats["chat"] += 1
+        if not await self.simulate(self.latency):
+            return self.error_response()
+        prompt = body["messages"][-1]["content"]
+        words = self.completion(prompt, body.get("max_tokens", self.completion_tokens))
+        usage = {"prompt_tokens": len(prompt.split()), "completion_tokens": len(words)}
+        if not body.get("stream"):
+            return web.json_response({
+                "choices": [{"message": {"role": "assistant", "content": " ".join(words)}, "finish_reason": "stop"}],
+                "usage": {**usage, "total_tokens": usage["prompt_tokens"] + usage["completion_tokens"]},
+            })
+        return await self.stream(
+            request, words, [],
+            lambda text: self.sse({"choices": [{"delta": {"content": text}}]}),
+            [self.sse({"choices": [], "usage": usage}), b"data: [DONE]\n\n"],
+        )
+
+    async def messages(self, request: web.Request) -> web.StreamResponse:
+        body = await request.json()
+        self.stats["messages"] += 1
+        if not await self.simulate(self.latency):
+            return self.error_response()
+        prompt = body["messages"][-1]["content"]
+        words = self.completion(prompt, body.get("max_tokens", self.completion_tokens))
+        if not body.get("stream"):
+            return web.json_response({
+                "content": [{"type": "text", "text": " ".join(words)}],
+                "usage": {"input_tokens": len(prompt.split()), "output_tokens": len(words)},
+            })
+        return await self.stream(
+            request, words,
+            [self.sse({"type": "message_start", "message": {"usage": {"input_tokens": len(prompt.split())}}},
+                      "message_start")],
+            lambda text: self.sse({"type": "content_block_delta", "delta": {"type": "text_delta", "text": text}},
+                                  "content_block_delta"),
+            [self.sse({"type": "message_delta", "usage": {"output_tokens": len(words)}}, "message_delta"),
+             self.sse({"type": "message_stop"}, "message_stop")],
+        )
+
+    async def embeddings(self, request: web.Request) -> web.Response:
+        body = await request.json()
+        texts = body["input"] if isinstance(body["input"], list) else [body["input"]]
+        self.stats["embeddings"] += 1
+        self.stats["embedded_texts"] += len(texts)
+        if not await self.simulate(self.embedding_latency):
+            return self.error_response()
+        return web.json_response({
+            "data": [{"index": i, "embedding": self.embedding(text)} for i, text in enumerate(texts)],
+            "usage": {"prompt_tokens": sum(len(text.split()) for text in texts)},
+        })
+
+    async def get_stats(self, request: web.Request) -> web.Response:
+        return web.json_response(self.stats)
+
+    def make_app(self) -> web.Application:
+        app = web.Application(client_max_size=256 * 1024 * 1024)
+        app.router.add_post("/chat/completions", self.chat)
+        app.router.add_post("/messages", self.messages)
+        app.router.add_post("/embeddings", self.embeddings)
+        app.router.add_get("/stats", self.get_stats)
+        return app
+
+    async def start(self, host: str = "127.0.0.1", port: int = 8900) -> web.AppRunner:
+        runner = web.AppRunner(self.make_app(), access_log=None)
+        await runner.setup()
+        await web.TCPSite(runner, host, port).start()
+        return runner
+
+def main():
+    parser = argparse.ArgumentParser(description="Fournisseur LLM simulé pour les benchmarks")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8900)
+    parser.add_argument("--latency", default="fixed:0.05", help="fixed:S, uniform:MIN:MAX, lognormal:MEDIANE:SIGMA ou exponential:MOYENNE")
+    parser.add_argument("--embedding-latency", default="fixed:0.02")
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--error-status", type=int, default=503)
+    parser.add_argument("--completion-tokens", type=int, default=32)
+    parser.add_argument("--stream-chunks", type=int, default=8)
+    parser.add_argument("--stream-delay", type=float, default=0.005)
+    parser.add_argument("--embedding-dim", type=int, default=256)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    provider = MockProvider(args.latency, args.error_rate, args.error_status, args.completion_tokens,
+                            args.stream_chunks, args.stream_delay, args.embedding_dim, args.embedding_latency, args.seed)
+    web.run_app(provider.make_app(), host=args.host, port=args.port, access_log=None, print=None)
+
+if __name__ == "__main__":
+    main()
@@ -1,10 +1,14 @@
 # run.py
+import argparse
 import asyncio
 import logging
 import os
 
 from dotenv import load_dotenv
-from src.utils.config import load_steps_config, create_modular_flow
+from src.utils.config import load_steps_config, load_settings_config, create_modular_flow
+from src.utils.batch_runner import BatchRunner
+from src.utils.worker_pool import WorkerPool, worker_main
+from src.flow.embedding_store import DEFAULT_DIRECTORY
 
 # Charger les variables d'environnement
 load_dotenv()
@@ -12,7 +16,44 @@ load_dotenv()
 # Configurer le logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Exécute un flux LLM défini dans un fichier de configuration.")
+    parser.add_argument("--config", default="config.json", help="Fichier de configuration du flux")
+    parser.add_argument("--quiet", action="store_true", help="N'affiche pas les résultats des étapes en fin d'exécution")
+    subparsers = parser.add_subparsers(dest="command")
+
+    warmup_parser = subparsers.add_parser("warmup", help="Pré-calcule les embeddings d'un corpus pour la recherche sémantique")
+    warmup_parser.add_argument("paths", nargs="+", help="Fichiers texte à découper et à indexer")
+
+    subparsers.add_parser("plan", help="Liste les blocs qui seraient exécutés, sans rien exécuter (points de contrôle)")
+
+    graph_parser = subparsers.add_parser("graph", help="Écrit le graphe du flux (DOT, ou rendu par Graphviz avec --format)")
+    graph_parser.add_argument("output", nargs="?", default="flow.dot", help="Fichier de sortie")
+    graph_parser.add_argument("--format", help="Format de rendu Graphviz (svg, png, pdf...) ; par défaut, code DOT brut")
+
+    batch_parser = subparsers.add_parser("batch", help="Exécute le flux pour chaque enregistrement d'un fichier JSONL")
+    batch_parser.add_argument("input", help="Fichier JSONL d'entrée, un enregistrement par ligne")
+    batch_parser.add_argument("output", help="Fichier JSONL de sortie, complété dans l'ordre de fin de traitement")
+    batch_parser.add_argument("--concurrency", type=int, default=16, help="Nombre de flux exécutés simultanément")
+    batch_parser.add_argument("--journal", help="Journal de reprise (par défaut : <output>.journal)")
+    batch_parser.add_argument("--id-field", default="id", help="Champ identifiant chaque enregistrement")
+
+    pool_parser = subparsers.add_parser("pool", help="Répartit les enregistrements d'un fichier JSONL entre plusieurs processus")
+    pool_parser.add_argument("input", help="Fichier JSONL d'entrée, un enregistrement par ligne")
+    pool_parser.add_argument("output", help="Fichier JSONL de sortie, trié par ordre de fin de traitement")
+    pool_parser.add_argument("--processes", type=int, help="Nombre de processus travailleurs (par défaut : nombre de cœurs)")
+    pool_parser.add_argument("--concurrency", type=int, default=16, help="Nombre de flux simultanés par processus")
+    pool_parser.add_argument("--queue", default=".llmflow_queue.sqlite", help="Fichier SQLite de la file de tâches")
+    pool_parser.add_argument("--id-field", default="id", help="Champ identifiant chaque enregistrement")
+
+    worker_parser = subparsers.add_parser("worker", help="Traite les tâches d'une file existante (autre machine ou renfort)")
+    worker_parser.add_argument("--queue", default=".llmflow_queue.sqlite", help="Fichier SQLite de la file de tâches")
+    worker_parser.add_argument("--concurrency", type=int, default=16, help="Nombre de flux simultanés")
+    return parser.parse_args()
+
 def main():
+    args = parse_args()
+
     # Récupérer les clés API depuis les variables d'environnement
     api_keys = {
         "openai": os.getenv("OPENAI_API_KEY"),
@@ -20,14 +61,57 @@ def main():
         "mistral": os.getenv("MISTRAL_API_KEY")
     }
 
-    # Charger la configuration des étapes depuis le fichier config.json
-    steps_config = load_steps_config("config.json")
+    # Charger la configuration des étapes depuis le fichier de configuration
+    steps_config = load_steps_config(args.config)
+    settings = load_settings_config(args.config)
+
+    if args.command == "warmup":
+        # Le pré-calcul n'a de sens qu'avec un cache d'embeddings persistant
+        settings.setdefault("embedding_store", {})
+        flow_manager = create_modular_flow(steps_config, api_keys, settings=settings)
+        texts = []
+        for path in args.paths:
+            with open(path, 'r', encoding='utf-8') as file:
+                texts.append(file.read())
+        count = asyncio.run(flow_manager.warm_up_embeddings(texts))
+        logging.info(f"{count} segments indexés dans {settings['embedding_store'].get('directory', DEFAULT_DIRECTORY)}")
+        return
+
+    if args.command == "plan":
+        flow_manager = create_modular_flow(steps_config, api_keys, settings=settings)
+        if flow_manager.run_store is None:
+            logging.warning("Aucun point de contrôle configuré (settings.run_store) : tous les blocs seraient exécutés")
+        flow_manager.display_plan()
+        return
+
+    if args.command == "graph":
+        flow_manager = create_modular_flow(steps_config, api_keys, settings=settings)
+        logging.info(f"Graphe du flux écrit dans {flow_manager.render_graph(args.output, args.format)}")
+        return
+
+    if args.command == "batch":
+        runner = BatchRunner(steps_config, api_keys, settings=settings, concurrency=args.concurrency,
+                             journal_path=args.journal or f"{args.output}.journal", id_field=args.id_field)
+        asyncio.run(runner.run(args.input, args.output))
+        return
+
+    if args.command in ("pool", "worker"):
+        pool = WorkerPool(steps_config, api_keys, settings=settings, queue_path=args.queue,
+                          processes=getattr(args, "processes", None), concurrency=args.concurrency)
+        if args.command == "worker":
+            worker_main(steps_config, api_keys, pool.settings, args.queue, args.concurrency)
+            return
+        pool.submit(args.input, args.id_field)
+        pool.run()
+        count = pool.export(args.output)
+        logging.info(f"{count} résultats écrits dans {args.output}")
+        return
 
     # Créer le FlowManager avec la configuration des étapes
-    flow_manager = create_modular_flow(steps_config, api_keys)
+    flow_manager = create_modular_flow(steps_config, api_keys, settings=settings)
 
     # Exécuter le flux
-    asyncio.run(flow_manager.run_flow())
+    asyncio.run(flow_manager.run_flow(display=not args.quiet))
 
 if __name__ == "__main__":
     main()
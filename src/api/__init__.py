@@ -1,3 +1,13 @@
 # src/api/__init__.py
 from .model_api import ModelAPI, OpenAIAPI, AnthropicAPI, MistralAPI
+from .model_api import ExternalData, HTTPData, WebData, APIData, TXTData, CSVData
 from .api_client import APIClient
+from .rate_limiter import RateLimiter, TokenBucket, SharedBudget
+from .retry import RetryPolicy, CircuitBreaker
+from .response_cache import ResponseCache
+from .embedding_batcher import EmbeddingBatcher
+from .model_registry import get_context_limit, get_provider, get_model_price
+from .http_cache import HTTPCache
+from .data_loader import DataLoader
+from .telemetry import Telemetry
+from .routing import LatencyTracker, RoutingPolicy
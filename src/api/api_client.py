@@ -1,88 +1,377 @@
 # src/api/api_client.py
 import aiohttp
+import asyncio
 import logging
-from typing import List, Dict, Any
+import time
+from typing import List, Dict, Any, Optional, AsyncIterator, Tuple
 
 from .model_api import OpenAIAPI, AnthropicAPI, MistralAPI
+from .rate_limiter import RateLimiter
+from .model_registry import get_context_limit, get_provider
+from .retry import RetryPolicy, CircuitBreaker
+from .response_cache import ResponseCache
+from .telemetry import Telemetry
+from .routing import LatencyTracker, RoutingPolicy
+from .embedding_batcher import EmbeddingBatcher
 from src.utils.token_utils import num_tokens_from_string
-from src.utils.exceptions import APIException
+from src.utils.chunking import chunk_text
+from src.utils.exceptions import APIException, CircuitOpenException, StreamInterruptedException
+
+DEFAULT_REDUCE_PROMPT = "Résumé du texte suivant :\n\n{text}"
+GENERATION_ERROR = "Erreur : Impossible de générer le texte."
 
 class APIClient:
-    def __init__(self, api_keys: Dict[str, str]):
+    def __init__(self, api_keys: Dict[str, str], base_urls: Optional[Dict[str, str]] = None,
+                 connection_limit: int = 100, connection_limit_per_host: int = 20,
+                 dns_cache_ttl: int = 300, keepalive_timeout: float = 30.0,
+                 rate_limits: Optional[Dict[str, Dict[str, float]]] = None, max_concurrency: int = 32,
+                 retry: Optional[Dict[str, float]] = None, circuit_breaker: Optional[Dict[str, float]] = None,
+                 cache: Optional[Dict[str, Any]] = None, embedding_batching: Optional[Dict[str, Any]] = None,
+                 rate_limit_store: Optional[str] = None, telemetry: Optional[Telemetry] = None,
+                 latency_tracking: Optional[Dict[str, float]] = None):
+        base_urls = base_urls or {}
+        api_classes = {"openai": OpenAIAPI, "anthropic": AnthropicAPI, "mistral": MistralAPI}
+        # Chaque fournisseur a son propre disjoncteur : une panne chez l'un ne bloque pas les autres
         self.apis = {
-            "openai": OpenAIAPI(api_keys.get("openai")),
-            "anthropic": AnthropicAPI(api_keys.get("anthropic")),
-            "mistral": MistralAPI(api_keys.get("mistral")),
+            name: api_class(
+                api_keys.get(name), base_urls.get(name),
+                retry_policy=RetryPolicy(**(retry or {})),
+                circuit_breaker=CircuitBreaker(api_class.provider_name, **(circuit_breaker or {})),
+            )
+            for name, api_class in api_classes.items()
         }
+        self.connection_limit = connection_limit
+        self.connection_limit_per_host = connection_limit_per_host
+        self.dns_cache_ttl = dns_cache_ttl
+        self.keepalive_timeout = keepalive_timeout
+        self._session: Optional[aiohttp.ClientSession] = None
+        self.rate_limiter = RateLimiter(rate_limits, max_concurrency, rate_limit_store)
+        self.response_cache = ResponseCache(**(cache or {}))
+        self.telemetry = telemetry or Telemetry()
+        self.latency_tracker = LatencyTracker(**(latency_tracking or {}))
+        embedding_model = self.apis["openai"].embedding_model
+        self.embedding_batcher = EmbeddingBatcher(
+            self.send_embedding_batch, lambda text: num_tokens_from_string(text, embedding_model),
+            **(embedding_batching or {})
+        )
+
+    def get_session(self) -> aiohttp.ClientSession:
+        # Une seule session pour tout le flux : les connexions TCP/TLS vers chaque fournisseur sont réutilisées
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=self.connection_limit,
+                limit_per_host=self.connection_limit_per_host,
+                ttl_dns_cache=self.dns_cache_ttl,
+                keepalive_timeout=self.keepalive_timeout,
+            )
+            self._session = aiohttp.ClientSession(connector=connector)
+        return self._session
+
+    async def close(self):
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+        self.response_cache.close()
+
+    def pool_stats(self) -> Dict[str, Optional[int]]:
+        stats = {"limit": self.connection_limit, "limit_per_host": self.connection_limit_per_host}
+        if self._session is None or self._session.closed:
+            return {**stats, "open": 0, "in_use": 0, "idle": 0, "waiting": 0}
+        connector = self._session.connector
+        try:
+            # aiohttp n'expose pas ces compteurs : ses attributs internes peuvent changer d'une version à l'autre
+            idle = sum(len(conns) for conns in connector._conns.values())
+            in_use = len(connector._acquired)
+            waiting = sum(len(waiters) for waiters in connector._waiters.values())
+        except (AttributeError, TypeError):
+            return {**stats, "open": None, "in_use": None, "idle": None, "waiting": None}
+        return {**stats, "open": idle + in_use, "in_use": in_use, "idle": idle, "waiting": waiting}
 
     async def generate_text(self, session: aiohttp.ClientSession, model: str, prompt: str, 
-                            temperature: float, max_tokens: int) -> str:
-        if model.startswith(("gpt", "text-davinci")):
-            api_type = "openai"
-        elif model.startswith("claude"):
-            api_type = "anthropic"
-        elif model.startswith("mistral"):
-            api_type = "mistral"
-        else:
-            raise ValueError(f"Unsupported model: {model}")
-        
+                            temperature: float, max_tokens: int, cache: Optional[bool] = None,
+                            map_reduce: Optional[Dict[str, Any]] = None, routing: Optional[Dict[str, Any]] = None) -> str:
+        api_type = get_provider(model)
+
         try:
-            token_limit = 16000  # Ajuster en fonction du modèle
-            if num_tokens_from_string(prompt, model) > token_limit:
+            token_limit = self.prompt_token_limit(model, max_tokens)
+            prompt_tokens = num_tokens_from_string(prompt, model)
+            if prompt_tokens > token_limit:
                 logging.info(f"Prompt dépasse la limite de tokens. Division en plusieurs parties.")
-                return await self.split_and_process(session, model, prompt, temperature, max_tokens, token_limit)
+                return await self.split_and_process(session, model, prompt, temperature, max_tokens, token_limit, cache,
+                                                    map_reduce, routing)
+            elif self.response_cache.should_use(cache):
+                key = ResponseCache.make_key(api_type, model, prompt, temperature, max_tokens)
+
+                async def compute() -> Tuple[str, bool]:
+                    text, answered_by = await self.call_routed(session, model, prompt, temperature, max_tokens,
+                                                               prompt_tokens, routing)
+                    # La clé désigne le modèle principal : une réponse de repli ou doublée n'est pas conservée
+                    return text, answered_by == model
+
+                return await self.response_cache.get_or_compute(key, compute)
             else:
-                response = await self.apis[api_type].generate_text(session, model, prompt, temperature, max_tokens)
-                return self.apis[api_type].extract_text_from_response(response)
+                text, _ = await self.call_routed(session, model, prompt, temperature, max_tokens, prompt_tokens, routing)
+                return text
         except APIException as e:
             logging.error(f"Erreur API: {str(e)}")
-            return "Erreur : Impossible de générer le texte."
+            return GENERATION_ERROR
+
+    @staticmethod
+    def prompt_token_limit(model: str, max_tokens: int) -> int:
+        # La fenêtre de contexte doit contenir le prompt et la réponse attendue
+        context_limit = get_context_limit(model)
+        return max(context_limit - max_tokens, context_limit // 2)
+
+    @staticmethod
+    def completion_token_limit(model: str, prompt_tokens: int, max_tokens: int) -> int:
+        # Un prompt admis peut occuper jusqu'à la moitié de la fenêtre : la réponse est alors réduite à la place restante
+        return min(max_tokens, get_context_limit(model) - prompt_tokens)
+
+    async def stream_text(self, session: aiohttp.ClientSession, model: str, prompt: str,
+                          temperature: float, max_tokens: int, cache: Optional[bool] = None,
+                          map_reduce: Optional[Dict[str, Any]] = None,
+                          routing: Optional[Dict[str, Any]] = None) -> AsyncIterator[str]:
+        api_type = get_provider(model)
+        prompt_tokens = num_tokens_from_string(prompt, model)
+        if prompt_tokens > self.prompt_token_limit(model, max_tokens):
+            # Le map-reduce ne peut produire sa réponse qu'en un seul fragment
+            yield await self.generate_text(session, model, prompt, temperature, max_tokens, cache, map_reduce, routing)
+            return
+
+        use_cache = self.response_cache.should_use(cache)
+        key = ResponseCache.make_key(api_type, model, prompt, temperature, max_tokens)
+        if use_cache:
+            cached = await self.response_cache.get(key)
+            if cached is not None:
+                yield cached
+                return
+
+        # En flux, seul le repli s'applique : une réponse entamée ne peut être ni doublée ni rejouée ailleurs
+        candidate_tokens = (self.routing_candidates(model, RoutingPolicy(**routing), prompt, prompt_tokens, max_tokens)
+                            if routing else {model: prompt_tokens})
+        candidates = list(candidate_tokens)
+        deltas = []
+        start = time.perf_counter()
+        for index, candidate in enumerate(candidates):
+            api_type = get_provider(candidate)
+            candidate_max_tokens = self.completion_token_limit(candidate, candidate_tokens[candidate], max_tokens)
+            usage: Dict[str, int] = {}
+            wait_start = request_start = time.perf_counter()
+            try:
+                async with self.rate_limiter.acquire(api_type, candidate, candidate_tokens[candidate] + candidate_max_tokens):
+                    request_start = time.perf_counter()
+                    self.telemetry.add_span("rate_limit", "queue", wait_start, request_start, provider=api_type,
+                                            model=candidate)
+                    async for delta in self.apis[api_type].stream_text(session, candidate, prompt, temperature,
+                                                                       candidate_max_tokens, usage):
+                        if not deltas:
+                            self.telemetry.add_span("first_token", "ttft", request_start, time.perf_counter(),
+                                                    model=candidate)
+                        deltas.append(delta)
+                        yield delta
+                break
+            except APIException as e:
+                logging.error(f"Erreur API: {str(e)}")
+                self.telemetry.count("llmflow_requests_total", provider=api_type, model=candidate, status="error")
+                if not isinstance(e, CircuitOpenException):
+                    self.latency_tracker.observe_failure(api_type, time.perf_counter() - request_start)
+                if deltas:
+                    # Réponse entamée puis coupée : le texte partiel n'est ni mis en cache ni compté comme un succès
+                    raise StreamInterruptedException(
+                        f"Flux de {candidate} interrompu après {len(deltas)} fragment(s) : {str(e)}", e.status, e.headers
+                    ) from e
+                if index + 1 == len(candidates):
+                    yield GENERATION_ERROR
+                    return
+                logging.info(f"Repli de {candidate} vers {candidates[index + 1]}")
+                self.telemetry.count("llmflow_fallbacks_total", provider=get_provider(candidates[index + 1]),
+                                     model=candidates[index + 1])
+
+        self.telemetry.count("llmflow_requests_total", provider=api_type, model=candidate, status="ok")
+        self.telemetry.add_span(f"stream {api_type}", "http", request_start, time.perf_counter(),
+                                **self.record_usage(api_type, candidate, usage, candidate_tokens[candidate],
+                                                    "".join(deltas)))
+
+        if use_cache and candidate == model:
+            await self.response_cache.set(key, "".join(deltas).strip(), time.perf_counter() - start)
+
+    async def call_model(self, session: aiohttp.ClientSession, api_type: str, model: str, prompt: str,
+                         temperature: float, max_tokens: int, prompt_tokens: int) -> str:
+        api = self.apis[api_type]
+        max_tokens = self.completion_token_limit(model, prompt_tokens, max_tokens)
+        wait_start = time.perf_counter()
+        async with self.rate_limiter.acquire(api_type, model, prompt_tokens + max_tokens):
+            self.telemetry.add_span("rate_limit", "queue", wait_start, time.perf_counter(), provider=api_type, model=model)
+            with self.telemetry.span(f"POST {api_type}", "http", provider=api_type, model=model) as attributes:
+                request_start = time.perf_counter()
+                try:
+                    response = await api.generate_text(session, model, prompt, temperature, max_tokens)
+                except APIException as e:
+                    # Disjoncteur ouvert : aucune requête n'est partie, il n'y a pas de latence à mesurer
+                    if not isinstance(e, CircuitOpenException):
+                        self.latency_tracker.observe_failure(api_type, time.perf_counter() - request_start)
+                    self.telemetry.count("llmflow_requests_total", provider=api_type, model=model, status="error")
+                    raise
+                except asyncio.CancelledError:
+                    # Perdante d'une requête doublée : sa latence réelle est au moins celle observée
+                    self.latency_tracker.observe_cancelled(api_type, time.perf_counter() - request_start)
+                    raise
+                self.latency_tracker.observe(api_type, time.perf_counter() - request_start)
+                text = api.extract_text_from_response(response)
+                attributes.update(self.record_usage(api_type, model, api.extract_usage(response), prompt_tokens, text))
+        self.telemetry.count("llmflow_requests_total", provider=api_type, model=model, status="ok")
+        return text
+
+    def routing_candidates(self, model: str, policy: RoutingPolicy, prompt: str, prompt_tokens: int,
+                           max_tokens: int) -> Dict[str, int]:
+        # Candidats dans l'ordre d'essai, avec la taille du prompt pour leur propre tokenizer
+        unavailable = [name for name, api in self.apis.items() if api.circuit_breaker.state == "open"]
+        candidates = {}
+        for candidate in policy.candidates(model, self.latency_tracker, unavailable):
+            tokens = prompt_tokens if candidate == model else num_tokens_from_string(prompt, candidate)
+            if tokens > self.prompt_token_limit(candidate, max_tokens):
+                logging.info(f"{candidate} écarté du routage : le prompt ({tokens} tokens) dépasse sa fenêtre de contexte")
+                continue
+            candidates[candidate] = tokens
+        return candidates
+
+    async def call_routed(self, session: aiohttp.ClientSession, model: str, prompt: str, temperature: float,
+                          max_tokens: int, prompt_tokens: int,
+                          routing: Optional[Dict[str, Any]] = None) -> Tuple[str, str]:
+        # Renvoie la réponse et le modèle qui l'a produite
+        if not routing:
+            text = await self.call_model(session, get_provider(model), model, prompt, temperature, max_tokens,
+                                         prompt_tokens)
+            return text, model
+        policy = RoutingPolicy(**routing)
+        candidate_tokens = self.routing_candidates(model, policy, prompt, prompt_tokens, max_tokens)
+        candidates = list(candidate_tokens)
+        hedge_delay = policy.hedge_delay(candidates[0], self.latency_tracker)
+        tasks: Dict[asyncio.Task, str] = {}
+        launched = 0
+        hedges = 0
+        last_error: Optional[APIException] = None
+
+        def launch():
+            nonlocal launched
+            candidate = candidates[launched]
+            launched += 1
+            tasks[asyncio.ensure_future(self.call_model(
+                session, get_provider(candidate), candidate, prompt, temperature, max_tokens, candidate_tokens[candidate]
+            ))] = candidate
+
+        launch()
+        try:
+            while tasks:
+                can_hedge = hedge_delay is not None and hedges < policy.max_hedges and launched < len(candidates)
+                done, _ = await asyncio.wait(tasks, timeout=hedge_delay if can_hedge else None,
+                                             return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    # Seuil de latence dépassé : une requête en double part vers le candidat suivant, la première réponse gagne
+                    hedges += 1
+                    logging.info(f"{model} : pas de réponse après {hedge_delay:.2f}s, requête doublée vers {candidates[launched]}")
+                    self.telemetry.count("llmflow_hedges_total", provider=get_provider(candidates[launched]),
+                                         model=candidates[launched])
+                    launch()
+                    continue
+                for task in done:
+                    candidate = tasks.pop(task)
+                    error = task.exception()
+                    if error is None:
+                        if candidate != model:
+                            self.telemetry.count("llmflow_routed_responses_total", provider=get_provider(candidate),
+                                                 model=candidate)
+                        return task.result(), candidate
+                    if not isinstance(error, APIException):
+                        raise error
+                    last_error = error
+                    logging.warning(f"{candidate} a échoué : {str(error)[:200]}")
+                if not tasks and launched < len(candidates):
+                    logging.info(f"Repli de {model} vers {candidates[launched]}")
+                    self.telemetry.count("llmflow_fallbacks_total", provider=get_provider(candidates[launched]),
+                                         model=candidates[launched])
+                    launch()
+            raise last_error
+        finally:
+            # Les requêtes perdantes sont annulées : leur créneau de concurrence est rendu aussitôt
+            for task in tasks:
+                task.cancel()
+            if tasks:
+                await asyncio.gather(*tasks, return_exceptions=True)
+
+    def record_usage(self, api_type: str, model: str, usage: Optional[Dict[str, int]],
+                     prompt_tokens: int, text: str) -> Dict[str, Any]:
+        # Sans champ « usage » dans la réponse, la consommation est estimée avec tiktoken
+        if usage:
+            return self.telemetry.record_usage(api_type, model, usage["prompt_tokens"], usage["completion_tokens"])
+        return self.telemetry.record_usage(api_type, model, prompt_tokens, num_tokens_from_string(text, model),
+                                           estimated=True)
 
     async def split_and_process(self, session: aiohttp.ClientSession, model: str, prompt: str, 
-                                temperature: float, max_tokens: int, token_limit: int) -> str:
-        parts = self.split_prompt(prompt, token_limit)
-        responses = []
+                                temperature: float, max_tokens: int, token_limit: int,
+                                cache: Optional[bool] = None, map_reduce: Optional[Dict[str, Any]] = None,
+                                routing: Optional[Dict[str, Any]] = None) -> str:
+        options = map_reduce or {}
+        map_template = options.get("map_prompt", "{text}")
+        reduce_template = options.get("reduce_prompt", DEFAULT_REDUCE_PROMPT)
+        fan_in = max(2, options.get("fan_in", 2))
 
-        for i, part in enumerate(parts):
-            logging.info(f"Traitement de la partie {i+1} sur {len(parts)}")
-            response = await self.generate_text(session, model, part, temperature, max_tokens // len(parts))
-            responses.append(response)
-            logging.info(f"Partie {i+1} traitée")
+        template_tokens = num_tokens_from_string(map_template.replace("{text}", ""), model)
+        parts = self.split_prompt(prompt, max(1, token_limit - template_tokens), model, options.get("overlap", 0))
+        map_max_tokens = options.get("map_max_tokens", max(1, max_tokens // len(parts)))
 
-        response_combinee = " ".join(responses)
+        # Phase map : toutes les parties partent en parallèle, sous les limites de débit du client
+        logging.info(f"Traitement de {len(parts)} parties en parallèle")
+        responses = list(await asyncio.gather(*(
+            self.generate_text(session, model, map_template.replace("{text}", part), temperature, map_max_tokens, cache,
+                               routing=routing)
+            for part in parts
+        )))
+        failed = responses.count(GENERATION_ERROR)
+        if failed:
+            # Une synthèse sans ces parties serait incomplète sans que rien ne le signale : le bloc échoue
+            logging.error(f"{failed} partie(s) sur {len(parts)} en échec : réduction abandonnée")
+            return GENERATION_ERROR
         logging.info("Toutes les parties traitées. Combinaison des réponses.")
 
-        if num_tokens_from_string(response_combinee, model) > token_limit:
-            logging.info("Réponse combinée dépasse la limite de tokens. Génération d'un résumé.")
-            summary_prompt = f"Résumé du texte suivant :\n\n{response_combinee}"
-            final_response = await self.generate_text(session, model, summary_prompt, temperature, max_tokens)
-            logging.info("Résumé généré.")
-            return final_response
-        else:
-            logging.info("Retour de la réponse combinée.")
-            return response_combinee
-
-    def split_prompt(self, prompt: str, token_limit: int) -> List[str]:
-        words = prompt.split()
-        parts = []
-        current_part = []
-        current_tokens = 0
-
-        for word in words:
-            word_tokens = num_tokens_from_string(word, "gpt-3.5-turbo")
-            if current_tokens + word_tokens > token_limit:
-                if current_part:
-                    parts.append(" ".join(current_part))
-                current_part = [word]
-                current_tokens = word_tokens
-            else:
-                current_part.append(word)
-                current_tokens += word_tokens
+        # Phase reduce en arbre : fan_in réponses par appel, donc une profondeur logarithmique
+        level = 0
+        while len(responses) > 1:
+            response_combinee = "\n\n".join(responses)
+            if "reduce_prompt" not in options and num_tokens_from_string(response_combinee, model) <= token_limit:
+                logging.info("Retour de la réponse combinée.")
+                return response_combinee
+            level += 1
+            groups = [responses[i:i + fan_in] for i in range(0, len(responses), fan_in)]
+            logging.info(f"Réduction niveau {level} : {len(responses)} réponses en {len(groups)} groupes")
+            responses = list(await asyncio.gather(*(
+                self.generate_text(session, model, reduce_template.replace("{text}", "\n\n".join(group)),
+                                   temperature, max_tokens, cache, routing=routing)
+                if len(group) > 1 else self.passthrough(group[0])
+                for group in groups
+            )))
+            if GENERATION_ERROR in responses:
+                logging.error(f"Réduction niveau {level} en échec : réduction abandonnée")
+                return GENERATION_ERROR
+        return responses[0]
 
-        if current_part:
-            parts.append(" ".join(current_part))
+    @staticmethod
+    async def passthrough(text: str) -> str:
+        return text
 
-        return parts
+    def split_prompt(self, prompt: str, token_limit: int, model: str = "gpt-3.5-turbo", overlap: int = 0) -> List[str]:
+        return chunk_text(prompt, token_limit, overlap, model)
 
     async def get_embeddings(self, session: aiohttp.ClientSession, texts: List[str]) -> List[List[float]]:
-        return await self.apis["openai"].get_embeddings(session, texts)
+        return await self.embedding_batcher.embed(session, texts)
+
+    async def send_embedding_batch(self, session: aiohttp.ClientSession, texts: List[str], tokens: int) -> List[List[float]]:
+        api = self.apis["openai"]
+        wait_start = time.perf_counter()
+        async with self.rate_limiter.acquire("openai", api.embedding_model, tokens):
+            self.telemetry.add_span("rate_limit", "queue", wait_start, time.perf_counter(), provider="openai",
+                                    model=api.embedding_model)
+            with self.telemetry.span("POST embeddings", "embedding", model=api.embedding_model, texts=len(texts)) as attributes:
+                embeddings = await api.get_embeddings(session, texts)
+                attributes.update(self.telemetry.record_usage("openai", api.embedding_model, tokens, 0, estimated=True))
+        return embeddings
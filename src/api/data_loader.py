@@ -0,0 +1,48 @@
+# src/api/data_loader.py
+import asyncio
+from typing import Dict, Iterable, Optional
+
+import aiohttp
+
+from .http_cache import HTTPCache
+from .model_api import ExternalData, HTTPData
+
+class DataLoader:
+    def __init__(self, http_cache: Optional[HTTPCache] = None, max_concurrency: int = 8):
+        self.http_cache = http_cache
+        self.max_concurrency = max_concurrency
+        # Un chargement par source et par exécution, partagé par tous les blocs qui la référencent
+        self.tasks: Dict[str, asyncio.Task] = {}
+        self._semaphore: Optional[asyncio.Semaphore] = None
+
+    async def _load(self, session: aiohttp.ClientSession, external_data: ExternalData) -> str:
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        async with self._semaphore:
+            if isinstance(external_data, HTTPData):
+                return await external_data.load_data(session, self.http_cache)
+            return await external_data.load_data(session)
+
+    def schedule(self, session: aiohttp.ClientSession, external_data: ExternalData) -> asyncio.Task:
+        key = external_data.cache_key
+        if key not in self.tasks:
+            task = asyncio.ensure_future(self._load(session, external_data))
+            # Une erreur de préchargement est relevée par le bloc qui attend la donnée, pas signalée à la destruction
+            task.add_done_callback(lambda done: done.cancelled() or done.exception())
+            self.tasks[key] = task
+        return self.tasks[key]
+
+    def prefetch(self, session: aiohttp.ClientSession, sources: Iterable[ExternalData]) -> int:
+        count = len(self.tasks)
+        for external_data in sources:
+            self.schedule(session, external_data)
+        return len(self.tasks) - count
+
+    async def load(self, session: aiohttp.ClientSession, external_data: ExternalData) -> str:
+        # shield : l'annulation d'un bloc n'interrompt pas un chargement attendu par d'autres blocs
+        return await asyncio.shield(self.schedule(session, external_data))
+
+    def close(self):
+        for task in self.tasks.values():
+            task.cancel()
+        self.tasks.clear()
@@ -0,0 +1,94 @@
+# src/api/embedding_batcher.py
+import asyncio
+import logging
+from typing import Awaitable, Callable, Dict, List, Optional, Set, Tuple
+
+import aiohttp
+
+from src.utils.exceptions import APIException
+
+SendBatch = Callable[[aiohttp.ClientSession, List[str], int], Awaitable[List[List[float]]]]
+
+class EmbeddingBatcher:
+    def __init__(self, send_batch: SendBatch, count_tokens: Callable[[str], int],
+                 max_batch_tokens: int = 100000, max_batch_size: int = 2048,
+                 max_concurrency: int = 4, linger: float = 0.005):
+        self.send_batch = send_batch
+        self.count_tokens = count_tokens
+        self.max_batch_tokens = max_batch_tokens
+        self.max_batch_size = max_batch_size
+        self.max_concurrency = max_concurrency
+        self.linger = linger
+        # Textes en attente par session : un texte demandé plusieurs fois partage le même futur
+        self.pending: Dict[aiohttp.ClientSession, Dict[str, asyncio.Future]] = {}
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        # Référence forte vers les vidages programmés : la boucle ne garde qu'une référence faible aux tâches
+        self._flushes: Set[asyncio.Task] = set()
+
+    def _schedule_flush(self, session: aiohttp.ClientSession):
+        task = asyncio.ensure_future(self.flush(session))
+        self._flushes.add(task)
+        task.add_done_callback(self._flushes.discard)
+
+    async def embed(self, session: aiohttp.ClientSession, texts: List[str]) -> List[List[float]]:
+        if not texts:
+            return []
+        loop = asyncio.get_running_loop()
+        if session not in self.pending:
+            self.pending[session] = {}
+            # Les demandes des blocs qui arrivent pendant ce court délai partagent les mêmes lots
+            loop.call_later(self.linger, self._schedule_flush, session)
+        pending = self.pending[session]
+        futures = []
+        for text in texts:
+            if text not in pending:
+                pending[text] = loop.create_future()
+            futures.append(pending[text])
+        # Les futurs sont partagés avec d'autres blocs : l'annulation de cet appelant ne doit pas les annuler
+        return list(await asyncio.shield(asyncio.gather(*futures)))
+
+    def pack(self, texts: List[str]) -> List[Tuple[List[str], int]]:
+        batches = []
+        batch: List[str] = []
+        batch_tokens = 0
+        for text in texts:
+            tokens = self.count_tokens(text)
+            if batch and (batch_tokens + tokens > self.max_batch_tokens or len(batch) >= self.max_batch_size):
+                batches.append((batch, batch_tokens))
+                batch, batch_tokens = [], 0
+            batch.append(text)
+            batch_tokens += tokens
+        if batch:
+            batches.append((batch, batch_tokens))
+        return batches
+
+    async def flush(self, session: aiohttp.ClientSession):
+        pending = self.pending.pop(session, {})
+        if not pending:
+            return
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+
+        batches = self.pack(list(pending))
+        logging.info(f"Embeddings : {len(pending)} textes regroupés en {len(batches)} lot(s)")
+
+        async def send(batch: List[str], tokens: int):
+            try:
+                async with self._semaphore:
+                    embeddings = await self.send_batch(session, batch, tokens)
+                if len(embeddings) != len(batch):
+                    raise APIException(f"Nombre d'embeddings inattendu : {len(embeddings)} pour {len(batch)} textes")
+                for text, embedding in zip(batch, embeddings):
+                    if not pending[text].done():
+                        pending[text].set_result(embedding)
+            except asyncio.CancelledError:
+                for text in batch:
+                    if not pending[text].done():
+                        pending[text].cancel()
+                raise
+            except Exception as e:
+                for text in batch:
+                    if not pending[text].done():
+                        pending[text].set_exception(e)
+
+        await asyncio.gather(*(send(batch, tokens) for batch, tokens in batches))
@@ -0,0 +1,56 @@
+# src/api/http_cache.py
+import logging
+import sqlite3
+import threading
+import time
+from typing import Optional, Tuple
+
+CachedResponse = Tuple[str, Optional[str], Optional[str]]  # (corps, ETag, Last-Modified)
+
+class HTTPCache:
+    def __init__(self, path: str = ".llmflow_http_cache.sqlite"):
+        self.path = path
+        self.stats = {"revalidated": 0, "fetched": 0}
+        self._connection: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._connection is None:
+            self._connection = sqlite3.connect(self.path, check_same_thread=False)
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS http_responses (url TEXT PRIMARY KEY, body TEXT, etag TEXT, "
+                "last_modified TEXT, fetched REAL)"
+            )
+        return self._connection
+
+    def get(self, url: str) -> Optional[CachedResponse]:
+        with self._lock:
+            row = self._connect().execute(
+                "SELECT body, etag, last_modified FROM http_responses WHERE url = ?", (url,)
+            ).fetchone()
+        return tuple(row) if row else None
+
+    def set(self, url: str, body: str, etag: Optional[str], last_modified: Optional[str]):
+        # Sans validateur, une réponse ne pourrait jamais être revalidée : inutile de la garder
+        if not etag and not last_modified:
+            return
+        with self._lock:
+            connection = self._connect()
+            connection.execute(
+                "INSERT OR REPLACE INTO http_responses (url, body, etag, last_modified, fetched) VALUES (?, ?, ?, ?, ?)",
+                (url, body, etag, last_modified, time.time())
+            )
+            connection.commit()
+
+    def close(self):
+        with self._lock:
+            if self._connection is not None:
+                self._connection.close()
+                self._connection = None
+
+    def log_stats(self):
+        if self.stats["revalidated"] or self.stats["fetched"]:
+            logging.info(
+                f"Cache HTTP : {self.stats['revalidated']} ressources inchangées (304), "
+                f"{self.stats['fetched']} téléchargées"
+            )
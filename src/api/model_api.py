@@ -1,13 +1,130 @@
 # src/api/model_api.py
 import aiohttp
+import asyncio
+import csv
+import json
+import time
 from abc import ABC, abstractmethod
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional, AsyncIterator, Tuple
 import logging
 
 from src.utils.token_utils import num_tokens_from_string
 from src.utils.exceptions import APIException
+from .retry import RetryPolicy, CircuitBreaker, RETRYABLE_STATUSES, parse_retry_after
+from .sse import iter_sse_events
+from .http_cache import HTTPCache
 
 class ModelAPI(ABC):
+    provider_name = "API"
+    default_base_url = ""
+
+    def __init__(self, api_key: str, base_url: Optional[str] = None, retry_policy: Optional[RetryPolicy] = None,
+                 circuit_breaker: Optional[CircuitBreaker] = None):
+        self.api_key = api_key
+        self.base_url = (base_url or self.default_base_url).rstrip("/")
+        self.retry_policy = retry_policy or RetryPolicy()
+        self.circuit_breaker = circuit_breaker or CircuitBreaker(self.provider_name)
+
+    async def send_request(self, session: aiohttp.ClientSession, url: str, headers: Dict[str, str],
+                           data: Dict[str, Any], error_label: str, stream: bool = False) -> Any:
+        policy = self.retry_policy
+        deadline = time.monotonic() + policy.deadline
+        delay = policy.base_delay
+        attempt = 0
+        while True:
+            attempt += 1
+            self.circuit_breaker.before_call()
+            try:
+                remaining = max(deadline - time.monotonic(), 0.001)
+                # En flux, l'échéance borne l'établissement de la réponse et chaque lecture, pas la génération entière
+                timeout = (aiohttp.ClientTimeout(total=None, sock_connect=remaining, sock_read=policy.deadline)
+                           if stream else aiohttp.ClientTimeout(total=remaining))
+                response = await session.post(url, headers=headers, json=data, timeout=timeout)
+                try:
+                    if response.status == 200:
+                        result = response if stream else await response.json()
+                        self.circuit_breaker.record_success()
+                        return result
+                    error = APIException(f"{error_label}: {await response.text()}", response.status, response.headers)
+                finally:
+                    if not stream or response.status != 200:
+                        response.release()
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                error = APIException(f"{error_label}: {e!r}")
+            except asyncio.CancelledError:
+                self.circuit_breaker.abort_probe()
+                raise
+
+            if error.status is not None and error.status not in RETRYABLE_STATUSES:
+                # Erreur du client (requête invalide, clé refusée) : le fournisseur répond, inutile de réessayer
+                self.circuit_breaker.record_success()
+                raise error
+
+            if error.status == 429:
+                # Quota atteint : le fournisseur répond, seul Retry-After règle l'attente ; le circuit n'est pas concerné
+                self.circuit_breaker.abort_probe()
+            else:
+                self.circuit_breaker.record_failure()
+            if attempt >= policy.max_attempts:
+                raise error
+            retry_after = parse_retry_after(error.headers)
+            delay = policy.next_delay(delay)
+            wait = retry_after if retry_after is not None else delay
+            if time.monotonic() + wait >= deadline:
+                raise error
+            logging.warning(f"{self.provider_name} : tentative {attempt} échouée ({error.status or 'réseau'}), nouvel essai dans {wait:.2f}s")
+            await asyncio.sleep(wait)
+
+    async def post_json(self, session: aiohttp.ClientSession, url: str, headers: Dict[str, str],
+                        data: Dict[str, Any], error_label: str) -> Dict[str, Any]:
+        return await self.send_request(session, url, headers, data, error_label)
+
+    async def post_stream(self, session: aiohttp.ClientSession, url: str, headers: Dict[str, str],
+                          data: Dict[str, Any], error_label: str) -> AsyncIterator[Tuple[str, Dict[str, Any]]]:
+        # Les nouvelles tentatives n'ont lieu qu'avant le premier événement : un flux entamé n'est jamais rejoué
+        response = await self.send_request(session, url, headers, data, error_label, stream=True)
+        completed = False
+        try:
+            async for event, payload in iter_sse_events(response):
+                if payload == "[DONE]":
+                    completed = True
+                    break
+                # Anthropic termine par message_stop, OpenAI et Mistral par [DONE]
+                completed = event == "message_stop"
+                try:
+                    decoded = json.loads(payload)
+                except ValueError:
+                    raise APIException(f"{error_label}: événement illisible : {payload[:200]}")
+                if event == "error" or decoded.get("type") == "error":
+                    raise APIException(f"{error_label}: {payload}")
+                yield event, decoded
+            if not completed:
+                # Connexion fermée proprement mais sans marqueur de fin : la réponse est incomplète
+                raise APIException(f"{error_label}: flux interrompu avant le marqueur de fin")
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            raise APIException(f"{error_label}: flux interrompu : {e!r}")
+        finally:
+            response.release()
+
+    async def stream_text(self, session: aiohttp.ClientSession, model: str, prompt: str,
+                          temperature: float, max_tokens: int,
+                          usage: Optional[Dict[str, int]] = None) -> AsyncIterator[str]:
+        # Fournisseurs sans flux : la réponse complète est émise en un seul fragment
+        response = await self.generate_text(session, model, prompt, temperature, max_tokens)
+        if usage is not None:
+            usage.update(self.extract_usage(response) or {})
+        yield self.extract_text_from_response(response)
+
+    @staticmethod
+    def extract_usage(response: Dict[str, Any]) -> Optional[Dict[str, int]]:
+        # OpenAI et Mistral : prompt_tokens / completion_tokens ; Anthropic : input_tokens / output_tokens
+        usage = response.get("usage") or {}
+        prompt_tokens = usage.get("prompt_tokens", usage.get("input_tokens"))
+        completion_tokens = usage.get("completion_tokens", usage.get("output_tokens"))
+        if prompt_tokens is None and completion_tokens is None:
+            return None
+        return {"prompt_tokens": prompt_tokens or 0, "completion_tokens": completion_tokens or 0}
+
     @abstractmethod
     async def generate_text(self, session: aiohttp.ClientSession, model: str, prompt: str, 
                             temperature: float, max_tokens: int) -> Dict[str, Any]:
@@ -22,12 +139,13 @@ class ModelAPI(ABC):
         pass
 
 class OpenAIAPI(ModelAPI):
-    def __init__(self, api_key: str):
-        self.api_key = api_key
+    provider_name = "OpenAI"
+    default_base_url = "https://api.openai.com/v1"
+    embedding_model = "text-embedding-ada-002"
 
     async def generate_text(self, session: aiohttp.ClientSession, model: str, prompt: str, 
                             temperature: float, max_tokens: int) -> Dict[str, Any]:
-        url = "https://api.openai.com/v1/chat/completions"
+        url = f"{self.base_url}/chat/completions"
         headers = {
             "Content-Type": "application/json",
             "Authorization": f"Bearer {self.api_key}"
@@ -38,37 +156,56 @@ class OpenAIAPI(ModelAPI):
             "temperature": temperature,
             "max_tokens": max_tokens,
         }
-        async with session.post(url, headers=headers, json=data) as response:
-            if response.status != 200:
-                raise APIException(f"OpenAI API error: {await response.text()}")
-            return await response.json()
+        return await self.post_json(session, url, headers, data, "OpenAI API error")
 
     def extract_text_from_response(self, response: Dict[str, Any]) -> str:
         return response["choices"][0]["message"]["content"].strip()
 
+    async def stream_text(self, session: aiohttp.ClientSession, model: str, prompt: str,
+                          temperature: float, max_tokens: int,
+                          usage: Optional[Dict[str, int]] = None) -> AsyncIterator[str]:
+        url = f"{self.base_url}/chat/completions"
+        headers = {
+            "Content-Type": "application/json",
+            "Authorization": f"Bearer {self.api_key}"
+        }
+        data = {
+            "model": model,
+            "messages": [{"role": "user", "content": prompt}],
+            "temperature": temperature,
+            "max_tokens": max_tokens,
+            "stream": True,
+            # Le dernier événement porte alors la consommation de jetons de la requête
+            "stream_options": {"include_usage": True},
+        }
+        async for _, chunk in self.post_stream(session, url, headers, data, "OpenAI API error"):
+            if usage is not None and chunk.get("usage"):
+                usage.update(self.extract_usage(chunk))
+            for choice in chunk.get("choices", []):
+                delta = choice.get("delta", {}).get("content")
+                if delta:
+                    yield delta
+
     async def get_embeddings(self, session: aiohttp.ClientSession, texts: List[str]) -> List[List[float]]:
-        url = "https://api.openai.com/v1/embeddings"
+        url = f"{self.base_url}/embeddings"
         headers = {
             "Content-Type": "application/json",
             "Authorization": f"Bearer {self.api_key}"
         }
         data = {
-            "model": "text-embedding-ada-002",
+            "model": self.embedding_model,
             "input": texts
         }
-        async with session.post(url, headers=headers, json=data) as response:
-            if response.status != 200:
-                raise APIException(f"OpenAI Embedding API error: {await response.text()}")
-            result = await response.json()
-            return [item['embedding'] for item in result['data']]
+        result = await self.post_json(session, url, headers, data, "OpenAI Embedding API error")
+        return [item['embedding'] for item in result['data']]
 
 class AnthropicAPI(ModelAPI):
-    def __init__(self, api_key: str):
-        self.api_key = api_key
+    provider_name = "Anthropic"
+    default_base_url = "https://api.anthropic.com/v1"
 
     async def generate_text(self, session: aiohttp.ClientSession, model: str, prompt: str, 
                             temperature: float, max_tokens: int) -> Dict[str, Any]:
-        url = "https://api.anthropic.com/v1/messages"
+        url = f"{self.base_url}/messages"
         headers = {
             "Content-Type": "application/json",
             "x-api-key": self.api_key,
@@ -80,25 +217,46 @@ class AnthropicAPI(ModelAPI):
             "temperature": temperature,
             "messages": [{"role": "user", "content": prompt}]
         }
-        async with session.post(url, headers=headers, json=data) as response:
-            if response.status != 200:
-                raise APIException(f"Anthropic API error: {await response.text()}")
-            return await response.json()
+        return await self.post_json(session, url, headers, data, "Anthropic API error")
 
     def extract_text_from_response(self, response: Dict[str, Any]) -> str:
         return response["content"][0]["text"].strip()
 
+    async def stream_text(self, session: aiohttp.ClientSession, model: str, prompt: str,
+                          temperature: float, max_tokens: int,
+                          usage: Optional[Dict[str, int]] = None) -> AsyncIterator[str]:
+        url = f"{self.base_url}/messages"
+        headers = {
+            "Content-Type": "application/json",
+            "x-api-key": self.api_key,
+            "anthropic-version": "2023-06-01"
+        }
+        data = {
+            "model": model,
+            "max_tokens": max_tokens,
+            "temperature": temperature,
+            "messages": [{"role": "user", "content": prompt}],
+            "stream": True,
+        }
+        async for event, payload in self.post_stream(session, url, headers, data, "Anthropic API error"):
+            if usage is not None and event == "message_start":
+                usage["prompt_tokens"] = payload.get("message", {}).get("usage", {}).get("input_tokens", 0)
+            elif usage is not None and event == "message_delta":
+                usage["completion_tokens"] = payload.get("usage", {}).get("output_tokens", 0)
+            if event == "content_block_delta" and payload.get("delta", {}).get("type") == "text_delta":
+                yield payload["delta"]["text"]
+
     async def get_embeddings(self, session: aiohttp.ClientSession, texts: List[str]) -> List[List[float]]:
         # Implémentation spécifique pour Anthropic si disponible
         raise NotImplementedError("Anthropic API does not support embeddings yet.")
 
 class MistralAPI(ModelAPI):
-    def __init__(self, api_key: str):
-        self.api_key = api_key
+    provider_name = "Mistral"
+    default_base_url = "https://api.mistral.ai/v1"
 
     async def generate_text(self, session: aiohttp.ClientSession, model: str, prompt: str, 
                             temperature: float, max_tokens: int) -> Dict[str, Any]:
-        url = "https://api.mistral.ai/v1/chat/completions"
+        url = f"{self.base_url}/chat/completions"
         headers = {
             "Content-Type": "application/json",
             "Accept": "application/json",
@@ -110,14 +268,157 @@ class MistralAPI(ModelAPI):
             "temperature": temperature,
             "max_tokens": max_tokens,
         }
-        async with session.post(url, headers=headers, json=data) as response:
-            if response.status != 200:
-                raise APIException(f"Mistral API error: {await response.text()}")
-            return await response.json()
+        return await self.post_json(session, url, headers, data, "Mistral API error")
 
     def extract_text_from_response(self, response: Dict[str, Any]) -> str:
         return response["choices"][0]["message"]["content"].strip()
 
+    async def stream_text(self, session: aiohttp.ClientSession, model: str, prompt: str,
+                          temperature: float, max_tokens: int,
+                          usage: Optional[Dict[str, int]] = None) -> AsyncIterator[str]:
+        url = f"{self.base_url}/chat/completions"
+        headers = {
+            "Content-Type": "application/json",
+            "Accept": "text/event-stream",
+            "Authorization": f"Bearer {self.api_key}"
+        }
+        data = {
+            "model": model,
+            "messages": [{"role": "user", "content": prompt}],
+            "temperature": temperature,
+            "max_tokens": max_tokens,
+            "stream": True,
+        }
+        async for _, chunk in self.post_stream(session, url, headers, data, "Mistral API error"):
+            if usage is not None and chunk.get("usage"):
+                usage.update(self.extract_usage(chunk))
+            for choice in chunk.get("choices", []):
+                delta = choice.get("delta", {}).get("content")
+                if delta:
+                    yield delta
+
     async def get_embeddings(self, session: aiohttp.ClientSession, texts: List[str]) -> List[List[float]]:
         # Implémentation spécifique pour Mistral si disponible
         raise NotImplementedError("Mistral API does not support embeddings yet.")
+
+class ExternalData(ABC):
+    def __init__(self, source: str):
+        self.source = source
+
+    @property
+    def cache_key(self) -> str:
+        # Deux blocs qui référencent la même source partagent un seul chargement par exécution
+        return f"{type(self).__name__}:{self.source}"
+
+    @abstractmethod
+    async def load_data(self, session: aiohttp.ClientSession) -> str:
+        pass
+
+class HTTPData(ExternalData):
+    accept = "*/*"
+
+    def __init__(self, source: str, timeout: float = 30.0):
+        super().__init__(source)
+        if isinstance(timeout, bool) or not isinstance(timeout, (int, float)) or timeout <= 0:
+            raise ValueError(f"timeout doit être un nombre de secondes positif : {timeout!r}")
+        self.timeout = timeout
+
+    async def fetch(self, session: aiohttp.ClientSession, http_cache: Optional[HTTPCache] = None) -> str:
+        headers = {"Accept": self.accept}
+        cached = await asyncio.to_thread(http_cache.get, self.source) if http_cache else None
+        if cached:
+            # GET conditionnel : le serveur répond 304 sans corps si la ressource n'a pas changé
+            _, etag, last_modified = cached
+            if etag:
+                headers["If-None-Match"] = etag
+            if last_modified:
+                headers["If-Modified-Since"] = last_modified
+        try:
+            async with session.get(self.source, headers=headers, timeout=aiohttp.ClientTimeout(total=self.timeout)) as response:
+                if response.status == 304 and cached:
+                    http_cache.stats["revalidated"] += 1
+                    return cached[0]
+                body = await response.text()
+                if response.status != 200:
+                    raise APIException(f"Erreur HTTP {response.status} pour {self.source}: {body[:200]}",
+                                       response.status, response.headers)
+                etag, last_modified = response.headers.get("ETag"), response.headers.get("Last-Modified")
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            raise APIException(f"Erreur réseau pour {self.source}: {e!r}")
+        if http_cache:
+            http_cache.stats["fetched"] += 1
+            await asyncio.to_thread(http_cache.set, self.source, body, etag, last_modified)
+        return body
+
+    def parse(self, body: str) -> str:
+        return body
+
+    async def load_data(self, session: aiohttp.ClientSession, http_cache: Optional[HTTPCache] = None) -> str:
+        body = await self.fetch(session, http_cache)
+        # L'analyse d'une grosse page est coûteuse en CPU : elle ne doit pas bloquer les autres téléchargements
+        return await asyncio.to_thread(self.parse, body)
+
+class WebData(HTTPData):
+    accept = "text/html,application/xhtml+xml;q=0.9,*/*;q=0.8"
+
+    def parse(self, body: str) -> str:
+        # BeautifulSoup n'est chargé que par les flux qui lisent des pages web
+        from bs4 import BeautifulSoup
+        soup = BeautifulSoup(body, "html.parser")
+        for element in soup(["script", "style", "noscript"]):
+            element.decompose()
+        return "\n".join(line for line in (line.strip() for line in soup.get_text("\n").splitlines()) if line)
+
+class APIData(HTTPData):
+    accept = "application/json"
+
+    def parse(self, body: str) -> str:
+        try:
+            return json.dumps(json.loads(body), ensure_ascii=False, indent=2)
+        except ValueError:
+            return body
+
+class TXTData(ExternalData):
+    def read(self) -> str:
+        with open(self.source, "r", encoding="utf-8") as file:
+            return file.read()
+
+    async def load_data(self, session: aiohttp.ClientSession) -> str:
+        return await asyncio.to_thread(self.read)
+
+class CSVData(ExternalData):
+    def __init__(self, source: str, max_rows: Optional[int] = None, delimiter: Optional[str] = None,
+                 max_chars: Optional[int] = 1000000):
+        super().__init__(source)
+        for name, value in (("max_rows", max_rows), ("max_chars", max_chars)):
+            if value is not None and (isinstance(value, bool) or not isinstance(value, int) or value < 0):
+                raise ValueError(f"{name} doit être un entier positif : {value!r}")
+        if delimiter is not None and (not isinstance(delimiter, str) or len(delimiter) != 1):
+            raise ValueError(f"delimiter doit être un unique caractère : {delimiter!r}")
+        self.max_rows = max_rows
+        self.delimiter = delimiter
+        self.max_chars = max_chars
+
+    @property
+    def cache_key(self) -> str:
+        return f"{super().cache_key}:{self.max_rows}:{self.delimiter}:{self.max_chars}"
+
+    def read(self) -> str:
+        # Lecture ligne à ligne, bornée par max_rows et max_chars : un gros fichier n'est jamais accumulé en entier
+        lines = []
+        size = 0
+        with open(self.source, "r", encoding="utf-8", newline="") as file:
+            reader = csv.DictReader(file, delimiter=self.delimiter or ",")
+            for index, row in enumerate(reader):
+                if self.max_rows is not None and index >= self.max_rows:
+                    break
+                line = "; ".join(f"{key}: {value}" for key, value in row.items() if key is not None)
+                size += len(line) + 1
+                if self.max_chars is not None and size > self.max_chars + 1:
+                    logging.warning(f"{self.source} : lecture arrêtée après {index} lignes ({self.max_chars} caractères au plus)")
+                    break
+                lines.append(line)
+        return "\n".join(lines)
+
+    async def load_data(self, session: aiohttp.ClientSession) -> str:
+        return await asyncio.to_thread(self.read)
@@ -0,0 +1,62 @@
+# src/api/model_registry.py
+from typing import Dict, Optional, Tuple
+
+# Fenêtres de contexte (en jetons) par préfixe de modèle ; le préfixe le plus long l'emporte
+MODEL_CONTEXT_LIMITS: Dict[str, int] = {
+    "gpt-4o": 128000,
+    "gpt-4-turbo": 128000,
+    "gpt-4-32k": 32768,
+    "gpt-4": 8192,
+    "gpt-3.5-turbo": 16385,
+    "text-davinci": 4097,
+    "claude-3": 200000,
+    "claude": 100000,
+    "mistral-large": 128000,
+    "mistral-medium": 32000,
+    "mistral-small": 32000,
+    "mistral": 32000,
+}
+
+DEFAULT_CONTEXT_LIMIT = 16000
+
+# Prix indicatifs en dollars par million de jetons (entrée, sortie), à ajuster via settings.telemetry.prices
+MODEL_PRICES: Dict[str, Tuple[float, float]] = {
+    "gpt-4o-mini": (0.15, 0.60),
+    "gpt-4o": (2.50, 10.00),
+    "gpt-4-turbo": (10.00, 30.00),
+    "gpt-4": (30.00, 60.00),
+    "gpt-3.5-turbo": (0.50, 1.50),
+    "text-embedding-ada-002": (0.10, 0.0),
+    "claude-3-5-sonnet": (3.00, 15.00),
+    "claude-3-opus": (15.00, 75.00),
+    "claude-3-sonnet": (3.00, 15.00),
+    "claude-3-haiku": (0.25, 1.25),
+    "mistral-large": (2.00, 6.00),
+    "mistral-small": (0.20, 0.60),
+}
+
+MODEL_PROVIDERS: Dict[str, str] = {
+    "gpt": "openai",
+    "text-davinci": "openai",
+    "claude": "anthropic",
+    "mistral": "mistral",
+}
+
+def longest_prefix(model: str, table: Dict[str, object]):
+    matches = [prefix for prefix in table if model.startswith(prefix)]
+    return max(matches, key=len) if matches else None
+
+def get_context_limit(model: str) -> int:
+    prefix = longest_prefix(model, MODEL_CONTEXT_LIMITS)
+    return MODEL_CONTEXT_LIMITS[prefix] if prefix else DEFAULT_CONTEXT_LIMIT
+
+def get_provider(model: str) -> str:
+    prefix = longest_prefix(model, MODEL_PROVIDERS)
+    if prefix is None:
+        raise ValueError(f"Unsupported model: {model}")
+    return MODEL_PROVIDERS[prefix]
+
+def get_model_price(model: str, prices: Optional[Dict[str, Tuple[float, float]]] = None) -> Optional[Tuple[float, float]]:
+    table = {**MODEL_PRICES, **(prices or {})}
+    prefix = longest_prefix(model, table)
+    return tuple(table[prefix]) if prefix else None
@@ -0,0 +1,140 @@
+# src/api/rate_limiter.py
+import asyncio
+import logging
+import sqlite3
+import threading
+import time
+from contextlib import asynccontextmanager
+from typing import Dict, List, Optional, Tuple
+
+class TokenBucket:
+    def __init__(self, rate_per_minute: float):
+        self.capacity = float(rate_per_minute)
+        self.rate = self.capacity / 60.0
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def delay_for(self, amount: float) -> float:
+        self._refill()
+        # Une requête plus grosse que le seau entier attend simplement un seau plein
+        amount = min(amount, self.capacity)
+        if self.tokens >= amount:
+            return 0.0
+        return (amount - self.tokens) / self.rate
+
+    def consume(self, amount: float):
+        self._refill()
+        self.tokens -= min(amount, self.capacity)
+
+class SharedBudget:
+    # Seaux à jetons stockés dans SQLite : tous les processus qui ouvrent le même fichier partagent les mêmes budgets
+    def __init__(self, path: str):
+        self.path = path
+        self._connection: Optional[sqlite3.Connection] = None
+        # Une seule connexion partagée par les threads de asyncio.to_thread : les transactions sont sérialisées
+        self._lock = threading.Lock()
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._connection is None:
+            self._connection = sqlite3.connect(self.path, timeout=30.0, isolation_level=None, check_same_thread=False)
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.execute("CREATE TABLE IF NOT EXISTS rate_buckets (key TEXT PRIMARY KEY, tokens REAL, updated REAL)")
+        return self._connection
+
+    def reserve(self, requests: List[Tuple[str, float, float]]) -> float:
+        # requests : (clé du seau, capacité par minute, quantité demandée) ; tout est réservé ou rien
+        with self._lock:
+            connection = self._connect()
+            now = time.time()
+            connection.execute("BEGIN IMMEDIATE")
+            try:
+                levels = []
+                delay = 0.0
+                for key, capacity, amount in requests:
+                    row = connection.execute("SELECT tokens, updated FROM rate_buckets WHERE key = ?", (key,)).fetchone()
+                    tokens = capacity if row is None else min(capacity, row[0] + (now - row[1]) * capacity / 60.0)
+                    amount = min(amount, capacity)
+                    levels.append((key, tokens - amount))
+                    if tokens < amount:
+                        delay = max(delay, (amount - tokens) * 60.0 / capacity)
+                if delay <= 0:
+                    connection.executemany("INSERT OR REPLACE INTO rate_buckets (key, tokens, updated) VALUES (?, ?, ?)",
+                                           [(key, tokens, now) for key, tokens in levels])
+                connection.execute("COMMIT")
+            except BaseException:
+                connection.execute("ROLLBACK")
+                raise
+            return delay
+
+class RateLimiter:
+    def __init__(self, limits: Optional[Dict[str, Dict[str, float]]] = None, max_concurrency: int = 32,
+                 shared_store: Optional[str] = None):
+        # Clés acceptées : "fournisseur" ou "fournisseur/modèle", valeurs {"rpm": ..., "tpm": ...}
+        self.limits = limits or {}
+        self.max_concurrency = max_concurrency
+        self.shared = SharedBudget(shared_store) if shared_store else None
+        self.buckets: Dict[str, Tuple[Optional[TokenBucket], Optional[TokenBucket]]] = {}
+        self._locks: Dict[str, asyncio.Lock] = {}
+        self._semaphore: Optional[asyncio.BoundedSemaphore] = None
+
+    def _get_buckets(self, key: str, provider: str) -> Tuple[Optional[TokenBucket], Optional[TokenBucket]]:
+        if key not in self.buckets:
+            limits = self.limits.get(key, self.limits.get(provider, {}))
+            rpm = limits.get("rpm")
+            tpm = limits.get("tpm")
+            self.buckets[key] = (TokenBucket(rpm) if rpm else None, TokenBucket(tpm) if tpm else None)
+        return self.buckets[key]
+
+    async def _wait_for_budget(self, provider: str, model: str, tokens: int):
+        key = f"{provider}/{model}"
+        request_bucket, token_bucket = self._get_buckets(key, provider)
+        if request_bucket is None and token_bucket is None:
+            return
+
+        if key not in self._locks:
+            self._locks[key] = asyncio.Lock()
+        # Le verrou sert les requêtes dans l'ordre d'arrivée : une grosse requête n'est pas affamée par les petites
+        async with self._locks[key]:
+            if self.shared is not None:
+                await self._wait_for_shared_budget(key, request_bucket, token_bucket, tokens)
+                return
+            while True:
+                delay = max(
+                    request_bucket.delay_for(1) if request_bucket else 0.0,
+                    token_bucket.delay_for(tokens) if token_bucket else 0.0,
+                )
+                if delay <= 0:
+                    break
+                logging.debug(f"Limite de débit atteinte pour {key}, attente de {delay:.2f}s")
+                await asyncio.sleep(delay)
+            if request_bucket:
+                request_bucket.consume(1)
+            if token_bucket:
+                token_bucket.consume(tokens)
+
+    async def _wait_for_shared_budget(self, key: str, request_bucket: Optional[TokenBucket],
+                                      token_bucket: Optional[TokenBucket], tokens: int):
+        requests = []
+        if request_bucket:
+            requests.append((f"{key}:rpm", request_bucket.capacity, 1))
+        if token_bucket:
+            requests.append((f"{key}:tpm", token_bucket.capacity, tokens))
+        while True:
+            delay = await asyncio.to_thread(self.shared.reserve, requests)
+            if delay <= 0:
+                return
+            logging.debug(f"Limite de débit partagée atteinte pour {key}, attente de {delay:.2f}s")
+            await asyncio.sleep(delay)
+
+    @asynccontextmanager
+    async def acquire(self, provider: str, model: str, tokens: int):
+        if self._semaphore is None:
+            self._semaphore = asyncio.BoundedSemaphore(self.max_concurrency)
+        await self._wait_for_budget(provider, model, tokens)
+        async with self._semaphore:
+            yield
@@ -0,0 +1,169 @@
+# src/api/response_cache.py
+import asyncio
+import hashlib
+import json
+import logging
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, Optional, Tuple
+
+CacheEntry = Tuple[str, float, float]  # (réponse, date de création, latence d'origine)
+
+class LeaderCancelled(Exception):
+    # Le calcul partagé a été abandonné par l'appelant qui le menait : les autres le relancent
+    pass
+
+class ResponseCache:
+    def __init__(self, enabled: bool = False, path: Optional[str] = ".llmflow_cache.sqlite",
+                 ttl: Optional[float] = 7 * 24 * 3600, max_memory_entries: int = 1024,
+                 max_disk_entries: int = 100000):
+        self.enabled = enabled
+        self.path = path
+        self.ttl = ttl
+        self.max_memory_entries = max_memory_entries
+        self.max_disk_entries = max_disk_entries
+        self.memory: "OrderedDict[str, CacheEntry]" = OrderedDict()
+        self.inflight: Dict[str, asyncio.Future] = {}
+        self.stats = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "shared_inflight": 0, "saved_seconds": 0.0}
+        self._connection: Optional[sqlite3.Connection] = None
+        self._disk_entries = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def make_key(provider: str, model: str, prompt: str, temperature: float, max_tokens: int) -> str:
+        payload = json.dumps([provider, model, prompt, temperature, max_tokens], ensure_ascii=False)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def should_use(self, block_setting: Optional[bool]) -> bool:
+        return self.enabled if block_setting is None else block_setting
+
+    def _expired(self, created: float) -> bool:
+        return self.ttl is not None and time.time() - created > self.ttl
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._connection is None:
+            self._connection = sqlite3.connect(self.path, check_same_thread=False)
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS responses (key TEXT PRIMARY KEY, value TEXT, created REAL, "
+                "accessed REAL, latency REAL)"
+            )
+            self._connection.execute("CREATE INDEX IF NOT EXISTS responses_accessed ON responses (accessed)")
+            self._disk_entries = self._connection.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+        return self._connection
+
+    def _disk_get(self, key: str) -> Optional[CacheEntry]:
+        with self._lock:
+            connection = self._connect()
+            row = connection.execute("SELECT value, created, latency FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            if self._expired(row[1]):
+                connection.execute("DELETE FROM responses WHERE key = ?", (key,))
+                connection.commit()
+                self._disk_entries -= 1
+                return None
+            connection.execute("UPDATE responses SET accessed = ? WHERE key = ?", (time.time(), key))
+            connection.commit()
+            return row[0], row[1], row[2]
+
+    def _disk_set(self, key: str, entry: CacheEntry):
+        with self._lock:
+            connection = self._connect()
+            existed = connection.execute("SELECT 1 FROM responses WHERE key = ?", (key,)).fetchone() is not None
+            connection.execute(
+                "INSERT OR REPLACE INTO responses (key, value, created, accessed, latency) VALUES (?, ?, ?, ?, ?)",
+                (key, entry[0], entry[1], time.time(), entry[2]),
+            )
+            if not existed:
+                self._disk_entries += 1
+            if self._disk_entries > self.max_disk_entries:
+                # Éviction LRU par lots de 10 % pour ne pas payer une suppression à chaque insertion
+                excess = self._disk_entries - self.max_disk_entries + self.max_disk_entries // 10
+                connection.execute(
+                    "DELETE FROM responses WHERE key IN (SELECT key FROM responses ORDER BY accessed LIMIT ?)", (excess,)
+                )
+                self._disk_entries = connection.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+            connection.commit()
+
+    def _remember(self, key: str, entry: CacheEntry):
+        self.memory[key] = entry
+        self.memory.move_to_end(key)
+        while len(self.memory) > self.max_memory_entries:
+            self.memory.popitem(last=False)
+
+    async def get(self, key: str) -> Optional[str]:
+        entry = self.memory.get(key)
+        if entry is not None and not self._expired(entry[1]):
+            self.memory.move_to_end(key)
+            self.stats["memory_hits"] += 1
+            self.stats["saved_seconds"] += entry[2]
+            return entry[0]
+        self.memory.pop(key, None)
+
+        if self.path:
+            loop = asyncio.get_running_loop()
+            entry = await loop.run_in_executor(None, self._disk_get, key)
+            if entry is not None:
+                self._remember(key, entry)
+                self.stats["disk_hits"] += 1
+                self.stats["saved_seconds"] += entry[2]
+                return entry[0]
+        return None
+
+    async def set(self, key: str, value: str, latency: float = 0.0):
+        entry = (value, time.time(), latency)
+        self._remember(key, entry)
+        if self.path:
+            loop = asyncio.get_running_loop()
+            await loop.run_in_executor(None, self._disk_set, key, entry)
+
+    async def get_or_compute(self, key: str, compute: Callable[[], Awaitable[Tuple[str, bool]]]) -> str:
+        # compute renvoie la valeur et si elle peut être conservée
+        # Les requêtes identiques simultanées partagent un seul appel en cours
+        while key in self.inflight:
+            self.stats["shared_inflight"] += 1
+            try:
+                return await asyncio.shield(self.inflight[key])
+            except LeaderCancelled:
+                continue
+
+        future = asyncio.get_running_loop().create_future()
+        self.inflight[key] = future
+        try:
+            value = await self.get(key)
+            if value is None:
+                self.stats["misses"] += 1
+                start = time.perf_counter()
+                value, store = await compute()
+                if store:
+                    await self.set(key, value, time.perf_counter() - start)
+            future.set_result(value)
+            return value
+        except asyncio.CancelledError:
+            # Annuler le futur partagé lèverait CancelledError chez des appelants que rien n'a annulés
+            future.set_exception(LeaderCancelled())
+            future.exception()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            # Évite l'avertissement « exception never retrieved » quand personne n'attendait
+            future.exception()
+            raise
+        finally:
+            del self.inflight[key]
+
+    def close(self):
+        with self._lock:
+            if self._connection is not None:
+                self._connection.close()
+                self._connection = None
+
+    def log_stats(self):
+        if self.stats["memory_hits"] or self.stats["disk_hits"] or self.stats["misses"]:
+            logging.info(
+                f"Cache de réponses : {self.stats['memory_hits']} hits mémoire, {self.stats['disk_hits']} hits disque, "
+                f"{self.stats['misses']} miss, {self.stats['shared_inflight']} appels partagés, "
+                f"{self.stats['saved_seconds']:.2f}s de latence économisée"
+            )
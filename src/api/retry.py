@@ -0,0 +1,101 @@
+# src/api/retry.py
+import random
+import re
+import time
+from email.utils import parsedate_to_datetime
+from typing import Mapping, Optional
+
+from src.utils.exceptions import CircuitOpenException
+
+RETRYABLE_STATUSES = {408, 409, 429, 500, 502, 503, 504, 529}
+
+_DURATION_PATTERN = re.compile(r"(\d+(?:\.\d+)?)(ms|s|m|h)")
+_DURATION_UNITS = {"ms": 0.001, "s": 1.0, "m": 60.0, "h": 3600.0}
+
+def parse_duration(value: str) -> Optional[float]:
+    # Formats rencontrés : "20", "1.5", "20ms", "6m0s"
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    parts = _DURATION_PATTERN.findall(value)
+    if not parts:
+        return None
+    return sum(float(amount) * _DURATION_UNITS[unit] for amount, unit in parts)
+
+def parse_retry_after(headers: Mapping[str, str]) -> Optional[float]:
+    if "retry-after-ms" in headers:
+        delay = parse_duration(headers["retry-after-ms"])
+        if delay is not None:
+            return delay / 1000.0
+
+    if "retry-after" in headers:
+        value = headers["retry-after"]
+        delay = parse_duration(value)
+        if delay is not None:
+            return delay
+        try:
+            return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+        except (TypeError, ValueError):
+            pass
+
+    # En-têtes x-ratelimit-* : on attend la réinitialisation du quota épuisé
+    delays = []
+    for kind in ("requests", "tokens"):
+        if headers.get(f"x-ratelimit-remaining-{kind}") == "0" and f"x-ratelimit-reset-{kind}" in headers:
+            delay = parse_duration(headers[f"x-ratelimit-reset-{kind}"])
+            if delay is not None:
+                delays.append(delay)
+    return max(delays) if delays else None
+
+class RetryPolicy:
+    def __init__(self, max_attempts: int = 5, base_delay: float = 0.5, max_delay: float = 30.0,
+                 deadline: float = 120.0):
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.deadline = deadline
+
+    def next_delay(self, previous_delay: float) -> float:
+        # Backoff à gigue décorrélée : chaque attente est tirée entre la base et trois fois l'attente précédente
+        upper = max(self.base_delay, previous_delay * 3)
+        return min(self.max_delay, random.uniform(self.base_delay, upper))
+
+class CircuitBreaker:
+    def __init__(self, name: str, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self.probing = False
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return "half-open"
+        return "open"
+
+    def before_call(self):
+        state = self.state
+        if state == "open" or (state == "half-open" and self.probing):
+            raise CircuitOpenException(f"{self.name} indisponible : circuit ouvert après {self.failures} échecs consécutifs.")
+        if state == "half-open":
+            # Une seule requête de test passe tant que le fournisseur n'a pas répondu
+            self.probing = True
+
+    def record_success(self):
+        self.failures = 0
+        self.opened_at = None
+        self.probing = False
+
+    def record_failure(self):
+        self.failures += 1
+        self.probing = False
+        if self.failures >= self.failure_threshold or self.opened_at is not None:
+            self.opened_at = time.monotonic()
+
+    def abort_probe(self):
+        self.probing = False
@@ -0,0 +1,101 @@
+# src/api/routing.py
+from typing import Dict, List, Optional, Tuple, Union
+
+from .model_registry import get_provider
+
+class LatencyTracker:
+    def __init__(self, alpha: float = 0.2, beta: float = 0.25, failure_alpha: float = 0.5):
+        # Estimateur à la TCP (RFC 6298) : moyenne lissée et écart moyen lissé, mis à jour à chaque réponse
+        self.alpha = alpha
+        self.beta = beta
+        self.failure_alpha = failure_alpha
+        self.mean: Dict[str, float] = {}
+        self.deviation: Dict[str, float] = {}
+        self.failure_rate: Dict[str, float] = {}
+        self.samples: Dict[str, int] = {}
+        # Fournisseurs jamais mesurés dont des requêtes ont été annulées : plus lents que le gagnant d'au moins tant
+        self.lower_bound: Dict[str, float] = {}
+
+    def observe(self, provider: str, seconds: float, failed: bool = False):
+        rate = self.failure_rate.get(provider, 0.0)
+        self.failure_rate[provider] = rate + self.failure_alpha * (float(failed) - rate)
+        self.samples[provider] = self.samples.get(provider, 0) + 1
+        if provider not in self.mean:
+            self.mean[provider] = seconds
+            self.deviation[provider] = seconds / 2
+        elif not failed or seconds > self.mean[provider]:
+            # Un échec rapide ne fait pas baisser la moyenne : il n'a rien produit
+            error = seconds - self.mean[provider]
+            self.deviation[provider] += self.beta * (abs(error) - self.deviation[provider])
+            self.mean[provider] += self.alpha * error
+
+    def observe_failure(self, provider: str, seconds: float):
+        self.observe(provider, seconds, failed=True)
+
+    def observe_cancelled(self, provider: str, seconds: float):
+        # Requête annulée avant sa réponse : la durée observée n'est qu'une borne inférieure de la latence.
+        # Elle ne peut que relever la moyenne, et ne sert pas de première mesure
+        if provider not in self.mean:
+            self.lower_bound[provider] = max(self.lower_bound.get(provider, 0.0), seconds)
+        elif seconds > self.mean[provider]:
+            error = seconds - self.mean[provider]
+            self.deviation[provider] += self.beta * (abs(error) - self.deviation[provider])
+            self.mean[provider] += self.alpha * error
+
+    def estimate(self, provider: str) -> Optional[float]:
+        # Temps moyen jusqu'à une réponse réussie, les échecs comptant comme des tentatives à refaire
+        if provider not in self.mean:
+            return None
+        return self.mean[provider] / max(1.0 - self.failure_rate[provider], 0.01)
+
+    def order_key(self, provider: str) -> Tuple[bool, float]:
+        # Un fournisseur jamais mesuré passe devant pour obtenir une première mesure, sauf s'il n'a fait que perdre
+        # des courses : il passe alors après les fournisseurs mesurés
+        estimate = self.estimate(provider)
+        if estimate is None:
+            return provider in self.lower_bound, self.lower_bound.get(provider, 0.0)
+        return False, estimate
+
+    def threshold(self, provider: str, k: float = 4.0) -> Optional[float]:
+        # Au-delà de moyenne + k écarts, une requête est anormalement lente (queue de distribution)
+        if provider not in self.mean:
+            return None
+        return self.mean[provider] + k * self.deviation[provider]
+
+    def snapshot(self) -> Dict[str, Dict[str, float]]:
+        return {
+            provider: {"mean": self.mean[provider], "deviation": self.deviation[provider],
+                       "failure_rate": self.failure_rate[provider], "samples": self.samples[provider]}
+            for provider in self.mean
+        }
+
+class RoutingPolicy:
+    def __init__(self, fallbacks: Optional[List[str]] = None, hedge_after: Union[float, str, None] = None,
+                 max_hedges: int = 1, adaptive: bool = False, min_hedge_after: float = 0.05):
+        self.fallbacks = list(fallbacks or [])
+        for model in self.fallbacks:
+            get_provider(model)
+        if isinstance(hedge_after, str) and hedge_after != "auto":
+            raise ValueError(f"hedge_after doit être un nombre de secondes ou \"auto\" : {hedge_after}")
+        self.hedge_after = hedge_after
+        self.max_hedges = max_hedges
+        self.adaptive = adaptive
+        self.min_hedge_after = min_hedge_after
+
+    def candidates(self, model: str, tracker: LatencyTracker, unavailable: List[str]) -> List[str]:
+        models = [model] + [fallback for fallback in self.fallbacks if fallback != model]
+        if not self.adaptive:
+            return models
+        # Le plus rapide d'abord (voir LatencyTracker.order_key), un fournisseur dont le disjoncteur est ouvert
+        # passe en dernier
+        return sorted(models, key=lambda candidate: (
+            get_provider(candidate) in unavailable, *tracker.order_key(get_provider(candidate))
+        ))
+
+    def hedge_delay(self, model: str, tracker: LatencyTracker) -> Optional[float]:
+        if self.hedge_after is None:
+            return None
+        if self.hedge_after == "auto":
+            threshold = tracker.threshold(get_provider(model))
+            return None if threshold is None else max(threshold, self.min_hedge_after)
+        return float(self.hedge_after)
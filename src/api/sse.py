@@ -0,0 +1,27 @@
+# src/api/sse.py
+from typing import AsyncIterator, List, Tuple
+
+import aiohttp
+
+async def iter_sse_events(response: aiohttp.ClientResponse) -> AsyncIterator[Tuple[str, str]]:
+    # Analyse incrémentale des server-sent events : un événement est émis à chaque ligne vide
+    event = "message"
+    data: List[str] = []
+    async for raw_line in response.content:
+        line = raw_line.decode("utf-8").rstrip("\r\n")
+        if not line:
+            if data:
+                yield event, "\n".join(data)
+            event, data = "message", []
+            continue
+        if line.startswith(":"):
+            continue
+        field, _, value = line.partition(":")
+        if value.startswith(" "):
+            value = value[1:]
+        if field == "event":
+            event = value
+        elif field == "data":
+            data.append(value)
+    if data:
+        yield event, "\n".join(data)
@@ -0,0 +1,187 @@
+# src/api/telemetry.py
+import json
+import logging
+import os
+import time
+from collections import defaultdict, deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Awaitable, Deque, Dict, Iterator, List, Optional, Tuple
+
+from .model_registry import get_model_price
+from src.utils.files import write_atomically
+
+# Bloc en cours dans la tâche asyncio : les spans ouverts plus bas (appels HTTP, embeddings) lui sont rattachés
+current_block: ContextVar[Optional[str]] = ContextVar("llmflow_current_block", default=None)
+
+SUMMARY_COLUMNS = ("queue", "external_data", "search", "embedding", "generation", "ttft", "save")
+
+class Span:
+    __slots__ = ("name", "category", "block", "start", "end", "attributes")
+
+    def __init__(self, name: str, category: str, block: Optional[str], start: float, end: float,
+                 attributes: Dict[str, Any]):
+        self.name = name
+        self.category = category
+        self.block = block
+        self.start = start
+        self.end = end
+        self.attributes = attributes
+
+    @property
+    def duration(self) -> float:
+        return self.end - self.start
+
+class Telemetry:
+    def __init__(self, enabled: bool = True, trace_path: Optional[str] = None, metrics_path: Optional[str] = None,
+                 metrics_interval: float = 30.0, max_spans: int = 100000, summary: bool = True,
+                 prices: Optional[Dict[str, Tuple[float, float]]] = None):
+        self.enabled = enabled
+        self.trace_path = trace_path
+        self.metrics_path = metrics_path
+        self.metrics_interval = metrics_interval
+        self.summary = summary
+        self.prices = prices
+        self.origin = time.perf_counter()
+        # Les spans sont bornés pour les traitements par lots ; les compteurs, eux, couvrent toute l'exécution
+        self.spans: Deque[Span] = deque(maxlen=max_spans)
+        self.counters: Dict[Tuple[str, Tuple[Tuple[str, str], ...]], float] = defaultdict(float)
+        self._last_metrics_export = time.monotonic()
+
+    def add_span(self, name: str, category: str, start: float, end: float, block: Optional[str] = None,
+                 **attributes: Any):
+        if not self.enabled:
+            return
+        block = block or current_block.get()
+        self.spans.append(Span(name, category, block, start, end, attributes))
+        self.count("llmflow_span_seconds_total", end - start, category=category)
+        self.count("llmflow_spans_total", 1, category=category)
+
+    @contextmanager
+    def span(self, name: str, category: str, **attributes: Any) -> Iterator[Dict[str, Any]]:
+        # Le dictionnaire renvoyé peut être complété pendant le span (jetons, statut...)
+        start = time.perf_counter()
+        try:
+            yield attributes
+        except BaseException as e:
+            attributes["error"] = type(e).__name__
+            raise
+        finally:
+            self.add_span(name, category, start, time.perf_counter(), **attributes)
+
+    async def timed(self, awaitable: Awaitable[Any], name: str, category: str, **attributes: Any) -> Any:
+        with self.span(name, category, **attributes):
+            return await awaitable
+
+    def count(self, name: str, value: float = 1.0, **labels: str):
+        if self.enabled:
+            self.counters[(name, tuple(sorted(labels.items())))] += value
+
+    def cost(self, model: str, prompt_tokens: int, completion_tokens: int) -> float:
+        price = get_model_price(model, self.prices)
+        if price is None:
+            return 0.0
+        return (prompt_tokens * price[0] + completion_tokens * price[1]) / 1_000_000
+
+    def record_usage(self, provider: str, model: str, prompt_tokens: int, completion_tokens: int,
+                     estimated: bool = False) -> Dict[str, Any]:
+        cost = self.cost(model, prompt_tokens, completion_tokens)
+        source = "estimated" if estimated else "provider"
+        self.count("llmflow_tokens_total", prompt_tokens, provider=provider, model=model, kind="prompt", source=source)
+        self.count("llmflow_tokens_total", completion_tokens, provider=provider, model=model, kind="completion", source=source)
+        self.count("llmflow_cost_usd_total", cost, provider=provider, model=model)
+        return {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens, "cost": cost,
+                "usage_estimated": estimated}
+
+    def summary_rows(self) -> List[Dict[str, Any]]:
+        rows: Dict[str, Dict[str, Any]] = {}
+        for span in self.spans:
+            if span.block is None:
+                continue
+            row = rows.setdefault(span.block, {
+                "block": span.block, "total": 0.0, "prompt_tokens": 0, "completion_tokens": 0, "cost": 0.0,
+                **{column: 0.0 for column in SUMMARY_COLUMNS},
+            })
+            if span.category == "block":
+                row["total"] += span.duration
+            elif span.category in SUMMARY_COLUMNS:
+                row[span.category] += span.duration
+            if span.category == "http":
+                row["prompt_tokens"] += span.attributes.get("prompt_tokens", 0)
+                row["completion_tokens"] += span.attributes.get("completion_tokens", 0)
+                row["cost"] += span.attributes.get("cost", 0.0)
+        return list(rows.values())
+
+    def format_summary(self) -> str:
+        rows = self.summary_rows()
+        if not rows:
+            return ""
+        header = (f"{'bloc':<20} {'total':>8} " + " ".join(f"{column:>13}" for column in SUMMARY_COLUMNS)
+                  + f" {'jetons in':>10} {'jetons out':>10} {'coût $':>9}")
+        lines = [header, "-" * len(header)]
+        for row in rows:
+            lines.append(
+                f"{row['block']:<20} {row['total']:>7.2f}s " + " ".join(f"{row[column]:>12.2f}s" for column in SUMMARY_COLUMNS)
+                + f" {row['prompt_tokens']:>10} {row['completion_tokens']:>10} {row['cost']:>9.4f}"
+            )
+        lines.append(
+            f"{'total':<20} {'':>8} " + " ".join(f"{'':>13}" for _ in SUMMARY_COLUMNS)
+            + f" {sum(row['prompt_tokens'] for row in rows):>10} {sum(row['completion_tokens'] for row in rows):>10}"
+            + f" {sum(row['cost'] for row in rows):>9.4f}"
+        )
+        return "\n".join(lines)
+
+    def chrome_trace(self) -> Dict[str, Any]:
+        # Format « Trace Event » : chargeable dans chrome://tracing ou Perfetto, une piste par bloc
+        pid = os.getpid()
+        tracks: Dict[str, int] = {}
+        events = []
+        for span in self.spans:
+            track = span.block or "flow"
+            if track not in tracks:
+                tracks[track] = len(tracks) + 1
+                events.append({"name": "thread_name", "ph": "M", "pid": pid, "tid": tracks[track],
+                               "args": {"name": track}})
+            events.append({
+                "name": span.name, "cat": span.category, "ph": "X", "pid": pid, "tid": tracks[track],
+                "ts": round((span.start - self.origin) * 1e6, 3), "dur": round(span.duration * 1e6, 3),
+                "args": span.attributes,
+            })
+        return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+    def prometheus_text(self) -> str:
+        lines = []
+        declared = set()
+        for (name, labels), value in sorted(self.counters.items()):
+            if name not in declared:
+                declared.add(name)
+                lines.append(f"# TYPE {name} counter")
+            label_text = ",".join(f'{key}="{str(label).replace(chr(34), chr(39))}"' for key, label in labels)
+            lines.append(f"{name}{{{label_text}}} {value:.6g}" if label_text else f"{name} {value:.6g}")
+        return "\n".join(lines) + "\n"
+
+    @staticmethod
+    def write_atomic(path: str, content: str):
+        def write(temporary_path: str):
+            with open(temporary_path, "w", encoding="utf-8") as file:
+                file.write(content)
+        write_atomically(path, write)
+
+    def maybe_export_metrics(self):
+        # Pour les traitements longs : le fichier est relu par un collecteur (ex. textfile de node_exporter)
+        if self.metrics_path and time.monotonic() - self._last_metrics_export >= self.metrics_interval:
+            self._last_metrics_export = time.monotonic()
+            self.write_atomic(self.metrics_path, self.prometheus_text())
+
+    def report(self):
+        if not self.enabled:
+            return
+        if self.summary:
+            table = self.format_summary()
+            if table:
+                logging.info(f"Télémétrie par bloc :\n{table}")
+        if self.trace_path:
+            self.write_atomic(self.trace_path, json.dumps(self.chrome_trace(), ensure_ascii=False, default=str))
+            logging.info(f"Trace écrite dans {self.trace_path}")
+        if self.metrics_path:
+            self.write_atomic(self.metrics_path, self.prometheus_text())
@@ -3,3 +3,9 @@ from .prompt_block import PromptBlock
 from .step import Step
 from .semantic_search import SemanticSearch
 from .flow_manager import FlowManager
+from .scheduler import FlowGraph, FlowScheduler
+from .embedding_store import EmbeddingStore
+from .similarity import SimilarityIndex
+from .block_stream import BlockStream
+from .output_sink import OutputSink
+from .run_store import RunStore
@@ -0,0 +1,50 @@
+# src/flow/block_stream.py
+import asyncio
+from typing import AsyncIterator, List, Optional
+
+class BlockStream:
+    def __init__(self):
+        self.deltas: List[str] = []
+        self.done = False
+        self.error: Optional[BaseException] = None
+        self._changed = asyncio.Event()
+
+    def _notify(self):
+        # Chaque abonné attend l'événement courant ; on le remplace pour la prochaine attente
+        changed, self._changed = self._changed, asyncio.Event()
+        changed.set()
+
+    def publish(self, delta: str):
+        self.deltas.append(delta)
+        self._notify()
+
+    def close(self):
+        self.done = True
+        self._notify()
+
+    def replace(self, text: str):
+        # Flux interrompu : les blocs qui attendent le texte complet reçoivent ce texte à la place du texte partiel
+        self.deltas = [text]
+        self.close()
+
+    def fail(self, error: BaseException):
+        self.error = error
+        self.close()
+
+    async def subscribe(self) -> AsyncIterator[str]:
+        # Un abonné tardif reçoit d'abord tous les fragments déjà publiés
+        index = 0
+        while True:
+            while index < len(self.deltas):
+                yield self.deltas[index]
+                index += 1
+            if self.done:
+                if self.error is not None:
+                    raise self.error
+                return
+            await self._changed.wait()
+
+    async def text(self) -> str:
+        async for _ in self.subscribe():
+            pass
+        return "".join(self.deltas).strip()
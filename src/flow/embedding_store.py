@@ -0,0 +1,162 @@
+# src/flow/embedding_store.py
+import hashlib
+import json
+import logging
+import os
+import re
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+from src.utils.files import write_atomically
+
+DEFAULT_DIRECTORY = ".llmflow_embeddings"
+
+class EmbeddingTable:
+    def __init__(self, directory: str, model: str, max_entries: int, initial_capacity: int):
+        safe_name = re.sub(r"[^A-Za-z0-9_.-]", "_", model)
+        self.model = model
+        self.matrix_path = os.path.join(directory, f"{safe_name}.f32")
+        self.index_path = os.path.join(directory, f"{safe_name}.json")
+        self.max_entries = max_entries
+        self.initial_capacity = initial_capacity
+        self.dimension: Optional[int] = None
+        self.capacity = 0
+        self.next_row = 0
+        self.clock = 0
+        self.rows: Dict[str, int] = {}
+        self.last_used: Dict[str, int] = {}
+        # free_rows ne contient que des lignes absentes de l'index sur disque ; les lignes libérées pendant
+        # l'exécution restent dans released_rows jusqu'à la prochaine écriture de l'index
+        self.free_rows: List[int] = []
+        self.released_rows: List[int] = []
+        self.matrix: Optional[np.memmap] = None
+        self.dirty = False
+        if os.path.exists(self.index_path) and os.path.exists(self.matrix_path):
+            self._load()
+
+    def _load(self):
+        with open(self.index_path, "r", encoding="utf-8") as file:
+            index = json.load(file)
+        self.dimension = index["dimension"]
+        self.capacity = index["capacity"]
+        self.clock = index["clock"]
+        for key, (row, last_used) in index["entries"].items():
+            self.rows[key] = row
+            self.last_used[key] = last_used
+        used = set(self.rows.values())
+        self.next_row = max(used) + 1 if used else 0
+        self.free_rows = [row for row in range(self.next_row) if row not in used]
+        self.matrix = np.memmap(self.matrix_path, dtype=np.float32, mode="r+", shape=(self.capacity, self.dimension))
+
+    def _resize(self, capacity: int):
+        if self.matrix is not None:
+            self.matrix.flush()
+            self.matrix = None
+        with open(self.matrix_path, "ab") as file:
+            file.truncate(capacity * self.dimension * 4)
+        self.capacity = capacity
+        self.matrix = np.memmap(self.matrix_path, dtype=np.float32, mode="r+", shape=(capacity, self.dimension))
+
+    def _evict(self):
+        # Libère les 10 % d'entrées les moins récemment utilisées
+        count = max(1, self.max_entries // 10)
+        for key in sorted(self.last_used, key=self.last_used.get)[:count]:
+            self.released_rows.append(self.rows.pop(key))
+            del self.last_used[key]
+        self.dirty = True
+
+    def _allocate_row(self) -> int:
+        if self.free_rows:
+            return self.free_rows.pop()
+        if self.next_row >= self.capacity:
+            if self.capacity < self.max_entries:
+                self._resize(min(self.max_entries, max(self.initial_capacity, self.capacity * 2)))
+            else:
+                self._evict()
+                # L'index sans les entrées évincées est écrit avant que leurs lignes ne soient réécrites
+                self.flush()
+                return self.free_rows.pop()
+        row = self.next_row
+        self.next_row += 1
+        return row
+
+    def get(self, key: str) -> Optional[np.ndarray]:
+        row = self.rows.get(key)
+        if row is None:
+            return None
+        self.clock += 1
+        self.last_used[key] = self.clock
+        return np.array(self.matrix[row])
+
+    def put(self, key: str, embedding: Sequence[float]):
+        vector = np.asarray(embedding, dtype=np.float32)
+        if self.dimension is None:
+            self.dimension = vector.shape[0]
+        if vector.shape[0] != self.dimension:
+            raise ValueError(f"Dimension d'embedding inattendue pour {self.model} : {vector.shape[0]} au lieu de {self.dimension}")
+        if key not in self.rows:
+            self.rows[key] = self._allocate_row()
+        self.clock += 1
+        self.last_used[key] = self.clock
+        self.matrix[self.rows[key]] = vector
+        self.dirty = True
+
+    def flush(self):
+        if not self.dirty or self.matrix is None:
+            return
+        self.matrix.flush()
+        index = {
+            "model": self.model,
+            "dimension": self.dimension,
+            "capacity": self.capacity,
+            "clock": self.clock,
+            "entries": {key: [row, self.last_used[key]] for key, row in self.rows.items()},
+        }
+        # L'index n'est remplacé qu'une fois la matrice écrite, et aucune ligne qu'il référence n'a été réécrite
+        # avec un autre texte : un arrêt brutal laisse l'ancien index cohérent
+        def write(path: str):
+            with open(path, "w", encoding="utf-8") as file:
+                json.dump(index, file)
+
+        write_atomically(self.index_path, write)
+        self.free_rows.extend(self.released_rows)
+        self.released_rows = []
+        self.dirty = False
+
+class EmbeddingStore:
+    def __init__(self, directory: str = DEFAULT_DIRECTORY, max_entries: int = 100000, initial_capacity: int = 1024):
+        self.directory = directory
+        self.max_entries = max_entries
+        self.initial_capacity = initial_capacity
+        self.tables: Dict[str, EmbeddingTable] = {}
+        self.stats = {"hits": 0, "misses": 0}
+        os.makedirs(directory, exist_ok=True)
+
+    @staticmethod
+    def text_key(text: str) -> str:
+        return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+    def table(self, model: str) -> EmbeddingTable:
+        if model not in self.tables:
+            self.tables[model] = EmbeddingTable(self.directory, model, self.max_entries, self.initial_capacity)
+        return self.tables[model]
+
+    def get_many(self, model: str, texts: Sequence[str]) -> List[Optional[np.ndarray]]:
+        table = self.table(model)
+        embeddings = [table.get(self.text_key(text)) for text in texts]
+        hits = sum(embedding is not None for embedding in embeddings)
+        self.stats["hits"] += hits
+        self.stats["misses"] += len(texts) - hits
+        return embeddings
+
+    def put_many(self, model: str, texts: Sequence[str], embeddings: Sequence[Sequence[float]]):
+        table = self.table(model)
+        for text, embedding in zip(texts, embeddings):
+            table.put(self.text_key(text), embedding)
+
+    def flush(self):
+        for table in self.tables.values():
+            table.flush()
+        if self.stats["hits"] or self.stats["misses"]:
+            logging.info(f"Cache d'embeddings : {self.stats['hits']} hits, {self.stats['misses']} miss")
@@ -1,112 +1,339 @@
 # src/flow/flow_manager.py
 import asyncio
+import io
 import logging
-from typing import List, Dict, Any
+import time
+from typing import List, Dict, Any, Optional, TextIO, Tuple
 
 import aiohttp
-from colorama import init, Fore, Style
-from graphviz import Source
-from IPython.display import display
 
 from .step import Step
 from .prompt_block import PromptBlock
 from .semantic_search import SemanticSearch
-from src.api.api_client import APIClient
-
-init(autoreset=True)
+from .embedding_store import EmbeddingStore
+from .scheduler import BlockRef, FlowGraph, FlowScheduler
+from .run_store import RunStore
+from .block_stream import BlockStream
+from src.api.api_client import APIClient, GENERATION_ERROR
+from src.api.http_cache import HTTPCache
+from src.api.data_loader import DataLoader
+from src.api.telemetry import Telemetry, current_block
+from .output_sink import OutputSink
+from src.utils.console import console_styles
+from src.utils.exceptions import StreamInterruptedException
 
 class FlowManager:
-    def __init__(self, api_keys: Dict[str, str], words_per_chunk: int = 100, default_top_k: int = 3):
+    def __init__(self, api_keys: Dict[str, str], words_per_chunk: int = 100, default_top_k: int = 3,
+                 api_client_options: Optional[Dict[str, Any]] = None,
+                 embedding_store_options: Optional[Dict[str, Any]] = None,
+                 semantic_search_options: Optional[Dict[str, Any]] = None,
+                 data_loader_options: Optional[Dict[str, Any]] = None,
+                 api_client: Optional[APIClient] = None, semantic_search: Optional[SemanticSearch] = None,
+                 http_cache: Optional[HTTPCache] = None, output_options: Optional[Dict[str, Any]] = None,
+                 output_sink: Optional[OutputSink] = None, run_store_options: Optional[Dict[str, Any]] = None,
+                 run_store: Optional[RunStore] = None, telemetry_options: Optional[Dict[str, Any]] = None):
         self.steps: List[Step] = []
-        self.api_client = APIClient(api_keys)
-        self.semantic_search = SemanticSearch(self.api_client, words_per_chunk)
+        # Un client et une recherche sémantique peuvent être partagés entre plusieurs flux (traitement par lots)
+        self.api_client = api_client or APIClient(api_keys, telemetry=Telemetry(**(telemetry_options or {})),
+                                                  **(api_client_options or {}))
+        self.telemetry = self.api_client.telemetry
+        if semantic_search is None:
+            embedding_store = EmbeddingStore(**embedding_store_options) if embedding_store_options is not None else None
+            semantic_search = SemanticSearch(self.api_client, words_per_chunk, embedding_store,
+                                             **(semantic_search_options or {}))
+        self.semantic_search = semantic_search
+        data_loader_options = dict(data_loader_options or {})
+        http_cache_path = data_loader_options.pop('http_cache', None)
+        self.http_cache = http_cache or (HTTPCache(http_cache_path) if http_cache_path else None)
+        self.data_loader_options = data_loader_options
+        self.data_loader: Optional[DataLoader] = None
+        output_options = dict(output_options or {})
+        # Libère la sortie d'un bloc intermédiaire dès que tous ses consommateurs ont terminé
+        self.release_outputs = output_options.pop('release_outputs', False)
+        self.output_sink = output_sink or OutputSink(telemetry=self.telemetry, **output_options)
+        self.run_store = run_store or (RunStore(**run_store_options) if run_store_options is not None else None)
         self.default_top_k = default_top_k
+        self.graph: Optional[FlowGraph] = None
 
     def add_step(self, step: Step):
         self.steps.append(step)
+        self.graph = None
+        for block_index, block in enumerate(step.blocks):
+            if block.name is None:
+                block.name = f"step{len(self.steps)}_block{block_index + 1}"
+
+    def compile(self) -> FlowGraph:
+        # Vérifie les références une seule fois ; le plan est réutilisé par l'exécution, le plan affiché et le graphe
+        if self.graph is None:
+            self.graph = FlowGraph(self.steps)
+        return self.graph
+
+    def compute_fingerprints(self, graph: FlowGraph):
+        # L'ordre topologique garantit que les empreintes amont sont connues avant celle du bloc
+        blocks = graph.blocks
+        search_settings = {**self.semantic_search.fingerprint_config(), "default_top_k": self.default_top_k}
+        for node in graph.order:
+            upstream = [blocks[index].fingerprint for index in graph.upstream(node)]
+            blocks[node].fingerprint = RunStore.fingerprint(blocks[node].fingerprint_config(search_settings), upstream)
+
+    def plan(self) -> List[Tuple[BlockRef, bool]]:
+        graph = self.compile()
+        self.compute_fingerprints(graph)
+        if self.run_store is None:
+            return [(graph.ref(node), True) for node in graph.order]
+        stored = self.run_store.contains([graph.blocks[node].fingerprint for node in graph.order])
+        return [(graph.ref(node), not stored[graph.blocks[node].fingerprint]) for node in graph.order]
+
+    def display_plan(self):
+        Fore, Style = console_styles()
+        plan = self.plan()
+        print(f"\n{Fore.GREEN}{Style.BRIGHT}Plan d'exécution ({sum(run for _, run in plan)} bloc(s) sur {len(plan)} à exécuter):{Style.RESET_ALL}")
+        for (step_index, block_index), run in plan:
+            block = self.steps[step_index].blocks[block_index]
+            status = f"{Fore.YELLOW}à exécuter" if run else f"{Fore.BLUE}repris du point de contrôle"
+            print(f"  Étape {step_index + 1}, Bloc {block_index + 1} ({block.name}, {block.model}) : {status}{Style.RESET_ALL}")
+
+    async def restore_block(self, block: PromptBlock) -> bool:
+        if self.run_store is None:
+            return False
+        output = await asyncio.to_thread(self.run_store.get, block.fingerprint)
+        if output is None:
+            return False
+        block.output = output
+        block.complete = True
+        if block.output_stream is not None:
+            block.output_stream.publish(output)
+            block.output_stream.close()
+        self.run_store.stats["reused"] += 1
+        return True
+
+    async def process_block(self, session: aiohttp.ClientSession, step_index: int, block_index: int):
+        block = self.steps[step_index].blocks[block_index]
+        # Chaque bloc tourne dans sa propre tâche : les spans émis par le client API lui sont attribués
+        current_block.set(block.name)
+        with self.telemetry.span(block.name, "block", model=block.model) as attributes:
+            if await self.restore_block(block):
+                attributes["restored"] = True
+                logging.info(f"Étape {step_index + 1}, Bloc {block_index + 1} : sortie reprise du point de contrôle")
+                return
+            await self.run_block(session, step_index, block_index)
+
+    async def run_block(self, session: aiohttp.ClientSession, step_index: int, block_index: int):
+        block = self.steps[step_index].blocks[block_index]
+        # Les données externes se chargent pendant que les blocs amont diffusés terminent leur génération
+        all_input_texts, (external_data_text, external_data_loaded) = await asyncio.gather(
+            self.gather_input_texts(block),
+            self.telemetry.timed(block.load_external_data(session, self.data_loader), "load", "external_data")
+        )
+        logging.info(f"Données externes pour Étape {step_index + 1}, Bloc {block_index + 1}: {external_data_text[:100]}...")
+
+        if block.semantic_search:
+            query = block.semantic_search.get('query', '')
+            top_k = block.semantic_search.get('top_k', self.default_top_k)
+            search_inputs = block.semantic_search.get('inputs', ['all'])
+
+            searches = []
+
+            if 'all' in search_inputs or 'previous' in search_inputs:
+                input_search_text = '\n'.join(all_input_texts)
+                searches.append(self.semantic_search.search(session, query, input_search_text, top_k))
+
+            if 'all' in search_inputs or 'external' in search_inputs:
+                if external_data_text:
+                    searches.append(self.semantic_search.search(session, query, external_data_text, top_k))
 
-    async def process_step(self, step_index: int):
-        if step_index == 0:
-            for block in self.steps[step_index].blocks:
-                if block.input_blocks:
-                    logging.warning(f"Étape 1, Bloc ne peut pas avoir d'entrées d'autres blocs.")
-                    return
-
-        async with aiohttp.ClientSession() as session:
-            tasks = []
-            for block in self.steps[step_index].blocks:
-                all_input_texts = self.collect_input_texts(step_index, block)
-                
-                external_data_text = await block.load_external_data(session)
-                logging.info(f"Données externes pour Étape {step_index + 1}, Bloc {len(tasks) + 1}: {external_data_text[:100]}...")
-                
-                if block.semantic_search:
-                    query = block.semantic_search.get('query', '')
-                    top_k = block.semantic_search.get('top_k', self.default_top_k)
-                    search_inputs = block.semantic_search.get('inputs', ['all'])
-                    
-                    relevant_chunks = []
-                    
-                    if 'all' in search_inputs or 'previous' in search_inputs:
-                        input_search_text = '\n'.join(all_input_texts)
-                        relevant_input_chunks = await self.semantic_search.search(session, query, input_search_text, top_k)
-                        relevant_chunks.extend(relevant_input_chunks)
-                    
-                    if 'all' in search_inputs or 'external' in search_inputs:
-                        if external_data_text:
-                            relevant_external_chunks = await self.semantic_search.search(session, query, external_data_text, top_k)
-                            relevant_chunks.extend(relevant_external_chunks)
-                    
-                    input_texts = [chunk for chunk, _ in relevant_chunks]
-                    logging.info(f"Résultats de la recherche sémantique: {[(chunk[:100], score) for chunk, score in relevant_chunks[:2]]}")
-                else:
-                    input_texts = all_input_texts + ([external_data_text] if external_data_text else [])
-
-                if input_texts:
-                    merged_input = "\n".join(input_texts)
-                    block.prompt = f"{merged_input}\n\n{block.prompt}"
-
-                logging.info(f"Traitement de l'Étape {step_index + 1}, Bloc {len(tasks) + 1}")
-                logging.info(f"Prompt: {block.prompt[:100]}...")
-
-                task = self.api_client.generate_text(
-                    session, block.model, block.prompt, block.temperature, block.max_tokens
+            # Lancées ensemble, les deux recherches partagent leurs lots d'embeddings
+            results = await self.telemetry.timed(asyncio.gather(*searches), "semantic_search", "search", top_k=top_k)
+            relevant_chunks = [chunk for chunks in results for chunk in chunks]
+            input_texts = [chunk for chunk, _ in relevant_chunks]
+            logging.info(f"Résultats de la recherche sémantique: {[(chunk[:100], score) for chunk, score in relevant_chunks[:2]]}")
+        else:
+            input_texts = all_input_texts + ([external_data_text] if external_data_text else [])
+
+        # Le gabarit du bloc n'est jamais modifié : le prompt rendu n'existe que le temps de la génération
+        prompt = block.prompt
+        if input_texts:
+            merged_input = "\n".join(input_texts)
+            prompt = f"{merged_input}\n\n{block.prompt}"
+
+        logging.info(f"Traitement de l'Étape {step_index + 1}, Bloc {block_index + 1}")
+        logging.info(f"Prompt: {prompt[:100]}...")
+
+        with self.telemetry.span("generate", "generation", model=block.model, stream=block.stream):
+            if block.stream:
+                block.output = await self.stream_block(session, step_index, block_index, prompt)
+            else:
+                block.output = await self.api_client.generate_text(
+                    session, block.model, prompt, block.temperature, block.max_tokens, block.cache, block.map_reduce,
+                    block.routing
                 )
-                tasks.append(task)
+        # Un map-reduce dont une partie a échoué contient le message d'erreur ; une source externe en échec ou une
+        # entrée incomplète ne changent pas l'empreinte : conservée, la sortie serait reprise à chaque exécution
+        block.complete = (external_data_loaded and GENERATION_ERROR not in block.output
+                          and all(self.steps[i].blocks[j].complete for i, j in block.input_blocks))
+        # Le rendu et l'écriture se font hors de la boucle d'événements ; seule la mise en file est attendue
+        await self.output_sink.save(block)
+        if self.run_store is not None and block.complete:
+            self.run_store.stats["executed"] += 1
+            await asyncio.to_thread(self.run_store.put, block.fingerprint, block.name, block.output)
+
+    async def stream_block(self, session: aiohttp.ClientSession, step_index: int, block_index: int,
+                           prompt: Optional[str] = None) -> str:
+        block = self.steps[step_index].blocks[block_index]
+        stream = block.output_stream or BlockStream()
+        deltas = []
+        partial = self.output_sink.open_partial(block)
+        print(f"\n--- Étape {step_index + 1}, Bloc {block_index + 1} (flux) ---")
+        try:
+            async for delta in self.api_client.stream_text(
+                session, block.model, prompt or block.prompt, block.temperature, block.max_tokens, block.cache,
+                block.map_reduce, block.routing
+            ):
+                deltas.append(delta)
+                stream.publish(delta)
+                print(delta, end="", flush=True)
+                if partial:
+                    partial.write(delta)
+        except StreamInterruptedException as e:
+            # Comme un échec de génération sans flux : ni le texte partiel ni le point de contrôle ne sont conservés
+            logging.error(f"Erreur API: {str(e)}")
+            stream.replace(GENERATION_ERROR)
+            return GENERATION_ERROR
+        except BaseException as e:
+            stream.fail(e)
+            raise
+        finally:
+            print()
+            if partial:
+                await partial.close()
+        stream.close()
+        return "".join(deltas).strip()
+
+    def collect_input_texts(self, block: PromptBlock) -> List[str]:
+        return [self.steps[input_step].blocks[input_block].output
+                for input_step, input_block in block.input_blocks]
+
+    async def gather_input_texts(self, block: PromptBlock) -> List[str]:
+        texts = []
+        for input_step, input_block in block.input_blocks:
+            upstream = self.steps[input_step].blocks[input_block]
+            if block.stream_input and upstream.output_stream is not None:
+                texts.append(await upstream.output_stream.text())
+            else:
+                texts.append(upstream.output)
+        return texts
 
-            results = await asyncio.gather(*tasks)
-            for block, result in zip(self.steps[step_index].blocks, results):
-                block.output = result
-                block.save_block_output()
+    def release_inputs(self, graph: FlowGraph, node: int, remaining: List[int]):
+        # Chaque bloc compte ses consommateurs plus lui-même : un amont diffusé peut finir après son aval
+        for index in (*graph.upstream(node), node):
+            remaining[index] -= 1
+            if remaining[index] == 0 and graph.downstream(index):
+                graph.blocks[index].output = None
+                graph.blocks[index].output_stream = None
 
-    def collect_input_texts(self, step_index: int, block: PromptBlock) -> List[str]:
-        return [self.steps[input_step].blocks[input_block].output 
-                for input_step, input_block in block.input_blocks 
-                if input_step < step_index]
+    async def execute(self, session: aiohttp.ClientSession) -> FlowScheduler:
+        graph = self.compile()
+        scheduler = FlowScheduler(graph)
+        self.compute_fingerprints(graph)
+        stored = set()
+        if self.run_store is not None:
+            fingerprints = [block.fingerprint for block in graph.blocks]
+            stored = {fingerprint for fingerprint, found in self.run_store.contains(fingerprints).items() if found}
+        for block in graph.blocks:
+            block.output_stream = BlockStream() if block.stream else None
+        # Toutes les sources externes sont lancées dès le départ, sans attendre que leur bloc soit prêt
+        self.data_loader = DataLoader(self.http_cache, **self.data_loader_options)
+        sources = [block.external_data for block in graph.blocks
+                   if block.external_data and block.fingerprint not in stored]
+        if sources:
+            logging.info(f"Préchargement de {self.data_loader.prefetch(session, sources)} source(s) externe(s)")
+        remaining = [len(graph.downstream(node)) + 1 for node in range(len(graph.blocks))]
 
-    async def run_flow(self):
-        self.visualize_flow()
-        for i in range(len(self.steps)):
-            await self.process_step(i)
-            self.display_step_results(i)
+        async def process_node(node: int):
+            await self.process_block(session, *graph.ref(node))
+            if self.release_outputs:
+                self.release_inputs(graph, node, remaining)
+
+        try:
+            await scheduler.run(process_node)
+        finally:
+            self.data_loader.close()
+        return scheduler
+
+    def collect_outputs(self) -> List[List[Optional[str]]]:
+        return [[block.output for block in step.blocks] for step in self.steps]
+
+    async def run_flow(self, visualize: bool = False, display: bool = False):
+        if visualize:
+            self.visualize_flow()
+        start = time.perf_counter()
+        session = self.api_client.get_session()
+        try:
+            scheduler = await self.execute(session)
+        finally:
+            await self.output_sink.flush()
+            self.output_sink.close()
+            logging.info(f"Pool de connexions HTTP : {self.api_client.pool_stats()}")
+            self.api_client.response_cache.log_stats()
+            if self.semantic_search.embedding_store is not None:
+                self.semantic_search.embedding_store.flush()
+            if self.http_cache is not None:
+                self.http_cache.log_stats()
+                self.http_cache.close()
+            if self.run_store is not None:
+                self.run_store.log_stats()
+                self.run_store.close()
+            self.telemetry.report()
+            await self.api_client.close()
+        scheduler.report_critical_path(time.perf_counter() - start)
+        # L'affichage en couleur charge colorama : il n'a lieu que sur demande
+        if display:
+            for i in range(len(self.steps)):
+                self.display_step_results(i)
+
+    async def warm_up_embeddings(self, texts: List[str]) -> int:
+        session = self.api_client.get_session()
+        try:
+            return await self.semantic_search.warm_up(session, texts)
+        finally:
+            await self.api_client.close()
 
     def display_step_results(self, step_index: int):
+        Fore, Style = console_styles()
         print(f"\n{Fore.GREEN}{Style.BRIGHT}Résultats de l'Étape {step_index + 1}:{Style.RESET_ALL}")
         for j, block in enumerate(self.steps[step_index].blocks):
             print(f"{Fore.BLUE}{Style.BRIGHT}Bloc {j + 1} (Modèle: {block.model}, Max Tokens: {block.max_tokens}):{Style.RESET_ALL}")
             print(f"\n{Fore.YELLOW}Sortie:{Style.RESET_ALL} {block.output}\n")
 
     def visualize_flow(self):
-        dot_code = self.generate_dot_code()
-        graph = Source(dot_code)
-        display(graph)
+        # Affichage dans un notebook : graphviz et IPython ne sont chargés que sur demande
+        from graphviz import Source
+        from IPython.display import display
+        display(Source(self.generate_dot_code()))
+
+    def render_graph(self, path: str, output_format: Optional[str] = None) -> str:
+        # Sans format, le code DOT est écrit directement dans le fichier et graphviz n'est pas nécessaire
+        if output_format is None:
+            with open(path, 'w', encoding='utf-8') as file:
+                self.write_dot(file)
+            return path
+        from graphviz import Source
+        with open(path, 'wb') as file:
+            file.write(Source(self.generate_dot_code()).pipe(format=output_format))
+        return path
 
     def generate_dot_code(self) -> str:
-        dot_code = """
+        dot_code = io.StringIO()
+        self.write_dot(dot_code)
+        return dot_code.getvalue()
+
+    def write_dot(self, dot_code: TextIO):
+        # Une ligne écrite par nœud et par arc : temps linéaire, sans chaîne intermédiaire de la taille du graphe
+        dot_code.write("""
         digraph G {
             node [style="filled", fontname="Arial", shape="box", margin="0.2,0.1"];
             edge [fontname="Arial"];
-        """
+        """)
         
         colors = ["#FFB3BA", "#BAFFC9", "#BAE1FF", "#FFFFBA", "#FFD8B9"]
         
@@ -116,11 +343,10 @@ class FlowManager:
                 node_id = f"Block{i+1}_{j+1}"
                 external_data_info = f"\\nDonnées Externes: {type(block.external_data).__name__}" if block.external_data else ""
                 semantic_search_info = "\\nRecherche Sémantique" if block.semantic_search else ""
-                label = f"Étape {i+1}, Bloc {j+1}\\nModèle: {block.model}{external_data_info}{semantic_search_info}\\nPrompt: {block.prompt[:50]}..."
-                dot_code += f'    {node_id} [label="{label}", fillcolor="{step_color}"];\n'
+                prompt = block.prompt[:50].replace('\\', '\\\\').replace('"', '\\"').replace('\n', ' ')
+                label = f"Étape {i+1}, Bloc {j+1}\\nModèle: {block.model}{external_data_info}{semantic_search_info}\\nPrompt: {prompt}..."
+                dot_code.write(f'    {node_id} [label="{label}", fillcolor="{step_color}"];\n')
                 for input_step, input_block in block.input_blocks:
-                    input_id = f"Block{input_step+1}_{input_block+1}"
-                    dot_code += f"    {input_id} -> {node_id};\n"
+                    dot_code.write(f"    Block{input_step+1}_{input_block+1} -> {node_id};\n")
         
-        dot_code += "}"
-        return dot_code
+        dot_code.write("}")
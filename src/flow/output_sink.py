@@ -0,0 +1,160 @@
+# src/flow/output_sink.py
+import asyncio
+import contextlib
+import json
+import logging
+import os
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional, Set
+
+from .prompt_block import FILE_SAVERS, OutputSaver, PromptBlock
+from src.api.telemetry import Telemetry
+
+class PartialOutput:
+    # Texte diffusé écrit au fil de l'eau dans <fichier>.partial, hors de la boucle : le fichier final n'a qu'un
+    # seul écrivain, le sink, qui le remplace atomiquement une fois la génération terminée
+    def __init__(self, path: str, executor: ThreadPoolExecutor):
+        self.path = path
+        self.executor = executor
+        self.buffer: List[str] = []
+        self.writing: Optional[asyncio.Future] = None
+        self.started = False
+        self.failed = False
+
+    def write(self, delta: str):
+        self.buffer.append(delta)
+        # Les fragments arrivés pendant une écriture sont regroupés dans la suivante
+        if self.writing is None and not self.failed:
+            self._schedule()
+
+    def _schedule(self):
+        text, self.buffer = "".join(self.buffer), []
+        truncate, self.started = not self.started, True
+        self.writing = asyncio.get_running_loop().run_in_executor(
+            self.executor, OutputSaver.write_partial, text, self.path, truncate
+        )
+        self.writing.add_done_callback(self._written)
+
+    def _written(self, completed: asyncio.Future):
+        self.writing = None
+        if not completed.cancelled() and completed.exception() is not None:
+            self.failed = True
+            logging.error(f"Erreur lors de l'écriture de la sortie en flux ({self.path}) : {str(completed.exception())}")
+        elif self.buffer and not self.failed:
+            self._schedule()
+
+    async def close(self):
+        # Le fichier partiel disparaît à la fin du flux, réussi ou non : seul le fichier final reste
+        while self.writing is not None:
+            # Une écriture en échec est déjà journalisée par _written
+            with contextlib.suppress(Exception):
+                await asyncio.shield(self.writing)
+        if self.started:
+            await asyncio.get_running_loop().run_in_executor(self.executor, self._remove)
+
+    def _remove(self):
+        with contextlib.suppress(OSError):
+            os.remove(self.path)
+
+class OutputSink:
+    def __init__(self, max_workers: int = 4, max_pending: int = 64, executor: str = "thread",
+                 jsonl_batch_size: int = 100, telemetry: Optional[Telemetry] = None):
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self.executor_kind = executor
+        self.jsonl_batch_size = jsonl_batch_size
+        self.pending: Set[asyncio.Future] = set()
+        self.jsonl_buffers: Dict[str, List[str]] = {}
+        self.stats = {"files": 0, "jsonl_records": 0, "errors": 0}
+        self.telemetry = telemetry
+        self._executor: Optional[Executor] = None
+        # Un seul fil pour les ajouts JSONL : les lots d'un même fichier sont écrits dans l'ordre, sans entrelacement
+        self._jsonl_executor: Optional[ThreadPoolExecutor] = None
+        # Un seul fil aussi pour les sorties en flux : les fragments d'un fichier sont écrits dans l'ordre
+        self._stream_executor: Optional[ThreadPoolExecutor] = None
+        self._slots: Optional[asyncio.Semaphore] = None
+
+    def _get_executor(self) -> Executor:
+        if self._executor is None:
+            # Le rendu PDF (FPDF, pur Python) garde le GIL : des processus le sortent vraiment de la boucle
+            executor_class = ProcessPoolExecutor if self.executor_kind == "process" else ThreadPoolExecutor
+            self._executor = executor_class(max_workers=self.max_workers)
+        return self._executor
+
+    async def _submit(self, executor: Executor, function: Callable, *args, description: str,
+                      block: Optional[str] = None):
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.max_pending)
+        # File bornée : au-delà de max_pending écritures en attente, le bloc attend qu'une place se libère
+        start = time.perf_counter()
+        await self._slots.acquire()
+        future = asyncio.get_running_loop().run_in_executor(executor, function, *args)
+        self.pending.add(future)
+
+        def done(completed: asyncio.Future):
+            self._slots.release()
+            self.pending.discard(completed)
+            if completed.cancelled():
+                return
+            error = completed.exception()
+            if self.telemetry is not None:
+                # Le span couvre l'attente d'une place et l'écriture elle-même, hors de la boucle
+                self.telemetry.add_span("save", "save", start, time.perf_counter(), block=block,
+                                        filename=description, error=type(error).__name__ if error else None)
+            if error is not None:
+                self.stats["errors"] += 1
+                logging.error(f"Erreur lors de la sauvegarde de la sortie ({description}) : {str(error)}")
+            else:
+                print(f"Sortie sauvegardée dans {description}")
+
+        future.add_done_callback(done)
+
+    async def save(self, block: PromptBlock):
+        if not (block.save_output and block.output):
+            return
+        output_format = block.output_format()
+        filename = block.output_filename()
+        if output_format == 'jsonl':
+            buffer = self.jsonl_buffers.setdefault(filename, [])
+            buffer.append(json.dumps(block.output_record(), ensure_ascii=False) + "\n")
+            self.stats["jsonl_records"] += 1
+            if len(buffer) >= self.jsonl_batch_size:
+                await self._flush_jsonl(filename)
+        elif output_format in FILE_SAVERS:
+            self.stats["files"] += 1
+            await self._submit(self._get_executor(), FILE_SAVERS[output_format], block.output, filename,
+                               description=filename, block=block.name)
+        else:
+            logging.error(f"Erreur lors de la sauvegarde de la sortie : Format de sortie non supporté : {output_format}")
+
+    def open_partial(self, block: PromptBlock) -> Optional[PartialOutput]:
+        # Seules les sorties texte peuvent être suivies au fil du flux ; le PDF est rendu à la fin
+        if not (block.save_output and block.output_format() == 'txt'):
+            return None
+        if self._stream_executor is None:
+            self._stream_executor = ThreadPoolExecutor(max_workers=1)
+        return PartialOutput(f"{block.output_filename()}.partial", self._stream_executor)
+
+    async def _flush_jsonl(self, filename: str):
+        lines = self.jsonl_buffers.pop(filename, [])
+        if not lines:
+            return
+        if self._jsonl_executor is None:
+            self._jsonl_executor = ThreadPoolExecutor(max_workers=1)
+        await self._submit(self._jsonl_executor, OutputSaver.append_jsonl, lines, filename,
+                           description=f"{filename} ({len(lines)} enregistrements)")
+
+    async def flush(self):
+        for filename in list(self.jsonl_buffers):
+            await self._flush_jsonl(filename)
+        if self.pending:
+            await asyncio.gather(*self.pending, return_exceptions=True)
+
+    def close(self):
+        for executor in (self._executor, self._jsonl_executor, self._stream_executor):
+            if executor is not None:
+                executor.shutdown(wait=True)
+        self._executor = None
+        self._jsonl_executor = None
+        self._stream_executor = None
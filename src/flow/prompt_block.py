@@ -5,31 +5,60 @@ import logging
 import re
 import csv
 import io
-from fpdf import FPDF
-from typing import Optional, Dict, Any, List, Tuple
+from typing import Optional, Dict, Any, List, Tuple, Callable
 
 from src.utils.exceptions import APIException
+from src.utils.files import suffixed_filename, write_atomically
 from src.api.model_api import ExternalData, WebData, APIData, TXTData, CSVData
+from src.api.data_loader import DataLoader
+from .block_stream import BlockStream
 
 class OutputSaver:
+    # Les fichiers sont écrits sous un nom temporaire puis renommés : un lecteur ne voit jamais un fichier à moitié écrit
     @staticmethod
     def save_txt(content: str, filename: str):
-        with open(filename, 'w', encoding='utf-8') as file:
-            file.write(content)
+        def write(temporary_path: str):
+            with open(temporary_path, 'w', encoding='utf-8') as file:
+                file.write(content)
+        write_atomically(filename, write)
 
     @staticmethod
     def save_pdf(content: str, filename: str):
+        # fpdf n'est chargé que pour les sorties PDF
+        from fpdf import FPDF
         pdf = FPDF()
         pdf.add_page()
         pdf.set_font("Arial", size=12)
         pdf.multi_cell(0, 10, content)
-        pdf.output(filename)
+        write_atomically(filename, pdf.output)
+
+    @staticmethod
+    def write_partial(text: str, filename: str, truncate: bool):
+        with open(filename, 'w' if truncate else 'a', encoding='utf-8') as file:
+            file.write(text)
+
+    @staticmethod
+    def append_jsonl(lines: List[str], filename: str):
+        with open(filename, 'a', encoding='utf-8') as file:
+            file.write("".join(lines))
+
+FILE_SAVERS: Dict[str, Callable[[str, str], None]] = {
+    'txt': OutputSaver.save_txt,
+    'pdf': OutputSaver.save_pdf,
+}
 
 class PromptBlock:
+    # Des dizaines de milliers de blocs peuvent coexister : pas de __dict__ par instance
+    __slots__ = ("prompt", "model", "max_tokens", "temperature", "output", "input_blocks", "external_data",
+                 "semantic_search", "save_output", "cache", "map_reduce", "routing", "stream", "stream_input",
+                 "output_stream", "name", "fingerprint", "complete", "record_id")
+
     def __init__(self, prompt: str, model: str = "gpt-3.5-turbo", max_tokens: int = 2000, 
                  temperature: float = 0.7, external_data: Optional[ExternalData] = None,
                  semantic_search: Optional[Dict[str, Any]] = None, 
-                 save_output: Optional[Dict[str, str]] = None):
+                 save_output: Optional[Dict[str, str]] = None, cache: Optional[bool] = None,
+                 map_reduce: Optional[Dict[str, Any]] = None, stream: bool = False, stream_input: bool = False,
+                 name: Optional[str] = None, routing: Optional[Dict[str, Any]] = None):
         self.prompt = prompt
         self.model = model
         self.max_tokens = max_tokens
@@ -39,29 +68,81 @@ class PromptBlock:
         self.external_data = external_data
         self.semantic_search = semantic_search
         self.save_output = save_output
+        self.cache = cache
+        self.map_reduce = map_reduce
+        self.routing = routing
+        self.stream = stream
+        self.stream_input = stream_input
+        self.output_stream: Optional[BlockStream] = None
+        # Nom stable d'une exécution à l'autre, attribué par le FlowManager (ex. « step1_block2 »)
+        self.name = name
+        self.fingerprint: Optional[str] = None
+        # Génération sans échec, à partir de données externes et d'entrées elles-mêmes complètes
+        self.complete = False
+        # Identifiant de l'enregistrement traité en mode lots : il distingue les sorties des différents enregistrements
+        self.record_id: Optional[str] = None
 
     def add_input(self, step_index: int, block_index: int):
         self.input_blocks.append((step_index, block_index))
 
-    async def load_external_data(self, session: aiohttp.ClientSession) -> str:
+    def fingerprint_config(self, search_settings: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        # Tout ce qui influe sur la génération ; le nom du fichier de sortie n'en fait pas partie
+        external_data = None
+        if self.external_data:
+            external_data = {"type": type(self.external_data).__name__, **vars(self.external_data)}
+        return {
+            "prompt": self.prompt,
+            "model": self.model,
+            "max_tokens": self.max_tokens,
+            "temperature": self.temperature,
+            "external_data": external_data,
+            "semantic_search": self.semantic_search,
+            "map_reduce": self.map_reduce,
+            # Ajouté seulement s'il est défini : les points de contrôle existants restent valides
+            **({"routing": self.routing} if self.routing else {}),
+            # Réglages globaux de la recherche (découpage, modèle d'embeddings, top_k par défaut), pour les seuls
+            # blocs qui l'utilisent
+            **({"search_settings": search_settings} if self.semantic_search and search_settings else {}),
+        }
+
+    async def load_external_data(self, session: aiohttp.ClientSession,
+                                 loader: Optional[DataLoader] = None) -> Tuple[str, bool]:
+        # Renvoie le texte et si le chargement a réussi ; en cas d'échec, le message d'erreur tient lieu de données
         if not self.external_data:
-            return ""
+            return "", True
         try:
-            return await self.external_data.load_data(session)
+            if loader is not None:
+                return await loader.load(session, self.external_data), True
+            return await self.external_data.load_data(session), True
         except Exception as e:
             logging.error(f"Erreur lors du chargement des données externes depuis {self.external_data.source}: {str(e)}")
-            return f"Erreur lors du chargement des données externes: {str(e)}"
+            return f"Erreur lors du chargement des données externes: {str(e)}", False
+
+    def output_format(self) -> str:
+        return self.save_output.get('format', 'txt').lower()
+
+    def output_filename(self) -> str:
+        if 'filename' in self.save_output:
+            return self.save_output['filename']
+        filename = f'output_{self.name or "block"}.{self.output_format()}'
+        return suffixed_filename(filename, self.record_id) if self.record_id is not None else filename
+
+    def output_record(self) -> Dict[str, Any]:
+        record = {"block": self.name, "model": self.model, "output": self.output}
+        if self.record_id is not None:
+            record["record"] = self.record_id
+        return record
 
     def save_block_output(self):
         if self.save_output and self.output:
-            output_format = self.save_output.get('format', 'txt').lower()
-            filename = self.save_output.get('filename', f'output_{id(self)}.{output_format}')
+            output_format = self.output_format()
+            filename = self.output_filename()
             
             try:
-                if output_format == 'txt':
-                    OutputSaver.save_txt(self.output, filename)
-                elif output_format == 'pdf':
-                    OutputSaver.save_pdf(self.output, filename)
+                if output_format == 'jsonl':
+                    OutputSaver.append_jsonl([json.dumps(self.output_record(), ensure_ascii=False) + "\n"], filename)
+                elif output_format in FILE_SAVERS:
+                    FILE_SAVERS[output_format](self.output, filename)
                 else:
                     raise ValueError(f"Format de sortie non supporté : {output_format}")
                 print(f"Sortie sauvegardée dans {filename}")
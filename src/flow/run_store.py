@@ -0,0 +1,68 @@
+# src/flow/run_store.py
+import hashlib
+import json
+import logging
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+class RunStore:
+    def __init__(self, path: str = ".llmflow_runs.sqlite"):
+        self.path = path
+        self.stats = {"reused": 0, "executed": 0}
+        self._connection: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def fingerprint(config: Dict[str, Any], upstream: List[str]) -> str:
+        # L'empreinte d'un bloc couvre ses amonts : modifier un bloc invalide aussi tous ses descendants
+        payload = json.dumps([config, upstream], ensure_ascii=False, sort_keys=True, default=str)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._connection is None:
+            self._connection = sqlite3.connect(self.path, check_same_thread=False)
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS block_outputs (fingerprint TEXT PRIMARY KEY, block TEXT, output TEXT, created REAL)"
+            )
+        return self._connection
+
+    def get(self, fingerprint: str) -> Optional[str]:
+        with self._lock:
+            row = self._connect().execute(
+                "SELECT output FROM block_outputs WHERE fingerprint = ?", (fingerprint,)
+            ).fetchone()
+        return row[0] if row else None
+
+    def contains(self, fingerprints: List[str]) -> Dict[str, bool]:
+        with self._lock:
+            connection = self._connect()
+            return {
+                fingerprint: connection.execute(
+                    "SELECT 1 FROM block_outputs WHERE fingerprint = ?", (fingerprint,)
+                ).fetchone() is not None
+                for fingerprint in fingerprints
+            }
+
+    def put(self, fingerprint: str, block: str, output: str):
+        # Chaque sortie est validée dès la fin de son bloc : un arrêt brutal ne perd que les blocs en cours
+        with self._lock:
+            connection = self._connect()
+            connection.execute(
+                "INSERT OR REPLACE INTO block_outputs (fingerprint, block, output, created) VALUES (?, ?, ?, ?)",
+                (fingerprint, block, output, time.time())
+            )
+            connection.commit()
+
+    def close(self):
+        with self._lock:
+            if self._connection is not None:
+                self._connection.close()
+                self._connection = None
+
+    def log_stats(self):
+        if self.stats["reused"] or self.stats["executed"]:
+            logging.info(
+                f"Points de contrôle : {self.stats['reused']} bloc(s) repris, {self.stats['executed']} exécuté(s)"
+            )
@@ -0,0 +1,164 @@
+# src/flow/scheduler.py
+import asyncio
+import logging
+import time
+from array import array
+from bisect import bisect_right
+from collections import deque
+from itertools import accumulate
+from typing import Awaitable, Callable, List, Set, Tuple
+
+from .step import Step
+from .prompt_block import PromptBlock
+from src.utils.exceptions import FlowConfigException
+
+BlockRef = Tuple[int, int]
+
+def format_block_ref(ref: BlockRef) -> str:
+    return f"Étape {ref[0] + 1}, Bloc {ref[1] + 1}"
+
+class FlowGraph:
+    # Plan compilé : les blocs sont numérotés dans l'ordre des étapes et les relations sont stockées en tableaux
+    # d'indices contigus (CSR), construits en un seul passage : temps et mémoire linéaires en blocs et en arcs
+    __slots__ = ("blocks", "offsets", "upstream_start", "upstream_nodes", "downstream_start", "downstream_nodes",
+                 "streamed_edges", "order")
+
+    def __init__(self, steps: List[Step]):
+        self.blocks: List[PromptBlock] = [block for step in steps for block in step.blocks]
+        # Indice du premier bloc de chaque étape, plus une sentinelle : (i, j) devient offsets[i] + j
+        self.offsets = array("l", [0])
+        for step in steps:
+            self.offsets.append(self.offsets[-1] + len(step.blocks))
+
+        # Les entrées du bloc n sont upstream_nodes[upstream_start[n]:upstream_start[n + 1]]
+        self.upstream_start = array("l", [0])
+        self.upstream_nodes = array("l")
+        # Arcs où l'aval consomme le flux de l'amont : il démarre sans attendre la fin de l'amont
+        self.streamed_edges: Set[Tuple[int, int]] = set()
+        consumers = array("l")
+        for step_index, step in enumerate(steps):
+            for block_index, block in enumerate(step.blocks):
+                node = self.offsets[step_index] + block_index
+                # Une même entrée référencée deux fois ne crée qu'une seule dépendance
+                inputs = dict.fromkeys(self._resolve((step_index, block_index), tuple(ref)) for ref in block.input_blocks)
+                if block.stream_input:
+                    self.streamed_edges.update((index, node) for index in inputs if self.blocks[index].stream)
+                self.upstream_nodes.extend(inputs)
+                self.upstream_start.append(len(self.upstream_nodes))
+                consumers.extend([node] * len(inputs))
+
+        # Arcs inversés par comptage : les consommateurs de chaque bloc restent dans l'ordre des blocs
+        counts = [0] * (len(self.blocks) + 1)
+        for index in self.upstream_nodes:
+            counts[index + 1] += 1
+        self.downstream_start = array("l", accumulate(counts))
+        self.downstream_nodes = array("l", bytes(self.downstream_start.itemsize * len(self.upstream_nodes)))
+        cursor = list(self.downstream_start)
+        for index, node in zip(self.upstream_nodes, consumers):
+            self.downstream_nodes[cursor[index]] = node
+            cursor[index] += 1
+
+        self.order = self.topological_order()
+
+    def upstream(self, node: int) -> array:
+        return self.upstream_nodes[self.upstream_start[node]:self.upstream_start[node + 1]]
+
+    def downstream(self, node: int) -> array:
+        return self.downstream_nodes[self.downstream_start[node]:self.downstream_start[node + 1]]
+
+    def ref(self, node: int) -> BlockRef:
+        step_index = bisect_right(self.offsets, node) - 1
+        return step_index, node - self.offsets[step_index]
+
+    def _resolve(self, source: BlockRef, ref: BlockRef) -> int:
+        step_index, block_index = ref
+        offsets = self.offsets
+        exists = 0 <= step_index < len(offsets) - 1 and 0 <= block_index < offsets[step_index + 1] - offsets[step_index]
+        if exists and step_index <= source[0] and ref != source:
+            return offsets[step_index] + block_index
+        if ref == source:
+            raise FlowConfigException(f"{format_block_ref(source)} ne peut pas dépendre de lui-même.")
+        if not exists:
+            raise FlowConfigException(f"{format_block_ref(source)} référence un bloc inexistant : {list(ref)}.")
+        raise FlowConfigException(
+            f"{format_block_ref(source)} référence un bloc d'une étape ultérieure : {format_block_ref(ref)}."
+        )
+
+    def topological_order(self) -> array:
+        starts = self.upstream_start
+        remaining = [starts[node + 1] - starts[node] for node in range(len(self.blocks))]
+        ready = deque(node for node, count in enumerate(remaining) if count == 0)
+        order = array("l")
+        while ready:
+            node = ready.popleft()
+            order.append(node)
+            for child in self.downstream(node):
+                remaining[child] -= 1
+                if remaining[child] == 0:
+                    ready.append(child)
+
+        if len(order) != len(self.blocks):
+            cycle = [format_block_ref(self.ref(node)) for node, count in enumerate(remaining) if count > 0]
+            raise FlowConfigException(f"Dépendance circulaire détectée entre : {', '.join(cycle)}.")
+        return order
+
+    def critical_path(self, durations: List[float]) -> Tuple[List[BlockRef], float]:
+        if not self.blocks:
+            return [], 0.0
+        finish = [0.0] * len(self.blocks)
+        previous = [-1] * len(self.blocks)
+        for node in self.order:
+            start = 0.0
+            for index in self.upstream(node):
+                if finish[index] > start:
+                    start = finish[index]
+                    previous[node] = index
+            finish[node] = start + durations[node]
+
+        node = max(range(len(finish)), key=finish.__getitem__)
+        total = finish[node]
+        path = [self.ref(node)]
+        while previous[node] >= 0:
+            node = previous[node]
+            path.append(self.ref(node))
+        return path[::-1], total
+
+class FlowScheduler:
+    def __init__(self, graph: FlowGraph):
+        self.graph = graph
+        self.durations: List[float] = [0.0] * len(graph.blocks)
+
+    async def run(self, process_block: Callable[[int], Awaitable[None]]) -> List[float]:
+        tasks: List[asyncio.Task] = [None] * len(self.graph.blocks)
+
+        async def run_node(node: int):
+            # Chaque bloc démarre dès que ses propres entrées sont disponibles
+            upstream_tasks = [tasks[index] for index in self.graph.upstream(node)
+                              if (index, node) not in self.graph.streamed_edges]
+            if upstream_tasks:
+                await asyncio.gather(*upstream_tasks)
+            start = time.perf_counter()
+            await process_block(node)
+            self.durations[node] = time.perf_counter() - start
+
+        # L'ordre topologique garantit que les tâches amont existent déjà
+        for node in self.graph.order:
+            tasks[node] = asyncio.ensure_future(run_node(node))
+
+        try:
+            await asyncio.gather(*tasks)
+        except BaseException:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            raise
+        return self.durations
+
+    def report_critical_path(self, wall_time: float):
+        path, total = self.graph.critical_path(self.durations)
+        if not path:
+            return
+        chain = " -> ".join(format_block_ref(ref) for ref in path)
+        sequential = sum(self.durations)
+        logging.info(f"Chemin critique ({total:.2f}s) : {chain}")
+        logging.info(f"Durée totale du flux : {wall_time:.2f}s (somme des blocs : {sequential:.2f}s)")
@@ -1,29 +1,93 @@
 # src/flow/semantic_search.py
+import aiohttp
+import hashlib
 import numpy as np
-from typing import List, Tuple
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
 import logging
 
 from src.api.api_client import APIClient
+from src.utils.chunking import chunk_text
+from .embedding_store import EmbeddingStore
+from .similarity import SimilarityIndex
 
 class SemanticSearch:
-    def __init__(self, api_client: APIClient, words_per_chunk: int = 100):
+    def __init__(self, api_client: APIClient, words_per_chunk: int = 100, embedding_store: Optional[EmbeddingStore] = None,
+                 index_dtype: str = "float32", tokens_per_chunk: Optional[int] = None, chunk_overlap: int = 0,
+                 max_cached_indexes: int = 16):
         self.api_client = api_client
         self.words_per_chunk = words_per_chunk
+        # Environ 0,75 mot par jeton en anglais comme en français
+        self.tokens_per_chunk = tokens_per_chunk or max(1, round(words_per_chunk * 4 / 3))
+        self.chunk_overlap = chunk_overlap
+        self.embedding_store = embedding_store
+        self.index_dtype = index_dtype
+        # Index déjà construits, par empreinte du texte : un même corpus interrogé par plusieurs blocs
+        # n'est découpé et indexé qu'une fois
+        self.max_cached_indexes = max_cached_indexes
+        self.indexes: "OrderedDict[str, Tuple[List[str], SimilarityIndex]]" = OrderedDict()
 
-    @staticmethod
-    def split_text(text: str, words_per_chunk: int) -> List[str]:
-        words = text.split()
-        return [' '.join(words[i:i+words_per_chunk]) for i in range(0, len(words), words_per_chunk)]
+    def fingerprint_config(self) -> Dict[str, Any]:
+        # Réglages globaux qui changent les segments retenus, donc le prompt des blocs avec recherche sémantique
+        return {
+            "embedding_model": self.api_client.apis["openai"].embedding_model,
+            "tokens_per_chunk": self.tokens_per_chunk,
+            "chunk_overlap": self.chunk_overlap,
+            "index_dtype": self.index_dtype,
+        }
+
+    def split_text(self, text: str) -> List[str]:
+        return chunk_text(text, self.tokens_per_chunk, self.chunk_overlap, self.api_client.apis["openai"].embedding_model)
 
     @staticmethod
     def cosine_similarity(vec1: List[float], vec2: List[float]) -> float:
         return np.dot(vec1, vec2) / (np.linalg.norm(vec1) * np.linalg.norm(vec2))
 
+    async def embed(self, session: aiohttp.ClientSession, texts: List[str]) -> List[List[float]]:
+        if self.embedding_store is None:
+            return await self.api_client.get_embeddings(session, texts)
+
+        model = self.api_client.apis["openai"].embedding_model
+        embeddings = self.embedding_store.get_many(model, texts)
+        # Seuls les textes jamais vus sont envoyés à l'API, une seule fois chacun
+        missing = list(dict.fromkeys(text for text, embedding in zip(texts, embeddings) if embedding is None))
+        if missing:
+            fetched = dict(zip(missing, await self.api_client.get_embeddings(session, missing)))
+            self.embedding_store.put_many(model, missing, [fetched[text] for text in missing])
+            embeddings = [fetched[text] if embedding is None else embedding for text, embedding in zip(texts, embeddings)]
+        return embeddings
+
     async def search(self, session: aiohttp.ClientSession, query: str, text: str, top_k: int) -> List[Tuple[str, float]]:
-        chunks = self.split_text(text, self.words_per_chunk)
-        query_embedding = await self.api_client.get_embeddings(session, [query])
-        chunk_embeddings = await self.api_client.get_embeddings(session, chunks)
-        
-        similarities = [self.cosine_similarity(query_embedding[0], chunk_emb) for chunk_emb in chunk_embeddings]
-        top_indices = np.argsort(similarities)[-top_k:][::-1]
-        return [(chunks[i], similarities[i]) for i in top_indices]
+        key = hashlib.sha256(text.encode("utf-8")).hexdigest()
+        cached = self.indexes.get(key)
+        if cached is not None:
+            self.indexes.move_to_end(key)
+            chunks, index = cached
+            query_embeddings = await self.embed(session, [query])
+        else:
+            chunks = self.split_text(text)
+            if not chunks:
+                return []
+            # La requête et les segments partent dans les mêmes lots d'embeddings
+            embeddings = await self.embed(session, [query] + chunks)
+            query_embeddings = embeddings[:1]
+            index = SimilarityIndex(embeddings[1:], self.index_dtype)
+            del embeddings
+            self.remember_index(key, chunks, index)
+        return [(chunks[i], score) for i, score in index.search(query_embeddings, top_k)[0]]
+
+    def remember_index(self, key: str, chunks: List[str], index: SimilarityIndex):
+        if self.max_cached_indexes <= 0:
+            return
+        self.indexes[key] = (chunks, index)
+        self.indexes.move_to_end(key)
+        while len(self.indexes) > self.max_cached_indexes:
+            self.indexes.popitem(last=False)
+
+    async def warm_up(self, session: aiohttp.ClientSession, texts: List[str]) -> int:
+        chunks = [chunk for text in texts for chunk in self.split_text(text)]
+        if chunks:
+            await self.embed(session, chunks)
+        if self.embedding_store is not None:
+            self.embedding_store.flush()
+        return len(chunks)
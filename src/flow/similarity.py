@@ -0,0 +1,63 @@
+# src/flow/similarity.py
+import numpy as np
+from typing import List, Sequence, Tuple
+
+SUPPORTED_DTYPES = ("float32", "float16", "int8")
+
+class SimilarityIndex:
+    # Taille des blocs de lignes décompressés à la volée pour les index quantifiés
+    block_rows = 8192
+
+    def __init__(self, embeddings: Sequence[Sequence[float]], dtype: str = "float32"):
+        if dtype not in SUPPORTED_DTYPES:
+            raise ValueError(f"Type de stockage non supporté : {dtype} (attendu : {', '.join(SUPPORTED_DTYPES)})")
+        self.dtype = dtype
+        matrix = self.normalize(np.asarray(embeddings, dtype=np.float32))
+        self.scales = None
+        if dtype == "int8":
+            # Quantification symétrique par ligne : chaque ligne garde son propre facteur d'échelle
+            scales = np.abs(matrix).max(axis=1) / 127.0
+            scales[scales == 0] = 1.0
+            matrix = np.round(matrix / scales[:, None]).astype(np.int8)
+            self.scales = scales.astype(np.float32)
+        elif dtype == "float16":
+            matrix = matrix.astype(np.float16)
+        self.matrix = np.ascontiguousarray(matrix)
+
+    def __len__(self) -> int:
+        return self.matrix.shape[0]
+
+    @staticmethod
+    def normalize(vectors: np.ndarray) -> np.ndarray:
+        vectors = np.atleast_2d(vectors)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return vectors / norms
+
+    def scores(self, queries: Sequence[Sequence[float]]) -> np.ndarray:
+        queries = self.normalize(np.asarray(queries, dtype=np.float32)).T
+        if self.dtype == "float32":
+            return (self.matrix @ queries).T
+
+        # Les index compressés sont décompressés par blocs pour ne jamais matérialiser toute la matrice en float32
+        scores = np.empty((len(self), queries.shape[1]), dtype=np.float32)
+        for start in range(0, len(self), self.block_rows):
+            block = self.matrix[start:start + self.block_rows].astype(np.float32)
+            if self.scales is not None:
+                block *= self.scales[start:start + self.block_rows, None]
+            scores[start:start + self.block_rows] = block @ queries
+        return scores.T
+
+    def search(self, queries: Sequence[Sequence[float]], top_k: int) -> List[List[Tuple[int, float]]]:
+        scores = np.atleast_2d(self.scores(queries))
+        top_k = min(top_k, scores.shape[1])
+        if top_k <= 0:
+            return [[] for _ in range(scores.shape[0])]
+
+        results = []
+        for row in scores:
+            # argpartition isole les top_k en O(n), seul ce sous-ensemble est ensuite trié
+            candidates = np.argpartition(row, -top_k)[-top_k:]
+            ordered = candidates[np.argsort(row[candidates])[::-1]]
+            results.append([(int(i), float(row[i])) for i in ordered])
+        return results
@@ -3,6 +3,8 @@ from typing import List
 from .prompt_block import PromptBlock
 
 class Step:
+    __slots__ = ("blocks",)
+
     def __init__(self):
         self.blocks: List[PromptBlock] = []
 
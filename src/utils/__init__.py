@@ -1,4 +1,25 @@
 # src/utils/__init__.py
+import importlib
+
 from .token_utils import num_tokens_from_string
-from .config import load_steps_config, create_modular_flow
-from .exceptions import APIException
+from .exceptions import APIException, CircuitOpenException, FlowConfigException, StreamInterruptedException
+
+# Ces modules dépendent de src.flow : chargés à la première utilisation, ils ne sont plus importés par
+# src.api et src.flow via src.utils.exceptions (démarrage plus court, sans import circulaire)
+LAZY_EXPORTS = {
+    "load_steps_config": ".config",
+    "load_settings_config": ".config",
+    "create_modular_flow": ".config",
+    "BatchRunner": ".batch_runner",
+    "WorkQueue": ".work_queue",
+    "SQLiteWorkQueue": ".work_queue",
+    "WorkerPool": ".worker_pool",
+    "QueueWorker": ".worker_pool",
+}
+
+def __getattr__(name: str):
+    if name not in LAZY_EXPORTS:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(LAZY_EXPORTS[name], __name__), name)
+    globals()[name] = value
+    return value
@@ -0,0 +1,183 @@
+# src/utils/batch_runner.py
+import asyncio
+import copy
+import json
+import logging
+import os
+import re
+import time
+from typing import Any, Dict, Iterator, List, Optional, Set, Tuple
+
+from src.flow.flow_manager import FlowManager
+from .config import create_modular_flow
+from .files import suffixed_filename
+
+FIELD_PATTERN = re.compile(r"\{(\w+)\}")
+
+def render_template(template: str, record: Dict[str, Any]) -> str:
+    # Seuls les champs présents dans l'enregistrement sont remplacés : les autres accolades restent intactes
+    def replace(match: re.Match) -> str:
+        name = match.group(1)
+        return str(record[name]) if name in record else match.group(0)
+    return FIELD_PATTERN.sub(replace, template)
+
+def render_steps_config(steps_config: List[Dict[str, Any]], record: Dict[str, Any],
+                        record_id: Optional[str] = None) -> List[Dict[str, Any]]:
+    rendered = copy.deepcopy(steps_config)
+    for step_config in rendered:
+        for block_config in step_config['blocks']:
+            block_config['prompt'] = render_template(block_config['prompt'], record)
+            # Une section à null dans la configuration équivaut à une section absente
+            if (block_config.get('semantic_search') or {}).get('query'):
+                block_config['semantic_search']['query'] = render_template(block_config['semantic_search']['query'], record)
+            if (block_config.get('external_data') or {}).get('source'):
+                block_config['external_data']['source'] = render_template(block_config['external_data']['source'], record)
+            if (block_config.get('save_output') or {}).get('filename'):
+                filename = block_config['save_output']['filename']
+                block_config['save_output']['filename'] = render_template(filename, record)
+                templated = block_config['save_output']['filename'] != filename
+                # Un fichier txt ou pdf au nom fixe serait réécrit par chaque enregistrement : l'identifiant y est ajouté.
+                # Les enregistrements jsonl portent l'identifiant et peuvent partager un fichier
+                is_jsonl = block_config['save_output'].get('format', 'txt').lower() == 'jsonl'
+                if not templated and not is_jsonl and record_id is not None:
+                    block_config['save_output']['filename'] = suffixed_filename(
+                        block_config['save_output']['filename'], record_id
+                    )
+    return rendered
+
+def read_records(input_path: str, id_field: str = "id") -> Iterator[Tuple[str, Any]]:
+    with open(input_path, 'r', encoding='utf-8') as file:
+        for line_number, line in enumerate(file, 1):
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError as e:
+                logging.error(f"Ligne {line_number} ignorée, JSON invalide : {str(e)}")
+                continue
+            if not isinstance(record, dict):
+                # Tableau, chaîne ou nombre : transmis tel quel pour être rapporté en erreur avec son numéro de ligne
+                yield str(line_number), record
+                continue
+            yield str(record.get(id_field, line_number)), record
+
+class BatchRunner:
+    def __init__(self, steps_config: List[Dict[str, Any]], api_keys: Dict[str, str],
+                 settings: Optional[Dict[str, Any]] = None, concurrency: int = 16,
+                 journal_path: Optional[str] = None, id_field: str = "id"):
+        self.steps_config = steps_config
+        self.api_keys = api_keys
+        self.settings = settings or {}
+        self.concurrency = concurrency
+        self.journal_path = journal_path
+        self.id_field = id_field
+        # Le premier flux fournit le client et la recherche sémantique partagés par tous les autres
+        self.template = create_modular_flow(steps_config, api_keys, settings=self.settings)
+        self.stats = {"done": 0, "failed": 0, "skipped": 0}
+
+    def load_journal(self) -> Set[str]:
+        if not self.journal_path or not os.path.exists(self.journal_path):
+            return set()
+        with open(self.journal_path, 'r', encoding='utf-8') as file:
+            return {line.rstrip('\n') for line in file if line.strip()}
+
+    def build_flow(self, record: Dict[str, Any], record_id: Optional[str] = None) -> FlowManager:
+        flow_manager = create_modular_flow(render_steps_config(self.steps_config, record, record_id), self.api_keys,
+                                           settings=self.settings, api_client=self.template.api_client,
+                                           semantic_search=self.template.semantic_search,
+                                           http_cache=self.template.http_cache, output_sink=self.template.output_sink,
+                                           run_store=self.template.run_store)
+        for step in flow_manager.steps:
+            for block in step.blocks:
+                block.record_id = record_id
+        return flow_manager
+
+    async def run_record(self, session, record_id: str, record: Any) -> Dict[str, Any]:
+        try:
+            if not isinstance(record, dict):
+                raise ValueError(f"objet JSON attendu, {type(record).__name__} reçu")
+            flow_manager = self.build_flow(record, record_id)
+            await flow_manager.execute(session)
+            return {"id": record_id, "outputs": flow_manager.collect_outputs()}
+        except Exception as e:
+            logging.error(f"Échec de l'enregistrement {record_id} : {str(e)}")
+            return {"id": record_id, "error": str(e)}
+
+    async def run(self, input_path: str, output_path: str) -> Dict[str, int]:
+        done_ids = self.load_journal()
+        # File bornée : la lecture du fichier s'arrête tant que les flux en cours n'ont pas libéré de place
+        records: asyncio.Queue = asyncio.Queue(maxsize=self.concurrency * 2)
+        results: asyncio.Queue = asyncio.Queue(maxsize=self.concurrency * 2)
+        session = self.template.api_client.get_session()
+        start = time.perf_counter()
+
+        async def produce():
+            for record_id, record in read_records(input_path, self.id_field):
+                if record_id in done_ids:
+                    self.stats["skipped"] += 1
+                    continue
+                await records.put((record_id, record))
+            for _ in range(self.concurrency):
+                await records.put(None)
+
+        async def work():
+            while True:
+                item = await records.get()
+                if item is None:
+                    return
+                await results.put(await self.run_record(session, *item))
+
+        async def write():
+            journal = open(self.journal_path, 'a', encoding='utf-8') if self.journal_path else None
+            try:
+                with open(output_path, 'a', encoding='utf-8') as output:
+                    while True:
+                        result = await results.get()
+                        if result is None:
+                            return
+                        output.write(json.dumps(result, ensure_ascii=False) + "\n")
+                        output.flush()
+                        self.template.telemetry.maybe_export_metrics()
+                        if "error" in result:
+                            self.stats["failed"] += 1
+                            continue
+                        # Le journal n'est complété qu'après l'écriture du résultat : un enregistrement interrompu sera rejoué
+                        self.stats["done"] += 1
+                        if journal:
+                            journal.write(result["id"] + "\n")
+                            journal.flush()
+            finally:
+                if journal:
+                    journal.close()
+
+        async def feed():
+            await asyncio.gather(produce(), *(work() for _ in range(self.concurrency)))
+            await results.put(None)
+
+        tasks = [asyncio.create_task(feed()), asyncio.create_task(write())]
+        try:
+            await asyncio.gather(*tasks)
+        finally:
+            for task in tasks:
+                task.cancel()
+            await self.template.output_sink.flush()
+            self.template.output_sink.close()
+            logging.info(f"Pool de connexions HTTP : {self.template.api_client.pool_stats()}")
+            self.template.api_client.response_cache.log_stats()
+            if self.template.semantic_search.embedding_store is not None:
+                self.template.semantic_search.embedding_store.flush()
+            if self.template.http_cache is not None:
+                self.template.http_cache.log_stats()
+                self.template.http_cache.close()
+            if self.template.run_store is not None:
+                self.template.run_store.log_stats()
+                self.template.run_store.close()
+            self.template.telemetry.report()
+            await self.template.api_client.close()
+
+        elapsed = time.perf_counter() - start
+        logging.info(
+            f"Lot terminé en {elapsed:.1f}s : {self.stats['done']} réussis, {self.stats['failed']} en échec, "
+            f"{self.stats['skipped']} déjà traités ({self.stats['done'] / elapsed if elapsed else 0:.1f} enregistrements/s)"
+        )
+        return self.stats
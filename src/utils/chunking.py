@@ -0,0 +1,59 @@
+# src/utils/chunking.py
+import re
+from bisect import bisect_left, bisect_right
+from typing import List
+
+from .token_utils import get_encoding
+
+PARAGRAPH_PATTERN = re.compile(r"\n\s*\n")
+SENTENCE_PATTERN = re.compile(r"[.!?…][\"')\]»]*\s+|\n")
+
+def boundary_tokens(text: str, offsets: List[int], pattern: re.Pattern) -> List[int]:
+    # Indice du jeton qui contient la fin de chaque séparateur : on coupe au début de ce jeton
+    return sorted({bisect_right(offsets, match.end()) - 1 for match in pattern.finditer(text)})
+
+def chunk_text(text: str, max_tokens: int, overlap: int = 0, model: str = "gpt-3.5-turbo",
+               snap_window: float = 0.25) -> List[str]:
+    if max_tokens <= 0:
+        raise ValueError("max_tokens doit être strictement positif")
+    if not 0 <= overlap < max_tokens:
+        raise ValueError("overlap doit être compris entre 0 et max_tokens - 1")
+
+    # Un seul encodage du texte complet, puis découpage sur les positions des jetons
+    encoding = get_encoding(model)
+    tokens = encoding.encode_ordinary(text)
+    if len(tokens) <= max_tokens:
+        return [text.strip()] if text.strip() else []
+
+    _, offsets = encoding.decode_with_offsets(tokens)
+    boundaries = [boundary_tokens(text, offsets, PARAGRAPH_PATTERN), boundary_tokens(text, offsets, SENTENCE_PATTERN)]
+    sentences = boundaries[1]
+
+    chunks = []
+    start = 0
+    while start < len(tokens):
+        end = min(start + max_tokens, len(tokens))
+        if end < len(tokens):
+            # Recule jusqu'à une fin de paragraphe, sinon de phrase, sans raccourcir le segment de plus de snap_window
+            lowest = start + max(1, int(max_tokens * (1 - snap_window)))
+            for cuts in boundaries:
+                i = bisect_right(cuts, end) - 1
+                if i >= 0 and cuts[i] >= lowest:
+                    end = cuts[i]
+                    break
+
+        chunk_end = offsets[end] if end < len(tokens) else len(text)
+        chunk = text[offsets[start]:chunk_end].strip()
+        if chunk:
+            chunks.append(chunk)
+        if end >= len(tokens):
+            break
+
+        next_start = end - overlap
+        if overlap:
+            # Le recouvrement commence de préférence au début d'une phrase
+            i = bisect_left(sentences, next_start)
+            if i < len(sentences) and sentences[i] < end:
+                next_start = sentences[i]
+        start = max(next_start, start + 1)
+    return chunks
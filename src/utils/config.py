@@ -1,47 +1,107 @@
 # src/utils/config.py
 import json
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
 from src.flow.flow_manager import FlowManager
 from src.flow.step import Step
 from src.flow.prompt_block import PromptBlock
-from src.api.model_api import WebData, APIData, TXTData, CSVData
+from src.flow.semantic_search import SemanticSearch
+from src.flow.output_sink import OutputSink
+from src.flow.run_store import RunStore
+from src.api.api_client import APIClient
+from src.api.http_cache import HTTPCache
+from src.api.model_api import ExternalData, WebData, APIData, TXTData, CSVData
+from src.api.routing import RoutingPolicy
+from src.api.model_registry import get_context_limit
+from src.utils.exceptions import FlowConfigException
 
 def load_steps_config(config_path: str) -> List[Dict[str, Any]]:
     with open(config_path, 'r', encoding='utf-8') as file:
         config = json.load(file)
     return config.get("steps", [])
 
-def create_modular_flow(steps_config: List[Dict[str, Any]], api_keys: Dict[str, str], words_per_chunk: int = 100, default_top_k: int = 3) -> FlowManager:
-    flow_manager = FlowManager(api_keys, words_per_chunk=words_per_chunk, default_top_k=default_top_k)
+def load_settings_config(config_path: str) -> Dict[str, Any]:
+    with open(config_path, 'r', encoding='utf-8') as file:
+        config = json.load(file)
+    return config.get("settings", {})
+
+EXTERNAL_DATA_TYPES = {'web': WebData, 'api': APIData, 'txt': TXTData, 'csv': CSVData}
+
+def create_external_data(config: Dict[str, Any]) -> ExternalData:
+    if not isinstance(config, dict):
+        raise TypeError(f"objet attendu : {config!r}")
+    options = {key: value for key, value in config.items() if key not in ('type', 'source')}
+    if config.get('type') not in EXTERNAL_DATA_TYPES:
+        raise ValueError(f"type attendu parmi {', '.join(EXTERNAL_DATA_TYPES)} : {config.get('type')!r}")
+    if not isinstance(config.get('source'), str) or not config['source']:
+        raise ValueError("source manquante")
+    return EXTERNAL_DATA_TYPES[config['type']](config['source'], **options)
+
+def create_modular_flow(steps_config: List[Dict[str, Any]], api_keys: Dict[str, str], words_per_chunk: int = 100, default_top_k: int = 3,
+                        settings: Optional[Dict[str, Any]] = None, api_client: Optional[APIClient] = None,
+                        semantic_search: Optional[SemanticSearch] = None,
+                        http_cache: Optional[HTTPCache] = None, output_sink: Optional[OutputSink] = None,
+                        run_store: Optional[RunStore] = None) -> FlowManager:
+    settings = settings or {}
+    flow_manager = FlowManager(api_keys, words_per_chunk=words_per_chunk, default_top_k=default_top_k,
+                               api_client_options=settings.get('api_client'),
+                               embedding_store_options=settings.get('embedding_store'),
+                               semantic_search_options=settings.get('semantic_search'),
+                               data_loader_options=settings.get('external_data'),
+                               output_options=settings.get('output'),
+                               api_client=api_client, semantic_search=semantic_search, http_cache=http_cache,
+                               output_sink=output_sink, run_store_options=settings.get('run_store'),
+                               run_store=run_store, telemetry_options=settings.get('telemetry'))
     
-    for step_config in steps_config:
+    for step_index, step_config in enumerate(steps_config):
         step = Step()
-        for block_config in step_config['blocks']:
+        for block_index, block_config in enumerate(step_config['blocks']):
             external_data = None
-            if 'external_data' in block_config:
-                data_type = block_config['external_data']['type']
-                source = block_config['external_data']['source']
-                if data_type == 'web':
-                    external_data = WebData(source)
-                elif data_type == 'api':
-                    external_data = APIData(source)
-                elif data_type == 'txt':
-                    external_data = TXTData(source)
-                elif data_type == 'csv':
-                    external_data = CSVData(source)
+            if block_config.get('external_data'):
+                # Type inconnu, source absente ou option invalide : erreur dès la construction, comme pour le routage
+                try:
+                    external_data = create_external_data(block_config['external_data'])
+                except (KeyError, TypeError, ValueError) as e:
+                    raise FlowConfigException(
+                        f"Étape {step_index + 1}, Bloc {block_index + 1} : external_data invalide ({str(e)})."
+                    ) from e
+
+            if block_config.get('routing'):
+                # Modèles de repli inconnus ou seuil mal formé : erreur dès la construction plutôt qu'en cours d'exécution
+                try:
+                    RoutingPolicy(**block_config['routing'])
+                except (TypeError, ValueError) as e:
+                    raise FlowConfigException(
+                        f"Étape {step_index + 1}, Bloc {block_index + 1} : routage invalide ({str(e)})."
+                    ) from e
+
+            model = block_config.get('model', 'gpt-3.5-turbo')
+            max_tokens = block_config.get('max_tokens', 2000)
+            if max_tokens >= get_context_limit(model):
+                # La réponse seule remplirait la fenêtre de contexte : aucun prompt ne pourrait l'accompagner
+                raise FlowConfigException(
+                    f"Étape {step_index + 1}, Bloc {block_index + 1} : max_tokens ({max_tokens}) doit être inférieur "
+                    f"à la fenêtre de contexte de {model} ({get_context_limit(model)} tokens)."
+                )
 
             block = PromptBlock(
                 prompt=block_config['prompt'],
-                model=block_config.get('model', 'gpt-3.5-turbo'),
-                max_tokens=block_config.get('max_tokens', 2000),
+                model=model,
+                max_tokens=max_tokens,
                 temperature=block_config.get('temperature', 0.7),
                 external_data=external_data,
                 semantic_search=block_config.get('semantic_search'),
-                save_output=block_config.get('save_output')
+                save_output=block_config.get('save_output'),
+                cache=block_config.get('cache'),
+                map_reduce=block_config.get('map_reduce'),
+                stream=block_config.get('stream', False),
+                stream_input=block_config.get('stream_input', False),
+                routing=block_config.get('routing')
             )
             for input_ref in block_config.get('inputs', []):
                 block.add_input(input_ref[0], input_ref[1])
             step.add_block(block)
         flow_manager.add_step(step)
-    
+
+    # Vérifie les références avant exécution (blocs inexistants, étapes ultérieures, cycles)
+    flow_manager.compile()
     return flow_manager
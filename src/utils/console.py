@@ -0,0 +1,10 @@
+# src/utils/console.py
+from functools import lru_cache
+from typing import Any, Tuple
+
+@lru_cache(maxsize=None)
+def console_styles() -> Tuple[Any, Any]:
+    # colorama n'est chargé qu'au premier affichage en couleur : les lots et les travailleurs ne le paient jamais
+    from colorama import init, Fore, Style
+    init(autoreset=True)
+    return Fore, Style
@@ -1,4 +1,21 @@
 # src/utils/exceptions.py
+from typing import Mapping, Optional
+
 class APIException(Exception):
     """Exception personnalisée pour les erreurs liées aux API."""
+    def __init__(self, message: str, status: Optional[int] = None, headers: Optional[Mapping[str, str]] = None):
+        super().__init__(message)
+        self.status = status
+        self.headers = headers or {}
+
+class CircuitOpenException(APIException):
+    """Exception levée sans appel réseau lorsque le disjoncteur d'un fournisseur est ouvert."""
+    pass
+
+class StreamInterruptedException(APIException):
+    """Exception levée lorsqu'un flux s'arrête après le début de la réponse : le texte reçu est incomplet."""
+    pass
+
+class FlowConfigException(Exception):
+    """Exception levée lorsque la configuration du flux est invalide (références, cycles)."""
     pass
@@ -0,0 +1,27 @@
+# src/utils/files.py
+import contextlib
+import os
+import re
+import tempfile
+from typing import Callable
+
+def suffixed_filename(filename: str, suffix: str) -> str:
+    # « sortie.txt » devient « sortie.<suffixe>.txt » ; le suffixe ne peut pas changer de répertoire
+    root, extension = os.path.splitext(filename)
+    return f"{root}.{re.sub(r'[^A-Za-z0-9_.-]', '_', suffix)}{extension}"
+
+def write_atomically(path: str, write: Callable[[str], None]):
+    # Nom temporaire unique dans le même répertoire : deux écritures simultanées du même fichier ne se gênent pas,
+    # et le renommage final reste atomique (même système de fichiers)
+    descriptor, temporary_path = tempfile.mkstemp(dir=os.path.dirname(path) or ".",
+                                                  prefix=f".{os.path.basename(path)}.", suffix=".tmp")
+    os.close(descriptor)
+    try:
+        # mkstemp crée le fichier en 0600 : les sorties gardent les droits habituels
+        os.chmod(temporary_path, 0o644)
+        write(temporary_path)
+        os.replace(temporary_path, path)
+    except BaseException:
+        with contextlib.suppress(OSError):
+            os.remove(temporary_path)
+        raise
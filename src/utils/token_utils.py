@@ -0,0 +1,15 @@
+# src/utils/token_utils.py
+from functools import lru_cache
+
+import tiktoken
+
+@lru_cache(maxsize=None)
+def get_encoding(model_name: str) -> tiktoken.Encoding:
+    try:
+        return tiktoken.encoding_for_model(model_name)
+    except KeyError:
+        return tiktoken.get_encoding("cl100k_base")
+
+def num_tokens_from_string(string: str, model_name: str) -> int:
+    # encode() refuse les jetons spéciaux (« <|endoftext|> ») qu'une page web peut contenir : ici ce n'est que du texte
+    return len(get_encoding(model_name).encode_ordinary(string))
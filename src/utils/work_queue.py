@@ -0,0 +1,162 @@
+# src/utils/work_queue.py
+import json
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+class WorkQueue(ABC):
+    @abstractmethod
+    def enqueue(self, items: Iterable[Tuple[str, Dict[str, Any]]]) -> int:
+        pass
+
+    @abstractmethod
+    def lease(self, worker: str, count: int = 1) -> List[Tuple[str, Dict[str, Any]]]:
+        pass
+
+    @abstractmethod
+    def complete(self, task_id: str, worker: str, result: Dict[str, Any]) -> bool:
+        pass
+
+    @abstractmethod
+    def fail(self, task_id: str, worker: str, result: Dict[str, Any]) -> Optional[str]:
+        pass
+
+    @abstractmethod
+    def counts(self) -> Dict[str, int]:
+        pass
+
+    @abstractmethod
+    def results(self) -> Iterator[Dict[str, Any]]:
+        pass
+
+    @abstractmethod
+    def record_metrics(self, worker: str, metrics: Dict[str, Any]):
+        pass
+
+    @abstractmethod
+    def metrics(self) -> List[Dict[str, Any]]:
+        pass
+
+class SQLiteWorkQueue(WorkQueue):
+    # File de tâches dans un fichier SQLite : plusieurs processus, ou plusieurs machines partageant le fichier, s'y servent
+    def __init__(self, path: str = ".llmflow_queue.sqlite", lease_timeout: float = 600.0, max_attempts: int = 3):
+        self.path = path
+        self.lease_timeout = lease_timeout
+        self.max_attempts = max_attempts
+        self._connection: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._connection is None:
+            self._connection = sqlite3.connect(self.path, timeout=30.0, isolation_level=None, check_same_thread=False)
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS tasks (id TEXT PRIMARY KEY, payload TEXT, status TEXT, attempts INTEGER, "
+                "worker TEXT, leased_until REAL, result TEXT, finished REAL)"
+            )
+            self._connection.execute("CREATE INDEX IF NOT EXISTS tasks_status ON tasks (status, leased_until)")
+            self._connection.execute("CREATE TABLE IF NOT EXISTS worker_metrics (worker TEXT PRIMARY KEY, payload TEXT)")
+        return self._connection
+
+    def enqueue(self, items: Iterable[Tuple[str, Dict[str, Any]]]) -> int:
+        with self._lock:
+            # Un identifiant déjà présent n'est pas réinséré : soumettre deux fois le même fichier reprend là où il en était
+            connection = self._connect()
+            before = connection.total_changes
+            connection.execute("BEGIN")
+            connection.executemany(
+                "INSERT OR IGNORE INTO tasks (id, payload, status, attempts) VALUES (?, ?, 'pending', 0)",
+                ((task_id, json.dumps(record, ensure_ascii=False)) for task_id, record in items)
+            )
+            connection.execute("COMMIT")
+            return connection.total_changes - before
+
+    def lease(self, worker: str, count: int = 1) -> List[Tuple[str, Dict[str, Any]]]:
+        with self._lock:
+            connection = self._connect()
+            now = time.time()
+            connection.execute("BEGIN IMMEDIATE")
+            try:
+                # Un bail expiré après max_attempts tentatives désigne une tâche qui tue son travailleur (mémoire,
+                # plantage) : elle échoue au lieu d'être relancée indéfiniment
+                expired = connection.execute(
+                    "SELECT id FROM tasks WHERE status = 'leased' AND leased_until < ? AND attempts >= ?",
+                    (now, self.max_attempts)
+                ).fetchall()
+                for (task_id,) in expired:
+                    self._finish(task_id, "failed", {
+                        "id": task_id, "error": f"Bail expiré après {self.max_attempts} tentative(s) : travailleur arrêté ?"
+                    })
+                # Les autres baux expirés (travailleur arrêté en cours de tâche) sont remis en jeu
+                rows = connection.execute(
+                    "SELECT id, payload FROM tasks WHERE status = 'pending' OR (status = 'leased' AND leased_until < ?) "
+                    "LIMIT ?", (now, count)
+                ).fetchall()
+                connection.executemany(
+                    "UPDATE tasks SET status = 'leased', worker = ?, leased_until = ?, attempts = attempts + 1 WHERE id = ?",
+                    [(worker, now + self.lease_timeout, task_id) for task_id, _ in rows]
+                )
+                connection.execute("COMMIT")
+            except BaseException:
+                connection.execute("ROLLBACK")
+                raise
+            return [(task_id, json.loads(payload)) for task_id, payload in rows]
+
+    # complete et fail ne s'appliquent qu'au détenteur du bail : un travailleur trop lent dont la tâche a été
+    # reprise par un autre n'écrase pas son résultat (renvoient False, ou None pour fail, dans ce cas).
+    # fail renvoie le nouvel état de la tâche : 'pending' si elle sera retentée, 'failed' si l'échec est définitif
+    def complete(self, task_id: str, worker: str, result: Dict[str, Any]) -> bool:
+        with self._lock:
+            return self._finish(task_id, "done", result, worker)
+
+    def fail(self, task_id: str, worker: str, result: Dict[str, Any]) -> Optional[str]:
+        with self._lock:
+            row = self._connect().execute(
+                "SELECT attempts FROM tasks WHERE id = ? AND worker = ? AND status = 'leased'", (task_id, worker)
+            ).fetchone()
+            if row is None:
+                return None
+            if row[0] < self.max_attempts:
+                self._connect().execute("UPDATE tasks SET status = 'pending', leased_until = NULL WHERE id = ?", (task_id,))
+                return "pending"
+            return "failed" if self._finish(task_id, "failed", result, worker) else None
+
+    def _finish(self, task_id: str, status: str, result: Dict[str, Any], worker: Optional[str] = None) -> bool:
+        query = "UPDATE tasks SET status = ?, result = ?, finished = ?, leased_until = NULL WHERE id = ?"
+        parameters = [status, json.dumps(result, ensure_ascii=False), time.time(), task_id]
+        if worker is not None:
+            query += " AND worker = ? AND status = 'leased'"
+            parameters.append(worker)
+        return self._connect().execute(query, parameters).rowcount > 0
+
+    def counts(self) -> Dict[str, int]:
+        with self._lock:
+            rows = self._connect().execute("SELECT status, COUNT(*) FROM tasks GROUP BY status").fetchall()
+            counts = {"pending": 0, "leased": 0, "done": 0, "failed": 0}
+            counts.update(dict(rows))
+            return counts
+
+    def results(self) -> Iterator[Dict[str, Any]]:
+        cursor = self._connect().execute(
+            "SELECT result FROM tasks WHERE status IN ('done', 'failed') ORDER BY finished"
+        )
+        for (result,) in cursor:
+            yield json.loads(result)
+
+    def record_metrics(self, worker: str, metrics: Dict[str, Any]):
+        with self._lock:
+            self._connect().execute(
+                "INSERT OR REPLACE INTO worker_metrics (worker, payload) VALUES (?, ?)", (worker, json.dumps(metrics))
+            )
+
+    def metrics(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            return [json.loads(payload) for (payload,) in self._connect().execute("SELECT payload FROM worker_metrics")]
+
+    def close(self):
+        with self._lock:
+            if self._connection is not None:
+                self._connection.close()
+                self._connection = None
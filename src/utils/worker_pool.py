@@ -0,0 +1,185 @@
+# src/utils/worker_pool.py
+import asyncio
+import json
+import logging
+import multiprocessing
+import os
+import shutil
+import socket
+import time
+from typing import Any, Dict, List, Optional
+
+from src.flow.embedding_store import DEFAULT_DIRECTORY
+from .batch_runner import BatchRunner, read_records
+from .work_queue import SQLiteWorkQueue, WorkQueue
+
+class QueueWorker:
+    def __init__(self, runner: BatchRunner, queue: WorkQueue, worker_id: str, poll_interval: float = 1.0):
+        self.runner = runner
+        self.queue = queue
+        self.worker_id = worker_id
+        self.poll_interval = poll_interval
+        self.stats = {"done": 0, "failed": 0, "retried": 0, "busy_seconds": 0.0}
+
+    async def run(self) -> Dict[str, Any]:
+        api_client = self.runner.template.api_client
+        session = api_client.get_session()
+        start = time.perf_counter()
+
+        async def work():
+            while True:
+                # Les appels SQLite bloquants restent hors de la boucle d'événements
+                tasks = await asyncio.to_thread(self.queue.lease, self.worker_id, 1)
+                if not tasks:
+                    counts = await asyncio.to_thread(self.queue.counts)
+                    if not counts["pending"] and not counts["leased"]:
+                        return
+                    # Des tâches sont encore tenues par d'autres travailleurs : leur bail peut expirer
+                    await asyncio.sleep(self.poll_interval)
+                    continue
+                task_id, record = tasks[0]
+                task_start = time.perf_counter()
+                result = await self.runner.run_record(session, task_id, record)
+                self.stats["busy_seconds"] += time.perf_counter() - task_start
+                finish = self.queue.fail if "error" in result else self.queue.complete
+                status = await asyncio.to_thread(finish, task_id, self.worker_id, result)
+                if not status:
+                    logging.warning(f"Tâche {task_id} : bail expiré et repris par un autre travailleur, résultat ignoré")
+                elif "error" not in result:
+                    self.stats["done"] += 1
+                # Seul un échec définitif compte ; une tâche remise en file sera comptée par la tentative qui la termine
+                elif status == "failed":
+                    self.stats["failed"] += 1
+                else:
+                    self.stats["retried"] += 1
+                api_client.telemetry.maybe_export_metrics()
+
+        try:
+            await asyncio.gather(*(work() for _ in range(self.runner.concurrency)))
+        finally:
+            await self.runner.template.output_sink.flush()
+            self.runner.template.output_sink.close()
+            api_client.response_cache.log_stats()
+            if self.runner.template.semantic_search.embedding_store is not None:
+                self.runner.template.semantic_search.embedding_store.flush()
+            if self.runner.template.http_cache is not None:
+                self.runner.template.http_cache.log_stats()
+                self.runner.template.http_cache.close()
+            if self.runner.template.run_store is not None:
+                self.runner.template.run_store.log_stats()
+                self.runner.template.run_store.close()
+            api_client.telemetry.report()
+            metrics = {
+                "worker": self.worker_id,
+                "finished": time.time(),
+                "elapsed": time.perf_counter() - start,
+                "cache": api_client.response_cache.stats,
+                **self.stats,
+            }
+            await api_client.close()
+            await asyncio.to_thread(self.queue.record_metrics, self.worker_id, metrics)
+        return metrics
+
+def worker_embedding_store(store_settings: Dict[str, Any], name: str) -> Dict[str, Any]:
+    # L'index d'un cache d'embeddings est tenu en mémoire et ses lignes sont allouées localement : deux processus
+    # sur le même répertoire écriraient des textes différents dans la même ligne. Chaque travailleur a donc son
+    # propre répertoire, initialisé par une copie du cache commun (pré-calculé par warmup)
+    directory = store_settings.get("directory", DEFAULT_DIRECTORY)
+    worker_directory = f"{directory.rstrip(os.sep)}.{name}"
+    if os.path.isdir(directory) and not os.path.exists(worker_directory):
+        shutil.copytree(directory, worker_directory)
+    return {**store_settings, "directory": worker_directory}
+
+def worker_main(steps_config: List[Dict[str, Any]], api_keys: Dict[str, str], settings: Dict[str, Any],
+                queue_path: str, concurrency: int, worker_id: Optional[str] = None,
+                slot: Optional[int] = None) -> Dict[str, Any]:
+    # Point d'entrée d'un processus travailleur : chaque processus a sa propre boucle, son client et son pool de connexions
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    worker_id = worker_id or f"{socket.gethostname()}-{os.getpid()}"
+    telemetry_settings = dict(settings.get("telemetry") or {})
+    # Un fichier de trace et de métriques par travailleur : les processus n'écrivent jamais le même fichier
+    for key in ("trace_path", "metrics_path"):
+        if telemetry_settings.get(key):
+            root, extension = os.path.splitext(telemetry_settings[key])
+            telemetry_settings[key] = f"{root}.{worker_id}{extension}"
+    settings = {**settings, "telemetry": telemetry_settings}
+    if settings.get("embedding_store") is not None:
+        # Les processus d'un pool gardent le même répertoire d'une exécution à l'autre ; un renfort utilise son identifiant
+        settings["embedding_store"] = worker_embedding_store(settings["embedding_store"],
+                                                             f"worker{slot}" if slot is not None else worker_id)
+    runner = BatchRunner(steps_config, api_keys, settings=settings, concurrency=concurrency)
+    queue = SQLiteWorkQueue(queue_path)
+    try:
+        return asyncio.run(QueueWorker(runner, queue, worker_id).run())
+    finally:
+        queue.close()
+
+class WorkerPool:
+    def __init__(self, steps_config: List[Dict[str, Any]], api_keys: Dict[str, str],
+                 settings: Optional[Dict[str, Any]] = None, queue_path: str = ".llmflow_queue.sqlite",
+                 processes: Optional[int] = None, concurrency: int = 16):
+        self.steps_config = steps_config
+        self.api_keys = api_keys
+        self.queue_path = queue_path
+        self.processes = processes or os.cpu_count() or 1
+        self.concurrency = concurrency
+        self.settings = dict(settings or {})
+        api_client_settings = dict(self.settings.get("api_client") or {})
+        # Les budgets rpm/tpm sont tenus dans le fichier de la file : ils valent pour l'ensemble des travailleurs
+        if api_client_settings.get("rate_limits"):
+            api_client_settings.setdefault("rate_limit_store", queue_path)
+        self.settings["api_client"] = api_client_settings
+        self.queue = SQLiteWorkQueue(queue_path)
+
+    def submit(self, input_path: str, id_field: str = "id") -> int:
+        count = self.queue.enqueue(read_records(input_path, id_field))
+        logging.info(f"{count} nouveaux enregistrements ajoutés à la file {self.queue_path} ({self.queue.counts()})")
+        return count
+
+    def run(self) -> Dict[str, Any]:
+        started = time.time()
+        start = time.perf_counter()
+        # "spawn" évite de dupliquer dans les enfants l'état asyncio et les connexions SQLite du parent
+        context = multiprocessing.get_context("spawn")
+        workers = [
+            context.Process(target=worker_main, args=(self.steps_config, self.api_keys, self.settings,
+                                                      self.queue_path, self.concurrency), kwargs={"slot": slot})
+            for slot in range(self.processes)
+        ]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        failed_workers = sum(worker.exitcode != 0 for worker in workers)
+        if failed_workers:
+            logging.error(f"{failed_workers} processus travailleur(s) se sont arrêtés en erreur")
+        return self.summary(time.perf_counter() - start, started)
+
+    def summary(self, wall_time: float, since: float = 0.0) -> Dict[str, Any]:
+        # Les travailleurs lancés sur d'autres machines sont comptés s'ils ont terminé pendant cette exécution
+        metrics = [worker for worker in self.queue.metrics() if worker["finished"] >= since]
+        counts = self.queue.counts()
+        summary = {
+            "workers": len(metrics),
+            "wall_time": wall_time,
+            "done": sum(worker["done"] for worker in metrics),
+            "failed": sum(worker["failed"] for worker in metrics),
+            "retried": sum(worker["retried"] for worker in metrics),
+            "busy_seconds": sum(worker["busy_seconds"] for worker in metrics),
+            "queue": counts,
+        }
+        summary["throughput"] = summary["done"] / wall_time if wall_time else 0.0
+        logging.info(
+            f"Pool terminé en {wall_time:.1f}s avec {summary['workers']} travailleur(s) : {summary['done']} réussis, "
+            f"{summary['failed']} en échec, {summary['retried']} tentative(s) remise(s) en file "
+            f"({summary['throughput']:.1f} enregistrements/s), file : {counts}"
+        )
+        return summary
+
+    def export(self, output_path: str) -> int:
+        count = 0
+        with open(output_path, 'w', encoding='utf-8') as output:
+            for result in self.queue.results():
+                output.write(json.dumps(result, ensure_ascii=False) + "\n")
+                count += 1
+        return count
@@ -0,0 +1,6 @@
+# tests/conftest.py
+import os
+import sys
+
+# Le dépôt n'est pas installé comme paquet : les tests importent src.* depuis la racine
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,38 @@
+# tests/stub_server.py
+import json
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Dict, List
+
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+
+@asynccontextmanager
+async def stub_server(routes: List[web.RouteDef]) -> AsyncIterator[str]:
+    # Serveur HTTP local sur un port libre ; renvoie son URL de base
+    app = web.Application()
+    app.add_routes(routes)
+    server = TestServer(app)
+    await server.start_server()
+    try:
+        yield str(server.make_url("")).rstrip("/")
+    finally:
+        await server.close()
+
+def sse(payload: Any, event: str = None) -> bytes:
+    data = payload if isinstance(payload, str) else json.dumps(payload)
+    return (f"event: {event}\n" if event else "").encode() + f"data: {data}\n\n".encode()
+
+def openai_delta(text: str) -> bytes:
+    return sse({"choices": [{"delta": {"content": text}}]})
+
+def openai_completion(text: str) -> Dict[str, Any]:
+    return {"choices": [{"message": {"role": "assistant", "content": text}}],
+            "usage": {"prompt_tokens": 1, "completion_tokens": 1}}
+
+async def write_stream(request: web.Request, chunks: List[bytes]) -> web.StreamResponse:
+    response = web.StreamResponse(headers={"Content-Type": "text/event-stream"})
+    await response.prepare(request)
+    for chunk in chunks:
+        await response.write(chunk)
+    await response.write_eof()
+    return response
@@ -0,0 +1,43 @@
+# tests/test_batch.py
+import asyncio
+import json
+import os
+
+from aiohttp import web
+
+from src.utils.batch_runner import BatchRunner
+from stub_server import openai_completion, stub_server
+
+def test_batch_outputs_are_kept_per_record(tmp_path):
+    async def chat(request):
+        body = await request.json()
+        return web.json_response(openai_completion(body["messages"][-1]["content"]))
+
+    input_path = os.path.join(tmp_path, "records.jsonl")
+    with open(input_path, "w", encoding="utf-8") as file:
+        file.write('{"id": "a", "q": "un"}\n{"id": "b", "q": "deux"}\n[1]\n')
+
+    async def main():
+        async with stub_server([web.post("/chat/completions", chat)]) as base_url:
+            steps = [{"blocks": [
+                {"prompt": "{q}", "model": "gpt-4o-mini",
+                 "save_output": {"format": "txt", "filename": os.path.join(tmp_path, "fixe.txt")}},
+                {"prompt": "{q} ?", "model": "gpt-4o-mini",
+                 "save_output": {"format": "jsonl", "filename": os.path.join(tmp_path, "tous.jsonl")}},
+            ]}]
+            settings = {"api_client": {"base_urls": {"openai": base_url}}, "telemetry": {"summary": False}}
+            runner = BatchRunner(steps, {"openai": "test"}, settings=settings, concurrency=2)
+            stats = await runner.run(input_path, os.path.join(tmp_path, "resultats.jsonl"))
+            await runner.template.output_sink.flush()
+            runner.template.output_sink.close()
+            return stats
+
+    stats = asyncio.run(main())
+    assert stats["done"] == 2 and stats["failed"] == 1
+    # Un nom de fichier fixe reçoit l'identifiant de l'enregistrement au lieu d'être réécrit
+    for record_id, text in (("a", "un"), ("b", "deux")):
+        with open(os.path.join(tmp_path, f"fixe.{record_id}.txt"), encoding="utf-8") as file:
+            assert file.read().strip() == text
+    with open(os.path.join(tmp_path, "tous.jsonl"), encoding="utf-8") as file:
+        records = {json.loads(line)["record"]: json.loads(line)["output"] for line in file}
+    assert records == {"a": "un ?", "b": "deux ?"}
@@ -0,0 +1,35 @@
+# tests/test_checkpoints.py
+import asyncio
+import os
+
+from aiohttp import web
+
+from src.flow.run_store import RunStore
+from src.utils.config import create_modular_flow
+from stub_server import openai_completion, stub_server
+
+def test_block_with_failed_external_data_is_not_checkpointed(tmp_path):
+    async def chat(request):
+        return web.json_response(openai_completion("réponse"))
+
+    async def main():
+        async with stub_server([web.post("/chat/completions", chat)]) as base_url:
+            missing = os.path.join(tmp_path, "absent.txt")
+            steps = [{"blocks": [{"prompt": "A", "model": "gpt-4o-mini", "external_data": {"type": "txt", "source": missing}},
+                                 {"prompt": "B", "model": "gpt-4o-mini"}]},
+                     {"blocks": [{"prompt": "C", "model": "gpt-4o-mini", "inputs": [[0, 0]]},
+                                 {"prompt": "D", "model": "gpt-4o-mini", "inputs": [[0, 1]]}]}]
+            settings = {"api_client": {"base_urls": {"openai": base_url}}, "telemetry": {"summary": False},
+                        "run_store": {"path": os.path.join(tmp_path, "runs.sqlite")}}
+            flow_manager = create_modular_flow(steps, {"openai": "test"}, settings=settings)
+            await flow_manager.run_flow()
+            return [block.fingerprint for step in flow_manager.steps for block in step.blocks]
+
+    fingerprints = asyncio.run(main())
+    store = RunStore(os.path.join(tmp_path, "runs.sqlite"))
+    try:
+        stored = store.contains(fingerprints)
+    finally:
+        store.close()
+    # Le bloc sans ses données externes et son aval sont rejoués à la prochaine exécution
+    assert [stored[fingerprint] for fingerprint in fingerprints] == [False, True, False, True]
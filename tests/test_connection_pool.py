@@ -0,0 +1,58 @@
+# tests/test_connection_pool.py
+import asyncio
+
+from aiohttp import web
+
+from src.api.api_client import APIClient
+from stub_server import openai_completion, stub_server
+
+def peer_recorder(peers):
+    async def chat(request):
+        # Le port source du client identifie la connexion TCP utilisée
+        peers.append(request.transport.get_extra_info("peername")[1])
+        await asyncio.sleep(0.02)
+        return web.json_response(openai_completion("ok"))
+
+    return [web.post("/chat/completions", chat)]
+
+async def generate_many(base_url: str, count: int, concurrent: bool, **options):
+    api_client = APIClient({"openai": "test"}, base_urls={"openai": base_url}, retry={"max_attempts": 1}, **options)
+    session = api_client.get_session()
+    try:
+        calls = [api_client.generate_text(session, "gpt-4o-mini", f"Question {i}", 0.0, 10) for i in range(count)]
+        if concurrent:
+            results = await asyncio.gather(*calls)
+        else:
+            results = [await call for call in calls]
+        return results, api_client.pool_stats()
+    finally:
+        await api_client.close()
+
+def test_sequential_requests_reuse_one_connection():
+    peers = []
+
+    async def main():
+        async with stub_server(peer_recorder(peers)) as base_url:
+            return await generate_many(base_url, 5, concurrent=False)
+
+    results, stats = asyncio.run(main())
+    assert results == ["ok"] * 5
+    assert len(set(peers)) == 1
+    assert stats["open"] == 1 and stats["in_use"] == 0
+
+def test_concurrent_requests_stay_within_the_per_host_limit():
+    peers = []
+
+    async def main():
+        async with stub_server(peer_recorder(peers)) as base_url:
+            return await generate_many(base_url, 12, concurrent=True, connection_limit_per_host=3)
+
+    results, stats = asyncio.run(main())
+    assert results == ["ok"] * 12
+    assert len(peers) == 12
+    assert len(set(peers)) <= 3
+    assert stats["limit_per_host"] == 3
+
+def test_pool_stats_without_session():
+    stats = APIClient({"openai": "test"}).pool_stats()
+    assert stats["open"] == 0 and stats["limit"] == 100
@@ -0,0 +1,50 @@
+# tests/test_map_reduce.py
+import asyncio
+
+import pytest
+from aiohttp import web
+
+from src.api.api_client import APIClient, GENERATION_ERROR
+from src.utils.config import create_modular_flow
+from src.utils.exceptions import FlowConfigException
+from stub_server import openai_completion, stub_server
+
+async def generate(routes, prompt: str, max_tokens: int, **options):
+    async with stub_server(routes) as base_url:
+        api_client = APIClient({"openai": "test"}, base_urls={"openai": base_url}, retry={"max_attempts": 1})
+        session = api_client.get_session()
+        try:
+            return await api_client.generate_text(session, "gpt-4", prompt, 0.0, max_tokens, **options)
+        finally:
+            await api_client.close()
+
+def test_failed_map_part_fails_the_block_without_reducing():
+    bodies = []
+
+    async def chat(request):
+        body = await request.json()
+        bodies.append(body)
+        if "partie 3" in body["messages"][-1]["content"]:
+            return web.json_response({"error": "invalide"}, status=400)
+        return web.json_response(openai_completion("résumé"))
+
+    prompt = " ".join(f"partie {i} " + "mot " * 3000 for i in range(4))
+    result = asyncio.run(generate([web.post("/chat/completions", chat)], prompt, 500,
+                                  map_reduce={"reduce_prompt": "Combine : {text}"}))
+    assert result == GENERATION_ERROR
+    assert not any(body["messages"][-1]["content"].startswith("Combine") for body in bodies)
+
+def test_completion_is_clamped_to_the_remaining_context():
+    bodies = []
+
+    async def chat(request):
+        bodies.append(await request.json())
+        return web.json_response(openai_completion("ok"))
+
+    # gpt-4 : 8192 tokens ; un prompt de 4000 tokens reste sous la moitié de la fenêtre
+    asyncio.run(generate([web.post("/chat/completions", chat)], "mot " * 4000, 6000))
+    assert bodies[0]["max_tokens"] <= 8192 - 4000
+
+def test_max_tokens_filling_the_context_window_is_rejected():
+    with pytest.raises(FlowConfigException):
+        create_modular_flow([{"blocks": [{"prompt": "A", "model": "gpt-4", "max_tokens": 8192}]}], {"openai": "test"})
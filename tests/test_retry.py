@@ -0,0 +1,85 @@
+# tests/test_retry.py
+import asyncio
+import time
+
+import pytest
+from aiohttp import web
+
+from src.api.api_client import APIClient
+from src.utils.exceptions import APIException, CircuitOpenException
+from stub_server import openai_completion, stub_server
+
+def client(base_url: str, **retry) -> APIClient:
+    return APIClient({"openai": "test"}, base_urls={"openai": base_url},
+                     retry={"base_delay": 0.01, "max_delay": 0.01, **retry},
+                     circuit_breaker={"failure_threshold": 2, "reset_timeout": 60})
+
+async def call(api_client: APIClient):
+    api = api_client.apis["openai"]
+    session = api_client.get_session()
+    try:
+        return await api.generate_text(session, "gpt-4o-mini", "Bonjour", 0.0, 50)
+    finally:
+        await api_client.close()
+
+def failing_then_ok(status: int, failures: int, headers=None):
+    calls = []
+
+    async def chat(request):
+        calls.append(time.monotonic())
+        if len(calls) <= failures:
+            return web.json_response({"error": "indisponible"}, status=status, headers=headers)
+        return web.json_response(openai_completion("ok"))
+
+    return chat, calls
+
+def test_rate_limit_does_not_open_the_circuit():
+    chat, calls = failing_then_ok(429, 4, {"Retry-After": "0"})
+
+    async def main():
+        async with stub_server([web.post("/chat/completions", chat)]) as base_url:
+            api_client = client(base_url, max_attempts=5)
+            result = await call(api_client)
+            return result, api_client.apis["openai"].circuit_breaker
+
+    result, breaker = asyncio.run(main())
+    assert len(calls) == 5
+    assert breaker.state == "closed" and breaker.failures == 0
+    assert result is not None
+
+def test_server_errors_open_the_circuit():
+    chat, calls = failing_then_ok(503, 10)
+
+    async def main():
+        async with stub_server([web.post("/chat/completions", chat)]) as base_url:
+            api_client = client(base_url, max_attempts=5)
+            with pytest.raises(CircuitOpenException):
+                await call(api_client)
+            return api_client.apis["openai"].circuit_breaker
+
+    breaker = asyncio.run(main())
+    # Le circuit s'ouvre au deuxième échec : la troisième tentative n'atteint pas le serveur
+    assert len(calls) == 2
+    assert breaker.state == "open"
+
+def test_retry_after_is_honoured():
+    chat, calls = failing_then_ok(429, 1, {"Retry-After": "0.3"})
+
+    async def main():
+        async with stub_server([web.post("/chat/completions", chat)]) as base_url:
+            return await call(client(base_url, max_attempts=2))
+
+    asyncio.run(main())
+    assert len(calls) == 2
+    assert calls[1] - calls[0] >= 0.3
+
+def test_client_error_is_not_retried():
+    chat, calls = failing_then_ok(400, 1)
+
+    async def main():
+        async with stub_server([web.post("/chat/completions", chat)]) as base_url:
+            with pytest.raises(APIException):
+                await call(client(base_url, max_attempts=5))
+
+    asyncio.run(main())
+    assert len(calls) == 1
@@ -0,0 +1,83 @@
+# tests/test_routing.py
+import asyncio
+
+from aiohttp import web
+
+from src.api.api_client import APIClient, GENERATION_ERROR
+from src.api.routing import RoutingPolicy
+from stub_server import openai_completion, stub_server
+
+ROUTING = {"fallbacks": ["gpt-4"]}
+
+def stub_routes(models):
+    async def chat(request):
+        body = await request.json()
+        models.append(body["model"])
+        if body["model"] == "gpt-4o-mini":
+            return web.json_response({"error": "indisponible"}, status=503)
+        return web.json_response(openai_completion(f"réponse de {body['model']}"))
+
+    return [web.post("/chat/completions", chat)]
+
+async def generate(base_url: str, prompt: str, calls: int = 1):
+    api_client = APIClient({"openai": "test"}, base_urls={"openai": base_url}, retry={"max_attempts": 1},
+                           cache={"enabled": True, "path": None})
+    session = api_client.get_session()
+    try:
+        results = [await api_client.generate_text(session, "gpt-4o-mini", prompt, 0.0, 50, routing=ROUTING)
+                   for _ in range(calls)]
+        return results, len(api_client.response_cache.memory)
+    finally:
+        await api_client.close()
+
+def test_fallback_answer_is_not_cached_under_the_primary_key():
+    models = []
+
+    async def main():
+        async with stub_server(stub_routes(models)) as base_url:
+            return await generate(base_url, "Bonjour", calls=2)
+
+    results, cached = asyncio.run(main())
+    assert results == ["réponse de gpt-4"] * 2
+    assert cached == 0
+    # Sans mise en cache, le second appel retente le modèle principal
+    assert models == ["gpt-4o-mini", "gpt-4", "gpt-4o-mini", "gpt-4"]
+
+def test_fallback_with_a_smaller_context_window_is_skipped():
+    models = []
+
+    async def main():
+        async with stub_server(stub_routes(models)) as base_url:
+            return await generate(base_url, "mot " * 20000)
+
+    results, _ = asyncio.run(main())
+    assert results == [GENERATION_ERROR]
+    assert models == ["gpt-4o-mini"]
+
+def test_cancelled_hedge_does_not_promote_the_slow_provider():
+    async def chat(request):
+        await asyncio.sleep(0.3)
+        return web.json_response(openai_completion("rapide"))
+
+    async def messages(request):
+        await asyncio.sleep(2)
+        return web.json_response({"content": [{"type": "text", "text": "lent"}]})
+
+    async def main():
+        async with stub_server([web.post("/chat/completions", chat), web.post("/messages", messages)]) as base_url:
+            api_client = APIClient({"openai": "test", "anthropic": "test"},
+                                   base_urls={"openai": base_url, "anthropic": base_url}, retry={"max_attempts": 1})
+            routing = {"fallbacks": ["claude-3-haiku-20240307"], "hedge_after": 0.25, "adaptive": True}
+            session = api_client.get_session()
+            try:
+                result = await api_client.generate_text(session, "gpt-4o-mini", "Bonjour", 0.0, 50, routing=routing)
+            finally:
+                await api_client.close()
+            candidates = api_client.routing_candidates("gpt-4o-mini", RoutingPolicy(**routing), "Bonjour", 1, 50)
+            return result, list(candidates), api_client.latency_tracker.estimate("anthropic")
+
+    result, candidates, anthropic_estimate = asyncio.run(main())
+    assert result == "rapide"
+    # L'annulation n'est qu'une borne inférieure : elle ne sert pas de mesure pour un fournisseur jamais mesuré
+    assert anthropic_estimate is None
+    assert candidates[0] == "gpt-4o-mini"
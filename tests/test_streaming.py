@@ -0,0 +1,141 @@
+# tests/test_streaming.py
+import asyncio
+
+import pytest
+from aiohttp import web
+
+from src.api.api_client import APIClient, GENERATION_ERROR
+from src.utils.exceptions import StreamInterruptedException
+from src.utils.config import create_modular_flow
+from stub_server import openai_delta, stub_server, write_stream
+
+def client(base_url: str, **options) -> APIClient:
+    return APIClient({"openai": "test"}, base_urls={"openai": base_url},
+                     retry={"max_attempts": 1}, **options)
+
+async def collect(api_client: APIClient, model: str = "gpt-4o-mini", **options):
+    session = api_client.get_session()
+    try:
+        return [delta async for delta in api_client.stream_text(session, model, "Bonjour", 0.0, 50, **options)]
+    finally:
+        await api_client.close()
+
+def test_complete_stream_yields_all_deltas():
+    async def chat(request):
+        return await write_stream(request, [openai_delta("Bon"), openai_delta("jour"), b"data: [DONE]\n\n"])
+
+    async def main():
+        async with stub_server([web.post("/chat/completions", chat)]) as base_url:
+            return await collect(client(base_url))
+
+    assert asyncio.run(main()) == ["Bon", "jour"]
+
+def test_stream_closed_without_terminator_raises_and_is_not_cached():
+    async def chat(request):
+        return await write_stream(request, [openai_delta("Bon"), openai_delta("jo")])
+
+    async def main():
+        async with stub_server([web.post("/chat/completions", chat)]) as base_url:
+            api_client = client(base_url, cache={"enabled": True, "path": None})
+            with pytest.raises(StreamInterruptedException):
+                await collect(api_client, cache=True)
+            return len(api_client.response_cache.memory)
+
+    assert asyncio.run(main()) == 0
+
+def test_stream_dropped_mid_response_raises():
+    async def chat(request):
+        response = web.StreamResponse(headers={"Content-Type": "text/event-stream"})
+        await response.prepare(request)
+        await response.write(openai_delta("Bon"))
+        await asyncio.sleep(0.05)
+        request.transport.close()
+        return response
+
+    async def main():
+        async with stub_server([web.post("/chat/completions", chat)]) as base_url:
+            with pytest.raises(StreamInterruptedException):
+                await collect(client(base_url))
+
+    asyncio.run(main())
+
+def test_error_before_first_delta_yields_generation_error():
+    async def chat(request):
+        return web.json_response({"error": "invalide"}, status=400)
+
+    async def main():
+        async with stub_server([web.post("/chat/completions", chat)]) as base_url:
+            return await collect(client(base_url))
+
+    assert asyncio.run(main()) == [GENERATION_ERROR]
+
+def test_truncated_block_stream_is_a_failed_generation():
+    prompts = []
+
+    async def chat(request):
+        body = await request.json()
+        prompts.append(body["messages"][-1]["content"])
+        if body.get("stream"):
+            return await write_stream(request, [openai_delta("partiel")])
+        return web.json_response({"choices": [{"message": {"content": "fin"}}]})
+
+    async def main():
+        async with stub_server([web.post("/chat/completions", chat)]) as base_url:
+            steps = [{"blocks": [{"prompt": "A", "model": "gpt-4o-mini", "stream": True}]},
+                     {"blocks": [{"prompt": "B", "model": "gpt-4o-mini", "inputs": [[0, 0]], "stream_input": True}]}]
+            settings = {"api_client": {"base_urls": {"openai": base_url}, "retry": {"max_attempts": 1}},
+                        "telemetry": {"summary": False}}
+            flow_manager = create_modular_flow(steps, {"openai": "test"}, settings=settings)
+            session = flow_manager.api_client.get_session()
+            try:
+                await flow_manager.execute(session)
+            finally:
+                flow_manager.output_sink.close()
+                await flow_manager.api_client.close()
+            return flow_manager.collect_outputs()
+
+    outputs = asyncio.run(main())
+    assert outputs[0] == [GENERATION_ERROR]
+    # Le bloc aval reçoit l'erreur, jamais le texte tronqué
+    assert "partiel" not in prompts[-1]
+    assert GENERATION_ERROR in prompts[-1]
+
+def test_streamed_output_goes_through_partial_file(tmp_path):
+    filename = tmp_path / "sortie.txt"
+    partial = tmp_path / "sortie.txt.partial"
+    seen = []
+
+    async def chat(request):
+        response = web.StreamResponse(headers={"Content-Type": "text/event-stream"})
+        await response.prepare(request)
+        await response.write(openai_delta("Bon"))
+        # Pendant le flux, seul le fichier partiel est écrit ; le fichier final n'existe pas encore
+        for _ in range(100):
+            if partial.exists() and partial.read_text(encoding="utf-8") == "Bon":
+                break
+            await asyncio.sleep(0.01)
+        seen.append((partial.exists(), filename.exists()))
+        await response.write(openai_delta("jour"))
+        await response.write(b"data: [DONE]\n\n")
+        await response.write_eof()
+        return response
+
+    async def main():
+        async with stub_server([web.post("/chat/completions", chat)]) as base_url:
+            steps = [{"blocks": [{"prompt": "A", "model": "gpt-4o-mini", "stream": True,
+                                  "save_output": {"format": "txt", "filename": str(filename)}}]}]
+            settings = {"api_client": {"base_urls": {"openai": base_url}, "retry": {"max_attempts": 1}},
+                        "telemetry": {"summary": False}}
+            flow_manager = create_modular_flow(steps, {"openai": "test"}, settings=settings)
+            session = flow_manager.api_client.get_session()
+            try:
+                await flow_manager.execute(session)
+                await flow_manager.output_sink.flush()
+            finally:
+                flow_manager.output_sink.close()
+                await flow_manager.api_client.close()
+
+    asyncio.run(main())
+    assert seen == [(True, False)]
+    assert filename.read_text(encoding="utf-8") == "Bonjour"
+    assert not partial.exists()
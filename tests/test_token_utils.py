@@ -0,0 +1,6 @@
+# tests/test_token_utils.py
+from src.utils.token_utils import num_tokens_from_string
+
+def test_special_tokens_are_counted_as_plain_text():
+    text = "Documentation : le modèle s'arrête sur <|endoftext|> en fin de texte."
+    assert num_tokens_from_string(text, "gpt-4o-mini") > 0
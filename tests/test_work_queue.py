@@ -0,0 +1,16 @@
+# tests/test_work_queue.py
+from src.utils.work_queue import SQLiteWorkQueue
+
+def test_fail_reports_whether_the_failure_is_final(tmp_path):
+    queue = SQLiteWorkQueue(str(tmp_path / "queue.sqlite"), max_attempts=2)
+    queue.enqueue([("r1", {"x": 1})])
+
+    statuses = []
+    for _ in range(2):
+        [(task_id, _)] = queue.lease("w1")
+        statuses.append(queue.fail(task_id, "w1", {"id": task_id, "error": "boom"}))
+    # Le premier échec remet la tâche en file, seul le second est définitif
+    assert statuses == ["pending", "failed"]
+    assert queue.counts()["failed"] == 1
+    # Un travailleur qui ne détient plus le bail ne peut rien marquer
+    assert queue.fail("r1", "w2", {"id": "r1", "error": "boom"}) is None